@@ -13,23 +13,118 @@ def _optional(key: str, default: str) -> str:
     return os.environ.get(key, default).strip() or default
 
 
+@dataclass(frozen=True)
+class WorkerConfig:
+    name: str
+    mac: str
+    host: str
+    ssh_user: str
+    ssh_key: str
+    runner_dir: str
+    suspend_cmd: str
+    labels: str
+    slots: int
+    wol_targets: str
+
+    def slot_runner_dir(self, slot: int) -> str:
+        """Runner install for ``slot``: runner_dir, then runner_dir-2, runner_dir-3, ..."""
+        return self.runner_dir if slot == 0 else f"{self.runner_dir}-{slot + 1}"
+
+    @property
+    def wol_addresses(self) -> tuple[tuple[str, int], ...]:
+        """``host[:port]`` entries of wol_targets; the port defaults to 9."""
+        addresses = []
+        for target in self.wol_targets.split(","):
+            host, _, port = target.strip().partition(":")
+            if host:
+                addresses.append((host, int(port or 9)))
+        return tuple(addresses)
+
+    @property
+    def label_set(self) -> frozenset[str]:
+        # GitHub matches runs-on labels case-insensitively and every
+        # self-hosted runner carries the implicit "self-hosted" label.
+        labels = {lbl.strip().lower() for lbl in self.labels.split(",") if lbl.strip()}
+        return frozenset(labels | {"self-hosted"})
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str) -> "WorkerConfig":
+        # Per-worker keys (WORKER_<NAME>_HOST, ...) fall back to the shared
+        # WORKER_* defaults so a pool of identical machines stays terse.
+        return cls(
+            name=name,
+            mac=_require(f"{prefix}_MAC"),
+            host=_require(f"{prefix}_HOST"),
+            ssh_user=_optional(f"{prefix}_SSH_USER", _optional("WORKER_SSH_USER", "runner")),
+            ssh_key=_optional(f"{prefix}_SSH_KEY", _optional("WORKER_SSH_KEY", "/ssh/id_rsa")),
+            runner_dir=_optional(
+                f"{prefix}_RUNNER_DIR",
+                _optional("WORKER_RUNNER_DIR", "/home/runner/actions-runner"),
+            ),
+            suspend_cmd=_optional(
+                f"{prefix}_SUSPEND_CMD",
+                _optional("WORKER_SUSPEND_CMD", "systemctl suspend"),
+            ),
+            labels=_optional(
+                f"{prefix}_LABELS",
+                _optional("RUNNER_LABELS", "self-hosted,physical-worker"),
+            ),
+            slots=max(1, int(_optional(f"{prefix}_SLOTS", _optional("WORKER_SLOTS", "1")))),
+            wol_targets=_optional(
+                f"{prefix}_WOL_TARGETS",
+                _optional("WOL_TARGETS", "255.255.255.255:9"),
+            ),
+        )
+
+
+def _workers_from_env() -> tuple[WorkerConfig, ...]:
+    names = [n.strip() for n in os.environ.get("WORKERS", "").split(",") if n.strip()]
+    if not names:
+        # Single-worker setup: WORKER_MAC / WORKER_HOST
+        return (WorkerConfig.from_env("worker", "WORKER"),)
+    return tuple(
+        WorkerConfig.from_env(name, f"WORKER_{name.upper().replace('-', '_')}")
+        for name in names
+    )
+
+
 @dataclass(frozen=True)
 class Config:
     github_webhook_secret: str
     github_token: str
     github_repo: str
-    runner_labels: str
 
-    worker_mac: str
-    worker_host: str
-    worker_ssh_user: str
-    worker_ssh_key: str
-    worker_runner_dir: str
-    worker_suspend_cmd: str
+    workers: tuple[WorkerConfig, ...]
 
     worker_online_timeout: int
     worker_online_poll_interval: int
+    worker_ready_token: str
+    wol_burst: int
+    wol_burst_interval_ms: int
+    wol_retry_schedule: tuple[float, ...]
     suspend_grace_seconds: int
+    hot_standby: bool
+
+    adaptive_policy: bool
+    suspend_grace_min_seconds: int
+    suspend_grace_max_seconds: int
+    prewake_lookahead_seconds: int
+    prewake_threshold: float
+    policy_history_path: str
+
+    queue_journal_path: str
+    queue_journal_flush_ms: int
+
+    dedup_ttl_seconds: int
+    dedup_max_entries: int
+    webhook_queue_size: int
+
+    runner_log_dir: str
+    runner_log_buffer_bytes: int
+    runner_log_max_bytes: int
+    runner_log_retain: int
+    runner_log_flush_ms: int
+    runner_log_token: str
 
     @classmethod
     def from_env(cls) -> "Config":
@@ -37,14 +132,33 @@ class Config:
             github_webhook_secret=_require("GITHUB_WEBHOOK_SECRET"),
             github_token=_require("GITHUB_TOKEN"),
             github_repo=_require("GITHUB_REPO"),
-            runner_labels=_optional("RUNNER_LABELS", "self-hosted,physical-worker"),
-            worker_mac=_require("WORKER_MAC"),
-            worker_host=_require("WORKER_HOST"),
-            worker_ssh_user=_optional("WORKER_SSH_USER", "runner"),
-            worker_ssh_key=_optional("WORKER_SSH_KEY", "/ssh/id_rsa"),
-            worker_runner_dir=_optional("WORKER_RUNNER_DIR", "/home/runner/actions-runner"),
-            worker_suspend_cmd=_optional("WORKER_SUSPEND_CMD", "systemctl suspend"),
+            workers=_workers_from_env(),
             worker_online_timeout=int(_optional("WORKER_ONLINE_TIMEOUT", "120")),
             worker_online_poll_interval=int(_optional("WORKER_ONLINE_POLL_INTERVAL", "5")),
+            worker_ready_token=_optional("WORKER_READY_TOKEN", ""),
+            wol_burst=max(1, int(_optional("WOL_BURST", "3"))),
+            wol_burst_interval_ms=int(_optional("WOL_BURST_INTERVAL_MS", "100")),
+            wol_retry_schedule=tuple(
+                float(s) for s in _optional("WOL_RETRY_SCHEDULE", "3,8,15,30,60").split(",")
+                if s.strip()
+            ),
             suspend_grace_seconds=int(_optional("SUSPEND_GRACE_SECONDS", "30")),
+            hot_standby=_optional("HOT_STANDBY", "false").lower() in ("1", "true", "yes"),
+            adaptive_policy=_optional("ADAPTIVE_POLICY", "false").lower() in ("1", "true", "yes"),
+            suspend_grace_min_seconds=int(_optional("SUSPEND_GRACE_MIN_SECONDS", "10")),
+            suspend_grace_max_seconds=int(_optional("SUSPEND_GRACE_MAX_SECONDS", "600")),
+            prewake_lookahead_seconds=int(_optional("PREWAKE_LOOKAHEAD_SECONDS", "600")),
+            prewake_threshold=float(_optional("PREWAKE_THRESHOLD", "1.0")),
+            policy_history_path=_optional("POLICY_HISTORY_PATH", "/data/arrivals.json"),
+            queue_journal_path=_optional("QUEUE_JOURNAL_PATH", "/data/queue.jsonl"),
+            queue_journal_flush_ms=int(_optional("QUEUE_JOURNAL_FLUSH_MS", "20")),
+            dedup_ttl_seconds=int(_optional("DEDUP_TTL_SECONDS", "86400")),
+            dedup_max_entries=int(_optional("DEDUP_MAX_ENTRIES", "50000")),
+            webhook_queue_size=int(_optional("WEBHOOK_QUEUE_SIZE", "1000")),
+            runner_log_dir=_optional("RUNNER_LOG_DIR", "/data/runner-logs"),
+            runner_log_buffer_bytes=int(_optional("RUNNER_LOG_BUFFER_BYTES", "1048576")),
+            runner_log_max_bytes=int(_optional("RUNNER_LOG_MAX_BYTES", "104857600")),
+            runner_log_retain=int(_optional("RUNNER_LOG_RETAIN", "100")),
+            runner_log_flush_ms=int(_optional("RUNNER_LOG_FLUSH_MS", "1000")),
+            runner_log_token=_optional("RUNNER_LOG_TOKEN", ""),
         )
@@ -0,0 +1,47 @@
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+
+
+class TTLCache:
+    """
+    Bounded set of recently seen keys.
+
+    Every key gets the same TTL, so insertion order is also expiry order and
+    eviction only ever looks at the oldest entries. When full, the oldest key
+    is dropped even if it has not expired yet.
+    """
+
+    def __init__(self, ttl: float, maxsize: int) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._expiry: OrderedDict[Hashable, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def __contains__(self, key: Hashable) -> bool:
+        self._evict(time.monotonic())
+        return key in self._expiry
+
+    def add(self, key: Hashable) -> bool:
+        """Remember ``key``; return False if it was already present."""
+        now = time.monotonic()
+        self._evict(now)
+        if key in self._expiry:
+            return False
+        self._expiry[key] = now + self.ttl
+        if len(self._expiry) > self.maxsize:
+            self._expiry.popitem(last=False)
+        return True
+
+    def discard(self, key: Hashable) -> None:
+        """Forget ``key`` so that it counts as new again."""
+        self._expiry.pop(key, None)
+
+    def _evict(self, now: float) -> None:
+        while self._expiry:
+            key, expires = next(iter(self._expiry.items()))
+            if expires > now:
+                break
+            del self._expiry[key]
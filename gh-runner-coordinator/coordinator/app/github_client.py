@@ -1,17 +1,146 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
 import aiohttp
+
 from .config import Config
 
+log = logging.getLogger(__name__)
+
+API_URL = "https://api.github.com"
+
+# Refresh the cached registration token this long before GitHub expires it
+TOKEN_REFRESH_MARGIN = 600
+MAX_ATTEMPTS = 5
+MAX_BACKOFF = 60.0
+
+
+class GitHubClient:
+    """
+    Long-lived GitHub API client.
+
+    Holds a single pooled ``aiohttp.ClientSession`` for the life of the
+    coordinator and caches the runner registration token (valid ~1h, and
+    reusable for any number of runners). A background task refreshes the
+    token ahead of expiry, so dispatching a job normally reads it from memory
+    instead of making a round trip to GitHub.
+    """
+
+    def __init__(self, cfg: Config) -> None:
+        self.cfg = cfg
+        self._session: aiohttp.ClientSession | None = None
+        self._token: str | None = None
+        self._token_expires = 0.0
+        self._token_lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._session = aiohttp.ClientSession(
+            base_url=API_URL,
+            headers={
+                "Authorization": f"Bearer {self.cfg.github_token}",
+                "Accept": "application/vnd.github+json",
+                "X-GitHub-Api-Version": "2022-11-28",
+            },
+            connector=aiohttp.TCPConnector(limit=8, keepalive_timeout=300),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+        self._refresh_task = asyncio.create_task(self._refresh_loop(), name="token-refresh")
+
+    async def close(self) -> None:
+        if self._refresh_task:
+            self._refresh_task.cancel()
+        if self._session:
+            await self._session.close()
+
+    async def get_registration_token(self) -> str:
+        if self._token_valid(0):
+            return self._token
+        async with self._token_lock:
+            # Another caller may have refreshed it while we waited for the lock
+            if not self._token_valid(0):
+                await self._fetch_registration_token()
+            return self._token
+
+    def _token_valid(self, margin: float) -> bool:
+        return self._token is not None and time.time() < self._token_expires - margin
+
+    async def _fetch_registration_token(self) -> None:
+        owner, repo = self.cfg.github_repo.split("/", 1)
+        data = await self._request(
+            "POST", f"/repos/{owner}/{repo}/actions/runners/registration-token"
+        )
+        self._token = data["token"]
+        self._token_expires = datetime.fromisoformat(data["expires_at"]).timestamp()
+        log.info(
+            "Fetched runner registration token (expires in %ds)",
+            self._token_expires - time.time(),
+        )
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                async with self._token_lock:
+                    if not self._token_valid(TOKEN_REFRESH_MARGIN):
+                        await self._fetch_registration_token()
+                delay = self._token_expires - TOKEN_REFRESH_MARGIN - time.time()
+            except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError):
+                log.exception("Registration token refresh failed — retrying")
+                delay = 30
+            await asyncio.sleep(max(delay, 1))
+
+    async def _request(self, method: str, path: str) -> dict:
+        backoff = 1.0
+        attempt = 0
+        while True:
+            attempt += 1
+            async with self._session.request(method, path) as resp:
+                wait = _rate_limit_wait(resp)
+                retryable = wait is not None or resp.status == 429 or resp.status >= 500
+                if not retryable or attempt == MAX_ATTEMPTS:
+                    resp.raise_for_status()
+                    return await resp.json()
+            # Honour GitHub's own hint when it gives one, else back off exponentially
+            if wait is None:
+                wait = min(backoff, MAX_BACKOFF)
+            log.warning(
+                "GitHub %s %s returned %d — retrying in %.1fs (attempt %d/%d)",
+                method, path, resp.status, wait, attempt, MAX_ATTEMPTS,
+            )
+            await asyncio.sleep(wait)
+            backoff *= 2
+
+
+def _rate_limit_wait(resp: aiohttp.ClientResponse) -> float | None:
+    """Seconds GitHub asks us to wait, if ``resp`` is a rate-limit response."""
+    if resp.status not in (403, 429):
+        return None
+    wait = _retry_after_seconds(resp.headers.get("Retry-After"))
+    if wait is not None:
+        return wait
+    if resp.headers.get("X-RateLimit-Remaining") == "0":
+        try:
+            reset = float(resp.headers.get("X-RateLimit-Reset", "0"))
+        except ValueError:
+            return None
+        return max(reset - time.time(), 1.0)
+    return None
+
 
-async def get_registration_token(cfg: Config) -> str:
-    owner, repo = cfg.github_repo.split("/", 1)
-    url = f"https://api.github.com/repos/{owner}/{repo}/actions/runners/registration-token"
-    headers = {
-        "Authorization": f"Bearer {cfg.github_token}",
-        "Accept": "application/vnd.github+json",
-        "X-GitHub-Api-Version": "2022-11-28",
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers) as resp:
-            resp.raise_for_status()
-            data = await resp.json()
-            return data["token"]
+def _retry_after_seconds(value: str | None) -> float | None:
+    """``Retry-After`` as seconds: either delay-seconds or an HTTP-date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        log.warning("Ignoring unparseable Retry-After header %r", value)
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
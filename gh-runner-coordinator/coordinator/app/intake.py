@@ -0,0 +1,97 @@
+import asyncio
+import json
+import logging
+
+from .queue_manager import QueueManager
+
+try:
+    import orjson
+except ImportError:  # optional: pip install coordinator[fast]
+    orjson = None
+
+log = logging.getLogger(__name__)
+
+# workflow_job actions the queue acts on; others ("waiting") are acknowledged
+ACTIONS = frozenset({"queued", "in_progress", "completed"})
+# The only parts of workflow_job anything downstream reads
+_JOB_FIELDS = ("id", "name", "labels", "runner_name", "conclusion")
+
+
+def parse_workflow_job(body: bytes) -> dict:
+    """
+    Decode a workflow_job webhook body and keep only what the queue uses.
+
+    GitHub's payload carries the whole repository, sender and organisation
+    objects; dropping them here means queued jobs, the journal and the
+    intake backlog hold a few hundred bytes per job instead of tens of KB.
+    Raises ``ValueError`` for anything that isn't a usable payload.
+    """
+    payload = orjson.loads(body) if orjson else json.loads(body)
+    job = payload.get("workflow_job") if isinstance(payload, dict) else None
+    if not isinstance(job, dict) or "id" not in job:
+        raise ValueError("not a workflow_job payload")
+    return {
+        "action": payload.get("action"),
+        "workflow_job": {k: job[k] for k in _JOB_FIELDS if k in job},
+    }
+
+
+class WebhookIntake:
+    """
+    Bounded hand-off between webhook requests and the queue manager.
+
+    Handlers only verify and decode the request and drop the event here;
+    a single consumer applies events to the queue in arrival order, so a
+    job's queued/in_progress/completed events can't overtake one another.
+    When ``maxsize`` events are already waiting, ``submit`` refuses instead
+    of letting the backlog (and its memory) grow without bound.
+    """
+
+    def __init__(self, queue: QueueManager, maxsize: int) -> None:
+        self._queue = queue
+        self._events: asyncio.Queue[dict] = asyncio.Queue(maxsize)
+        self._task: asyncio.Task | None = None
+
+    @property
+    def depth(self) -> int:
+        return self._events.qsize()
+
+    @property
+    def full(self) -> bool:
+        return self._events.full()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._consume(), name="webhook-intake")
+
+    async def close(self) -> None:
+        # Apply whatever was accepted before shutting down
+        await self._events.join()
+        if self._task:
+            self._task.cancel()
+
+    def submit(self, payload: dict) -> bool:
+        try:
+            self._events.put_nowait(payload)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _consume(self) -> None:
+        handlers = {
+            "queued": self._queue.enqueue,
+            "in_progress": self._queue.job_started,
+            "completed": self._queue.job_completed,
+        }
+        while True:
+            payload = await self._events.get()
+            try:
+                handler = handlers.get(payload["action"])
+                if handler is not None:
+                    await handler(payload)
+            except Exception:
+                log.exception(
+                    "Failed to apply %s event for job %s",
+                    payload["action"], payload["workflow_job"]["id"],
+                )
+            finally:
+                self._events.task_done()
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+# Rewrite the journal once it holds this many records per live job
+_COMPACT_RATIO = 4
+_COMPACT_MIN_RECORDS = 1000
+
+
+class JobJournal:
+    """
+    Append-only JSON-lines journal of queued jobs.
+
+    Every queued job is written as ``{"op": "queued", "job": payload}`` and
+    retired with ``{"op": "done", "id": job_id}``; replaying the file yields
+    the jobs that were still waiting when the process stopped. Records are
+    buffered and written by a single flusher task that fsyncs once per batch
+    (group commit), so a burst of webhooks costs one fsync rather than one
+    per job and the event loop never blocks on disk.
+    """
+
+    def __init__(self, path: str, flush_interval: float) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self._live: dict[int, dict] = {}
+        self._records = 0
+        self._pending: list[str] = []
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task: asyncio.Task | None = None
+
+    def load(self) -> list[dict]:
+        """Replay the journal and return outstanding jobs in arrival order."""
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as fh:
+                for lineno, line in enumerate(fh, 1):
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash mid-write leaves at most one torn trailing line
+                        log.warning("Skipping corrupt journal record at line %d", lineno)
+                        continue
+                    if rec.get("op") == "queued":
+                        job = rec["job"]
+                        self._live[job["workflow_job"]["id"]] = job
+                    elif rec.get("op") == "done":
+                        self._live.pop(rec["id"], None)
+        else:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._compact(list(self._live.values()))
+        if self._live:
+            log.info("Recovered %d queued job(s) from %s", len(self._live), self.path)
+        return list(self._live.values())
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._flush_loop(), name="journal-flusher")
+
+    async def close(self) -> None:
+        # Let the flusher drain rather than cancelling it mid-write
+        self._closing = True
+        self._wakeup.set()
+        if self._task:
+            await self._task
+        else:
+            await self._flush()
+
+    def record_queued(self, payload: dict) -> None:
+        self._live[payload["workflow_job"]["id"]] = payload
+        self._append({"op": "queued", "job": payload})
+
+    def record_done(self, job_id: int) -> None:
+        if self._live.pop(job_id, None) is not None:
+            self._append({"op": "done", "id": job_id})
+
+    def _append(self, rec: dict) -> None:
+        self._pending.append(json.dumps(rec, separators=(",", ":")) + "\n")
+        self._wakeup.set()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if not self._closing:
+                # Let the rest of a webhook burst land in the same batch
+                await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                await self._flush()
+            except OSError:
+                log.exception("Failed to write job journal %s", self.path)
+            if self._closing:
+                return
+
+    async def _flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = "".join(self._pending), []
+        self._records += batch.count("\n")
+        if self._records > max(_COMPACT_MIN_RECORDS, _COMPACT_RATIO * len(self._live)):
+            # Snapshot on the loop; the batch is already reflected in _live
+            await asyncio.to_thread(self._compact, list(self._live.values()))
+        else:
+            await asyncio.to_thread(self._write, batch)
+
+    def _write(self, data: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def _compact(self, jobs: list[dict]) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            for job in jobs:
+                fh.write(json.dumps({"op": "queued", "job": job}, separators=(",", ":")) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.path)
+        # The rename itself is only durable once the directory entry is
+        _fsync_dir(os.path.dirname(self.path) or ".")
+        self._records = len(jobs)
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
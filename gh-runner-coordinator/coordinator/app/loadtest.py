@@ -0,0 +1,302 @@
+"""
+Load-test harness for the coordinator.
+
+Runs the real aiohttp app and QueueManager in-process against simulated
+workers (no WoL, ssh or GitHub traffic) and fires signed ``workflow_job``
+webhooks at a fixed rate, either synthetic or replayed from a JSON-lines
+file of recorded payloads. Reports webhook throughput and latency, queue
+wait and time to drain the queue.
+
+Usage:
+    python -m app.loadtest --jobs 1000 --rate 200 --workers 4
+    python -m app.loadtest --replay deliveries.jsonl --rate 50 --wake-latency 20
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+
+from .config import Config, WorkerConfig
+from .main import create_app
+from .queue_manager import QueueManager
+
+
+class SimulatedWorkers:
+    """
+    Drop-in for the worker_manager functions used by QueueManager.
+
+    Each call sleeps for its configured latency (with +/- ``jitter`` as a
+    fraction) instead of touching a real machine.
+    """
+
+    def __init__(
+        self,
+        wake_latency: float,
+        runner_time: float,
+        suspend_latency: float,
+        jitter: float,
+    ) -> None:
+        self.wake_latency = wake_latency
+        self.runner_time = runner_time
+        self.suspend_latency = suspend_latency
+        self.jitter = jitter
+        self._awake: set[str] = set()
+        self._woken_at: dict[str, float] = {}
+        self.wakes = 0
+        self.runs = 0
+        self.suspends = 0
+
+    def _latency(self, base: float) -> float:
+        return max(0.0, base * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def wake(self, cfg: Config, worker: WorkerConfig, timeline=None) -> None:
+        self.wakes += 1
+        self._woken_at.setdefault(worker.name, time.monotonic())
+
+    async def is_online(self, worker: WorkerConfig) -> bool:
+        return worker.name in self._awake
+
+    async def connect(self, worker: WorkerConfig) -> bool:
+        return True
+
+    async def wait_online(self, cfg: Config, worker: WorkerConfig, ready=None, expected=None) -> bool:
+        # wake() runs as a separate task alongside this one; give it a moment
+        for _ in range(100):
+            if worker.name in self._woken_at:
+                break
+            await asyncio.sleep(0.001)
+        woken = self._woken_at.get(worker.name)
+        if woken is None:
+            return False
+        ready_at = woken + self._latency(self.wake_latency)
+        await asyncio.sleep(max(0.0, ready_at - time.monotonic()))
+        self._awake.add(worker.name)
+        return True
+
+    async def run_runner(
+        self,
+        cfg: Config,
+        worker: WorkerConfig,
+        token: str,
+        runner_name: str,
+        output=None,
+        slot: int = 0,
+    ) -> int:
+        self.runs += 1
+        await asyncio.sleep(self._latency(self.runner_time))
+        if output is not None:
+            output.write(f"simulated runner {runner_name}\n".encode())
+        return 0
+
+    async def suspend(self, worker: WorkerConfig) -> None:
+        self.suspends += 1
+        await asyncio.sleep(self._latency(self.suspend_latency))
+        self._awake.discard(worker.name)
+        self._woken_at.pop(worker.name, None)
+
+
+class SimulatedGitHub:
+    def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def get_registration_token(self) -> str:
+        return "simulated-token"
+
+
+class _Recorder:
+    """Collects raw observations so percentiles are exact, not bucketed."""
+
+    def __init__(self) -> None:
+        self.values: list[float] = []
+
+    def observe(self, value: float) -> None:
+        self.values.append(value)
+
+
+def _percentiles(values: list[float]) -> tuple[float, float, float]:
+    if not values:
+        return float("nan"), float("nan"), float("nan")
+    if len(values) == 1:
+        return values[0], values[0], values[0]
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return q[49], q[98], max(values)
+
+
+def _synthetic(n: int, label_sets: list[list[str]]) -> list[dict]:
+    return [
+        {
+            "action": "queued",
+            "workflow_job": {"id": 1_000_000 + i, "labels": random.choice(label_sets)},
+        }
+        for i in range(n)
+    ]
+
+
+def _replayed(path: str, n: int | None) -> list[dict]:
+    with open(path, encoding="utf-8") as fh:
+        payloads = [json.loads(line) for line in fh if line.strip()]
+    return payloads[:n] if n else payloads
+
+
+def _configure_env(args: argparse.Namespace, workdir: str) -> None:
+    names = [f"sim{i}" for i in range(args.workers)]
+    os.environ.update({
+        "GITHUB_WEBHOOK_SECRET": "loadtest",
+        "GITHUB_TOKEN": "loadtest",
+        "GITHUB_REPO": "loadtest/loadtest",
+        "RUNNER_LABELS": args.worker_labels,
+        "WORKERS": ",".join(names),
+        "SUSPEND_GRACE_SECONDS": str(args.grace),
+        "WORKER_ONLINE_TIMEOUT": str(max(60, int(args.wake_latency * 4))),
+        "QUEUE_JOURNAL_PATH": os.path.join(workdir, "queue.jsonl"),
+        "POLICY_HISTORY_PATH": os.path.join(workdir, "arrivals.json"),
+        "HOT_STANDBY": "false",
+        "WORKER_SLOTS": str(args.slots),
+        "RUNNER_LOG_DIR": os.path.join(workdir, "runner-logs"),
+    })
+    for i, name in enumerate(names):
+        os.environ[f"WORKER_{name.upper()}_MAC"] = f"02:00:00:00:00:{i:02x}"
+        os.environ[f"WORKER_{name.upper()}_HOST"] = f"{name}.invalid"
+
+
+async def _post(
+    session: aiohttp.ClientSession,
+    url: str,
+    secret: bytes,
+    payload: dict,
+    latencies: list[float],
+    failures: list[int],
+) -> None:
+    body = json.dumps(payload).encode()
+    headers = {
+        "Content-Type": "application/json",
+        "X-GitHub-Event": "workflow_job",
+        "X-GitHub-Delivery": str(uuid.uuid4()),
+        "X-Hub-Signature-256": "sha256=" + hmac.new(secret, body, hashlib.sha256).hexdigest(),
+    }
+    started = time.perf_counter()
+    async with session.post(url, data=body, headers=headers) as resp:
+        await resp.read()
+        if resp.status != 200:
+            failures.append(resp.status)
+    latencies.append(time.perf_counter() - started)
+
+
+async def _run(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory(prefix="coordinator-loadtest-") as workdir:
+        _configure_env(args, workdir)
+        cfg = Config.from_env()
+        backend = SimulatedWorkers(
+            args.wake_latency, args.runner_time, args.suspend_latency, args.jitter
+        )
+        queue_wait = _Recorder()
+        queue = QueueManager(
+            cfg, worker_backend=backend, github=SimulatedGitHub(), queue_wait=queue_wait
+        )
+
+        if args.replay:
+            payloads = _replayed(args.replay, args.jobs)
+        else:
+            label_sets = [s.split(",") for s in args.labels.split(";")]
+            payloads = _synthetic(args.jobs, label_sets)
+        queued = sum(1 for p in payloads if p.get("action") == "queued")
+
+        app = create_app(cfg, queue)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            url = str(server.make_url("/webhook"))
+            latencies: list[float] = []
+            failures: list[int] = []
+            connector = aiohttp.TCPConnector(limit=args.concurrency)
+            async with aiohttp.ClientSession(connector=connector) as session:
+                loop = asyncio.get_running_loop()
+                start = loop.time()
+                tasks = []
+                for i, payload in enumerate(payloads):
+                    delay = start + i / args.rate - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    tasks.append(asyncio.create_task(
+                        _post(session, url, cfg.github_webhook_secret.encode(), payload,
+                              latencies, failures)
+                    ))
+                await asyncio.gather(*tasks)
+                send_elapsed = loop.time() - start
+
+                # Wait for the intake to apply every accepted event and for
+                # every queued job to be dispatched and finish
+                await asyncio.sleep(0.05)
+                intake = app["intake"]
+                while intake.depth or queue.queue_size or any(w.busy for w in queue.workers):
+                    if loop.time() - start > args.timeout:
+                        print("[warn] timed out waiting for the queue to drain")
+                        break
+                    await asyncio.sleep(0.01)
+                drain_elapsed = loop.time() - start
+        finally:
+            await server.close()
+
+    p50, p99, worst = _percentiles(latencies)
+    w50, w99, wmax = _percentiles(queue_wait.values)
+    print(f"webhooks sent:        {len(payloads)} ({len(failures)} non-200)")
+    print(f"offered rate:         {args.rate:.0f}/s")
+    print(f"achieved throughput:  {len(latencies) / send_elapsed:.0f}/s")
+    print(f"webhook latency:      p50 {p50 * 1000:.2f}ms  p99 {p99 * 1000:.2f}ms  "
+          f"max {worst * 1000:.2f}ms")
+    print(f"jobs dispatched:      {len(queue_wait.values)} of {queued} queued "
+          f"(unmatched labels are ignored)")
+    print(f"queue wait:           p50 {w50:.3f}s  p99 {w99:.3f}s  max {wmax:.3f}s")
+    print(f"time to drain:        {drain_elapsed:.2f}s")
+    print(f"simulated wakes/runs/suspends: "
+          f"{backend.wakes}/{backend.runs}/{backend.suspends}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Load-test the coordinator with simulated workers.")
+    ap.add_argument("--jobs", type=int, default=500,
+                    help="Number of webhooks to send (with --replay: cap on replayed lines)")
+    ap.add_argument("--rate", type=float, default=100.0, help="Webhooks per second")
+    ap.add_argument("--concurrency", type=int, default=100,
+                    help="Max in-flight webhook requests")
+    ap.add_argument("--replay", type=str, default=None,
+                    help="JSON-lines file of recorded workflow_job payloads to send instead")
+    ap.add_argument("--labels", type=str, default="self-hosted,physical-worker",
+                    help="';'-separated runs-on label sets to draw synthetic jobs from")
+    ap.add_argument("--workers", type=int, default=2, help="Simulated workers")
+    ap.add_argument("--slots", type=int, default=1, help="Runner slots per simulated worker")
+    ap.add_argument("--worker-labels", type=str, default="self-hosted,physical-worker",
+                    help="Labels every simulated worker carries")
+    ap.add_argument("--wake-latency", type=float, default=2.0,
+                    help="Seconds from WoL to the worker being online")
+    ap.add_argument("--runner-time", type=float, default=0.5, help="Seconds each job runs")
+    ap.add_argument("--suspend-latency", type=float, default=0.2,
+                    help="Seconds a suspend takes")
+    ap.add_argument("--jitter", type=float, default=0.2,
+                    help="Random +/- fraction applied to every simulated latency")
+    ap.add_argument("--grace", type=int, default=1, help="SUSPEND_GRACE_SECONDS")
+    ap.add_argument("--timeout", type=float, default=600.0,
+                    help="Give up waiting for the queue to drain after this many seconds")
+    args = ap.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
-import asyncio
 import hashlib
 import hmac
-import json
 import logging
 import sys
+import time
 
 from aiohttp import web
 
+from . import metrics
 from .config import Config
-from .queue_manager import QueueManager
+from .dedup import TTLCache
+from .intake import ACTIONS, WebhookIntake, parse_workflow_job
+from .queue_manager import QueueManager, WorkerState
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,10 +26,24 @@ def _verify_signature(secret: str, body: bytes, sig_header: str) -> bool:
 
 
 async def handle_webhook(request: web.Request) -> web.Response:
+    started = time.perf_counter()
+    try:
+        resp = await _handle_webhook(request)
+        metrics.WEBHOOKS_TOTAL.labels(resp.text).inc()
+        return resp
+    except web.HTTPException as exc:
+        metrics.WEBHOOKS_TOTAL.labels(str(exc.status)).inc()
+        raise
+    finally:
+        metrics.WEBHOOK_SECONDS.observe(time.perf_counter() - started)
+
+
+async def _handle_webhook(request: web.Request) -> web.Response:
+    # Every request is authenticated first; after that the cheapest checks
+    # come first, and nothing is parsed until the event type matches
     body = await request.read()
     sig = request.headers.get("X-Hub-Signature-256", "")
     cfg: Config = request.app["cfg"]
-
     if not _verify_signature(cfg.github_webhook_secret, body, sig):
         log.warning("Rejected webhook — invalid signature from %s", request.remote)
         raise web.HTTPForbidden(reason="Invalid signature")
@@ -36,18 +52,104 @@ async def handle_webhook(request: web.Request) -> web.Response:
     if event != "workflow_job":
         return web.Response(text="ignored")
 
-    payload = json.loads(body)
-    action = payload.get("action")
-    queue: QueueManager = request.app["queue"]
+    intake: WebhookIntake = request.app["intake"]
+    if intake.full:
+        # Refuse before recording the delivery, so GitHub's redelivery is accepted
+        raise _intake_full(intake)
+
+    try:
+        payload = parse_workflow_job(body)
+    except ValueError:
+        raise web.HTTPBadRequest(reason="Malformed workflow_job payload")
+    if payload["action"] not in ACTIONS:
+        return web.Response(text="ignored")
 
-    if action == "queued":
-        asyncio.create_task(queue.enqueue(payload))
-    elif action == "completed":
-        asyncio.create_task(queue.job_completed(payload))
+    delivery = request.headers.get("X-GitHub-Delivery", "")
+    deliveries: TTLCache = request.app["deliveries"]
+    if delivery and not deliveries.add(delivery):
+        log.info("Ignoring redelivered webhook %s", delivery)
+        return web.Response(text="duplicate")
 
+    if not intake.submit(payload):
+        # Filled up since the check above; forget the delivery so it can be retried
+        deliveries.discard(delivery)
+        raise _intake_full(intake)
     return web.Response(text="ok")
 
 
+def _intake_full(intake: WebhookIntake) -> web.HTTPServiceUnavailable:
+    log.warning("Webhook intake full (%d waiting) — refusing delivery", intake.depth)
+    return web.HTTPServiceUnavailable(reason="Intake queue full", headers={"Retry-After": "5"})
+
+
+def _check_bearer(request: web.Request, token: str, what: str) -> None:
+    # Endpoints guarded by an optional token don't exist until it is set
+    if not token:
+        raise web.HTTPNotFound()
+    auth = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(auth, f"Bearer {token}"):
+        log.warning("Rejected %s request from %s", what, request.remote)
+        raise web.HTTPForbidden(reason="Invalid token")
+
+
+async def handle_ready(request: web.Request) -> web.Response:
+    """Called by a worker once it has resumed, to skip the rest of polling."""
+    cfg: Config = request.app["cfg"]
+    _check_bearer(request, cfg.worker_ready_token, "readiness callback")
+    queue: QueueManager = request.app["queue"]
+    if not queue.worker_ready(request.match_info["worker"]):
+        raise web.HTTPNotFound(reason="Unknown worker")
+    return web.Response(text="ok")
+
+
+async def handle_logs(request: web.Request) -> web.Response:
+    cfg: Config = request.app["cfg"]
+    _check_bearer(request, cfg.runner_log_token, "runner log")
+    queue: QueueManager = request.app["queue"]
+    return web.json_response({"runners": queue.logs.summaries()})
+
+
+async def handle_log(request: web.Request) -> web.StreamResponse:
+    """
+    Stream one runner's output, following it live while the runner is up.
+
+    ``?offset=N`` resumes from byte N of the runner's output. Runners that
+    have exited are served from their archive once it is complete, since the
+    in-memory ring may have dropped the start of the output.
+    """
+    cfg: Config = request.app["cfg"]
+    _check_bearer(request, cfg.runner_log_token, "runner log")
+    queue: QueueManager = request.app["queue"]
+    name = request.match_info["runner"]
+    try:
+        offset = int(request.query.get("offset", "0"))
+    except ValueError:
+        raise web.HTTPBadRequest(reason="offset must be an integer")
+    if offset < 0:
+        raise web.HTTPBadRequest(reason="offset must be >= 0")
+
+    runner_log = queue.logs.get(name)
+    if runner_log is None or runner_log.archived:
+        path = queue.logs.archive_path(name)
+        if path is not None:
+            data = await queue.logs.read_archive(path)
+            return web.Response(body=data[offset:], content_type="text/plain", charset="utf-8")
+        if runner_log is None:
+            raise web.HTTPNotFound(reason="Unknown runner")
+
+    resp = web.StreamResponse(headers={
+        "Content-Type": "text/plain; charset=utf-8",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    resp.enable_chunked_encoding()
+    await resp.prepare(request)
+    async for view in runner_log.follow(offset):
+        await resp.write(view)
+    await resp.write_eof()
+    return resp
+
+
 async def handle_health(_request: web.Request) -> web.Response:
     return web.Response(text="ok")
 
@@ -55,29 +157,76 @@ async def handle_health(_request: web.Request) -> web.Response:
 async def handle_status(request: web.Request) -> web.Response:
     queue: QueueManager = request.app["queue"]
     return web.json_response({
-        "worker_state": queue.state.name,
+        "workers": [
+            {
+                "name": w.name,
+                "state": w.state.name,
+                "busy": w.busy,
+                "slots": len(w.slots),
+                "slots_in_use": w.occupancy,
+                "standby": w.standby is not None,
+                "labels": sorted(w.labels),
+                "last_wake": w.last_wake.summary() if w.last_wake else None,
+            }
+            for w in queue.workers
+        ],
         "queue_depth": queue.queue_size,
+        "queue_depth_by_labels": queue.queue_depths(),
+        "hot_standby": queue.cfg.hot_standby,
+        "queue_to_start_seconds": metrics.QUEUE_TO_START_SECONDS.snapshot(),
+        "policy": {
+            "adaptive": queue.cfg.adaptive_policy,
+            **queue.policy.snapshot(time.time()),
+        },
     })
 
 
+async def handle_metrics(request: web.Request) -> web.Response:
+    queue: QueueManager = request.app["queue"]
+    # Point-in-time gauges are sampled at scrape time rather than on every change
+    metrics.QUEUE_DEPTH.set(queue.queue_size)
+    metrics.INTAKE_DEPTH.set(request.app["intake"].depth)
+    for w in queue.workers:
+        for state in WorkerState:
+            metrics.WORKER_STATE.labels(w.name, state.name).set(int(w.state is state))
+    return web.Response(
+        body=metrics.REGISTRY.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
 async def on_startup(app: web.Application) -> None:
     app["queue"].start()
+    app["intake"].start()
     log.info("Coordinator ready on :8080")
 
 
-def main() -> None:
-    cfg = Config.from_env()
-    queue = QueueManager(cfg)
+async def on_cleanup(app: web.Application) -> None:
+    await app["intake"].close()
+    await app["queue"].stop()
 
+
+def create_app(cfg: Config, queue: QueueManager | None = None) -> web.Application:
     app = web.Application()
     app["cfg"] = cfg
-    app["queue"] = queue
+    app["queue"] = queue or QueueManager(cfg)
+    app["intake"] = WebhookIntake(app["queue"], cfg.webhook_queue_size)
+    app["deliveries"] = TTLCache(cfg.dedup_ttl_seconds, cfg.dedup_max_entries)
     app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
 
     app.router.add_post("/webhook", handle_webhook)
+    app.router.add_post("/ready/{worker}", handle_ready)
     app.router.add_get("/health", handle_health)
     app.router.add_get("/status", handle_status)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/logs", handle_logs)
+    app.router.add_get("/logs/{runner}", handle_log)
+    return app
+
 
+def main() -> None:
+    app = create_app(Config.from_env())
     web.run_app(app, host="0.0.0.0", port=8080, access_log=None)
 
 
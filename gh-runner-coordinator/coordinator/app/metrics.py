@@ -0,0 +1,235 @@
+"""
+Minimal Prometheus-style metrics.
+
+Everything runs on the event loop thread, so updates are plain attribute
+arithmetic with no locks; rendering the text exposition format happens only
+when /metrics is scraped.
+"""
+
+import bisect
+import math
+from collections.abc import Sequence
+
+# Seconds; covers warm starts through a full WoL cold start
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+# Seconds; in-process request handling
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+# Seconds; a CI job from runner start to exit
+RUNTIME_BUCKETS = (30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Gauge:
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect plus two additions."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (math.inf,), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return math.inf
+
+    def snapshot(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, n in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += n
+            buckets[_fmt_bound(bound)] = cumulative
+        quantiles = {
+            f"p{int(q * 100)}": _fmt_bound(self.quantile(q)) if self.count else None
+            for q in (0.5, 0.9, 0.99)
+        }
+        return {"count": self.count, "sum": round(self.sum, 3), **quantiles, "buckets": buckets}
+
+
+def _fmt_bound(bound: float) -> str:
+    return "+Inf" if bound == math.inf else f"{bound:g}"
+
+
+class _Family:
+    """A named metric with one child per distinct label-value tuple."""
+
+    def __init__(self, kind: str, name: str, help: str, labelnames: Sequence[str], factory):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children: dict[tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = factory()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._factory()
+        return child
+
+    # Unlabelled families proxy straight to their single child
+    def inc(self, amount: float = 1.0) -> None:
+        self._children[()].inc(amount)
+
+    def set(self, value: float) -> None:
+        self._children[()].set(value)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def snapshot(self) -> dict:
+        return self._children[()].snapshot()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._children.items():
+            pairs = [f'{k}="{v}"' for k, v in zip(self.labelnames, values)]
+            if isinstance(child, Histogram):
+                cumulative = 0
+                for bound, n in zip(child.buckets + (math.inf,), child.counts):
+                    cumulative += n
+                    le = ",".join(pairs + [f'le="{_fmt_bound(bound)}"'])
+                    lines.append(f"{self.name}_bucket{{{le}}} {cumulative}")
+                suffix = "{" + ",".join(pairs) + "}" if pairs else ""
+                lines.append(f"{self.name}_sum{suffix} {child.sum:g}")
+                lines.append(f"{self.name}_count{suffix} {child.count}")
+            else:
+                suffix = "{" + ",".join(pairs) + "}" if pairs else ""
+                lines.append(f"{self.name}{suffix} {child.value:g}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._families: list[_Family] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> _Family:
+        return self._add(_Family("counter", name, help, labelnames, Counter))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> _Family:
+        return self._add(_Family("gauge", name, help, labelnames, Gauge))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> _Family:
+        return self._add(
+            _Family("histogram", name, help, labelnames, lambda: Histogram(buckets))
+        )
+
+    def _add(self, family: _Family) -> _Family:
+        self._families.append(family)
+        return family
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for family in self._families:
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+WEBHOOK_SECONDS = REGISTRY.histogram(
+    "coordinator_webhook_handling_seconds",
+    "Time spent handling a webhook request",
+    buckets=FAST_BUCKETS,
+)
+WEBHOOKS_TOTAL = REGISTRY.counter(
+    "coordinator_webhooks_total", "Webhook requests by outcome", ["result"]
+)
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "coordinator_queue_wait_seconds", "Time a job waited in the queue before dispatch"
+)
+QUEUE_TO_START_SECONDS = REGISTRY.histogram(
+    "coordinator_queue_to_start_seconds",
+    "Time from a job's queued webhook to GitHub reporting it in progress",
+)
+QUEUE_DEPTH = REGISTRY.gauge("coordinator_queue_depth", "Jobs waiting for a worker")
+INTAKE_DEPTH = REGISTRY.gauge(
+    "coordinator_webhook_intake_depth", "Accepted webhook events not yet applied to the queue"
+)
+WAKE_TO_ONLINE_SECONDS = REGISTRY.histogram(
+    "coordinator_wake_to_online_seconds",
+    "Time from sending WoL to the worker accepting ssh",
+    ["worker"],
+)
+RUNNER_RUNTIME_SECONDS = REGISTRY.histogram(
+    "coordinator_runner_runtime_seconds",
+    "Wall time of an ephemeral runner",
+    ["worker"],
+    buckets=RUNTIME_BUCKETS,
+)
+RUNNER_LOG_BYTES_TOTAL = REGISTRY.counter(
+    "coordinator_runner_log_bytes_total", "Runner output captured", ["worker"]
+)
+SUSPENDS_TOTAL = REGISTRY.counter(
+    "coordinator_suspends_total", "Worker suspends issued", ["worker"]
+)
+WOL_RETRIES_TOTAL = REGISTRY.counter(
+    "coordinator_wol_retries_total",
+    "WoL bursts resent because the worker was not online yet",
+    ["worker"],
+)
+WAKE_FAILURES_TOTAL = REGISTRY.counter(
+    "coordinator_wake_failures_total",
+    "Wakes that timed out without the worker coming online",
+    ["worker"],
+)
+WORKER_STATE = REGISTRY.gauge(
+    "coordinator_worker_state", "1 for the worker's current state", ["worker", "state"]
+)
+DISPATCHES_TOTAL = REGISTRY.counter(
+    "coordinator_dispatches_total",
+    "Jobs dispatched, by whether the worker was already online",
+    ["start"],
+)
+IDLE_ONLINE_SECONDS_TOTAL = REGISTRY.counter(
+    "coordinator_idle_online_seconds_total",
+    "Time workers spent online with nothing to run",
+    ["worker"],
+)
+SUSPEND_GRACE_SECONDS = REGISTRY.gauge(
+    "coordinator_suspend_grace_seconds", "Most recent suspend grace period", ["worker"]
+)
+PREWAKES_TOTAL = REGISTRY.counter(
+    "coordinator_prewakes_total", "Workers woken ahead of predicted jobs"
+)
+PREWAKE_HITS_TOTAL = REGISTRY.counter(
+    "coordinator_prewake_hits_total", "Pre-woken workers that received a job"
+)
+PREWAKE_MISSES_TOTAL = REGISTRY.counter(
+    "coordinator_prewake_misses_total", "Pre-woken workers suspended without a job"
+)
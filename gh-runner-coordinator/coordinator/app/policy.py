@@ -0,0 +1,190 @@
+import itertools
+import json
+import logging
+import math
+import os
+import statistics
+import time
+from collections import Counter, deque
+
+from .config import Config
+
+log = logging.getLogger(__name__)
+
+HISTORY_SECONDS = 14 * 86400
+MAX_HISTORY = 50_000
+# Below this many arrivals the model falls back to the fixed grace period
+MIN_HISTORY = 20
+# Inter-arrival gaps considered when judging burstiness
+BURST_SAMPLE = 50
+# After a pre-wake that no job used, don't pre-wake again for this long
+PREWAKE_COOLDOWN_SECONDS = 3600
+# Each recent miss in an hour-of-day slot halves that slot's forecast
+PREWAKE_MISS_WEIGHT = 0.5
+
+
+def _slot(ts: float) -> tuple[bool, int]:
+    t = time.localtime(ts)
+    return t.tm_wday >= 5, t.tm_hour
+
+
+class WakePolicy:
+    """
+    Learns job arrival patterns and decides when to pre-wake and how long
+    to stay up.
+
+    Arrivals from a rolling two-week window are bucketed by hour of day,
+    separately for weekdays and weekends, giving an expected arrival rate for
+    any moment. Recent inter-arrival gaps give burstiness (coefficient of
+    variation; > 1 means arrivals clump together). From those:
+
+    * the suspend grace period scales with the probability that another job
+      arrives within one cold-start time, and is held at the maximum while a
+      burst is in progress;
+    * a worker is pre-woken when the expected number of arrivals in the
+      look-ahead window crosses the configured threshold.
+
+    A pre-wake that no job used (a miss) starts a cooldown, so the worker
+    isn't woken again every policy check while the forecast stays high. It
+    also discounts that hour-of-day slot's forecast. A hit in the slot
+    removes one recorded miss.
+    """
+
+    def __init__(self, cfg: Config) -> None:
+        self.cfg = cfg
+        self._arrivals: deque[float] = deque()
+        self._slot_counts: Counter[tuple[bool, int]] = Counter()
+        self._misses: deque[float] = deque()
+        self._cooldown_until = 0.0
+        self.last_decision: dict = {}
+
+    def load(self) -> None:
+        path = self.cfg.policy_history_path
+        try:
+            with open(path, encoding="utf-8") as fh:
+                history = json.load(fh)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            log.exception("Could not read arrival history %s", path)
+            return
+        for ts in history:
+            self.record(ts)
+        log.info("Loaded %d job arrivals from %s", len(self._arrivals), path)
+
+    def save(self) -> None:
+        path = self.cfg.policy_history_path
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(list(self._arrivals), fh)
+            os.replace(tmp, path)
+        except OSError:
+            log.exception("Could not write arrival history %s", path)
+
+    def record(self, ts: float) -> None:
+        self._arrivals.append(ts)
+        self._slot_counts[_slot(ts)] += 1
+        cutoff = ts - HISTORY_SECONDS
+        while self._arrivals and (
+            self._arrivals[0] < cutoff or len(self._arrivals) > MAX_HISTORY
+        ):
+            self._slot_counts[_slot(self._arrivals.popleft())] -= 1
+
+    @property
+    def trained(self) -> bool:
+        return len(self._arrivals) >= MIN_HISTORY
+
+    def rate(self, ts: float) -> float:
+        """Expected arrivals per second in the hour-of-day slot containing ``ts``."""
+        if not self._arrivals:
+            return 0.0
+        weekend, hour = _slot(ts)
+        hits = self._slot_counts[weekend, hour]
+        span_days = max((ts - self._arrivals[0]) / 86400, 1.0)
+        days_of_kind = span_days * (2 / 7 if weekend else 5 / 7)
+        return hits / max(days_of_kind, 1.0) / 3600
+
+    def _recent_gaps(self) -> list[float]:
+        recent = list(itertools.islice(reversed(self._arrivals), BURST_SAMPLE + 1))
+        return [a - b for a, b in zip(recent, recent[1:])]
+
+    def burstiness(self) -> float:
+        gaps = self._recent_gaps()
+        if len(gaps) < 2:
+            return 0.0
+        mean = statistics.fmean(gaps)
+        return statistics.pstdev(gaps) / mean if mean > 0 else 0.0
+
+    def _in_burst(self, now: float) -> bool:
+        if not self._arrivals or self.burstiness() <= 1.0:
+            return False
+        gaps = sorted(self._recent_gaps())
+        # Still inside a clump if the last arrival is closer than a typical gap
+        return now - self._arrivals[-1] <= gaps[len(gaps) // 2] * 2
+
+    def grace_seconds(self, now: float) -> int:
+        cfg = self.cfg
+        if not self.trained:
+            grace = cfg.suspend_grace_seconds
+            reason = "untrained"
+        elif self._in_burst(now):
+            grace = cfg.suspend_grace_max_seconds
+            reason = "burst"
+        else:
+            # Chance another job shows up before a cold start could finish
+            p = 1 - math.exp(-self.rate(now) * cfg.worker_online_timeout)
+            span = cfg.suspend_grace_max_seconds - cfg.suspend_grace_min_seconds
+            grace = round(cfg.suspend_grace_min_seconds + span * p)
+            reason = f"p_next={p:.2f}"
+        self._decide("grace", now, grace_seconds=grace, reason=reason)
+        return grace
+
+    def record_prewake(self, woken_at: float, hit: bool) -> None:
+        """Outcome of a pre-wake made at ``woken_at``: used by a job, or suspended unused."""
+        if hit:
+            slot = _slot(woken_at)
+            for ts in self._misses:
+                if _slot(ts) == slot:
+                    self._misses.remove(ts)
+                    break
+            return
+        self._misses.append(woken_at)
+        cutoff = woken_at - HISTORY_SECONDS
+        while self._misses and self._misses[0] < cutoff:
+            self._misses.popleft()
+        self._cooldown_until = time.time() + PREWAKE_COOLDOWN_SECONDS
+
+    def _miss_weight(self, ts: float) -> float:
+        slot = _slot(ts)
+        return PREWAKE_MISS_WEIGHT ** sum(1 for m in self._misses if _slot(m) == slot)
+
+    def should_prewake(self, now: float) -> bool:
+        if not self.trained:
+            return False
+        if now < self._cooldown_until:
+            self._decide("prewake", now, wake=False,
+                         cooldown_seconds=round(self._cooldown_until - now))
+            return False
+        lookahead = self.cfg.prewake_lookahead_seconds
+        # Integrate over the look-ahead in case it crosses into a busier hour
+        expected = (
+            self.rate(now) * self._miss_weight(now)
+            + self.rate(now + lookahead) * self._miss_weight(now + lookahead)
+        ) / 2 * lookahead
+        wake = expected >= self.cfg.prewake_threshold
+        self._decide("prewake", now, expected_arrivals=round(expected, 2), wake=wake)
+        return wake
+
+    def _decide(self, kind: str, now: float, **detail) -> None:
+        self.last_decision[kind] = {"at": round(now), **detail}
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "arrivals_in_window": len(self._arrivals),
+            "trained": self.trained,
+            "rate_per_hour": round(self.rate(now) * 3600, 2),
+            "burstiness": round(self.burstiness(), 2),
+            "prewake_misses": len(self._misses),
+            "decisions": self.last_decision,
+        }
@@ -1,14 +1,30 @@
 import asyncio
+import itertools
 import logging
+import statistics
 import time
+from collections import deque
 from enum import Enum, auto
 
-from .config import Config
-from .github_client import get_registration_token
+from .config import Config, WorkerConfig
+from .dedup import TTLCache
+from .github_client import GitHubClient
+from .journal import JobJournal
+from .policy import WakePolicy
+from .runner_logs import RunnerLogStore
+from .wol import WakeTimeline
+from . import metrics
 from . import worker_manager as wm
 
 log = logging.getLogger(__name__)
 
+POLICY_CHECK_INTERVAL = 60
+POLICY_SAVE_INTERVAL = 3600
+# After a failed wake a worker is passed over for this long, doubling with
+# each further failure in a row, before it is woken again
+WAKE_RETRY_BACKOFF = 30
+WAKE_RETRY_BACKOFF_MAX = 600
+
 
 class WorkerState(Enum):
     OFFLINE = auto()
@@ -18,98 +34,635 @@ class WorkerState(Enum):
     SUSPENDING = auto()
 
 
+# Preference order when several workers have a free slot: reuse a machine
+# that is already up before paying for another cold start.
+_WAKE_COST = {
+    WorkerState.ONLINE: 0,
+    WorkerState.RUNNING: 0,
+    WorkerState.WAKING: 1,
+    WorkerState.OFFLINE: 2,
+}
+
+
+def job_labels(payload: dict) -> frozenset[str]:
+    return frozenset(lbl.lower() for lbl in payload["workflow_job"].get("labels", []))
+
+
+class Worker:
+    """Lifecycle state for one physical worker in the pool."""
+
+    def __init__(self, cfg: WorkerConfig) -> None:
+        self.cfg = cfg
+        self.labels = cfg.label_set
+        self.state = WorkerState.OFFLINE
+        # One flag per runner slot, held from dispatch (or pre-wake) until
+        # the slot's runner exits
+        self.slots = [False] * cfg.slots
+        # Runners currently executing; the worker is RUNNING while non-zero
+        self.running = 0
+        self.suspend_task: asyncio.Task | None = None
+        # Pre-registered ephemeral runner waiting for GitHub to assign a job,
+        # its name, and the slot it was registered in. The slot stays
+        # unclaimed until a dispatch adopts the runner, or until GitHub starts
+        # a job on it that no dispatch will adopt (standby_busy).
+        self.standby: asyncio.Task | None = None
+        self.standby_slot: int | None = None
+        self.standby_runner: str | None = None
+        self.standby_busy = False
+        # Serialises waking when several slots are dispatched at once
+        self.wake_lock = asyncio.Lock()
+        # When the policy woke it ahead of any job; cleared by the next job
+        self.prewoken: float | None = None
+        self.idle_since: float | None = None
+        # Set by the worker's readiness callback after it resumes
+        self.ready = asyncio.Event()
+        self.wake_durations: deque[float] = deque(maxlen=20)
+        self.last_wake: WakeTimeline | None = None
+        # Failed wakes in a row, and when (monotonic) the next may start
+        self.wake_failures = 0
+        self.wake_retry_at = 0.0
+        self.wake_retry: asyncio.TimerHandle | None = None
+
+    @property
+    def name(self) -> str:
+        return self.cfg.name
+
+    @property
+    def occupancy(self) -> int:
+        return sum(self.slots)
+
+    @property
+    def busy(self) -> bool:
+        return any(self.slots)
+
+    @property
+    def cooling_down(self) -> bool:
+        return self.state is WorkerState.OFFLINE and time.monotonic() < self.wake_retry_at
+
+    @property
+    def available(self) -> bool:
+        return not all(self.slots) and self.state in _WAKE_COST and not self.cooling_down
+
+    def claim(self) -> int:
+        # The standby runner's slot goes first, so the job claiming it adopts it
+        if self.standby_slot is not None and not self.slots[self.standby_slot]:
+            slot = self.standby_slot
+        else:
+            slot = self.slots.index(False)
+        self.slots[slot] = True
+        return slot
+
+    def release(self, slot: int) -> None:
+        self.slots[slot] = False
+
+    def cancel_suspend(self) -> None:
+        if self.suspend_task and not self.suspend_task.done():
+            log.info("Job assigned to %s — cancelling pending suspend", self.name)
+            self.suspend_task.cancel()
+
+    def take_standby(self, slot: int | None = None) -> asyncio.Task | None:
+        """Detach the standby runner; with ``slot``, only if it lives there."""
+        if slot is not None and slot != self.standby_slot:
+            return None
+        task, self.standby, self.standby_slot = self.standby, None, None
+        self.standby_runner, self.standby_busy = None, False
+        return task if task and not task.done() else None
+
+
 class QueueManager:
-    def __init__(self, cfg: Config) -> None:
+    """
+    Per-label-set FIFO queues dispatched onto a pool of workers.
+
+    Each distinct set of ``runs-on`` labels gets its own queue. The first
+    time a label set is seen it is matched against every worker once and
+    the result is indexed both ways (label set -> eligible workers, worker
+    -> label sets it serves), so later enqueues and worker releases only
+    look at queues and workers that can actually pair up.
+    """
+
+    def __init__(
+        self,
+        cfg: Config,
+        worker_backend=wm,
+        github: GitHubClient | None = None,
+        queue_wait=metrics.QUEUE_WAIT_SECONDS,
+    ) -> None:
+        # worker_backend provides the worker_manager functions; the load-test
+        # harness swaps in simulated workers here, and collects exact
+        # queue-wait samples through queue_wait (anything with observe()).
         self.cfg = cfg
-        self._queue: asyncio.Queue[dict] = asyncio.Queue()
-        self._state = WorkerState.OFFLINE
-        self._suspend_task: asyncio.Task | None = None
+        self._wm = worker_backend
+        self._queue_wait = queue_wait
+        self._workers = [Worker(w) for w in cfg.workers]
+        self._queues: dict[frozenset[str], deque[tuple[int, dict]]] = {}
+        self._eligible: dict[frozenset[str], tuple[Worker, ...]] = {}
+        self._served: dict[str, list[frozenset[str]]] = {w.name: [] for w in self._workers}
+        self._seq = itertools.count()
+        self._depth = 0
+        # job id -> label set of the queue currently holding it
+        self._queued_keys: dict[int, frozenset[str]] = {}
+        self._seen_jobs = TTLCache(cfg.dedup_ttl_seconds, cfg.dedup_max_entries)
+        self._enqueued_at: dict[int, float] = {}
         self._job_counter = 0
+        self._github = github or GitHubClient(cfg)
+        self._journal = JobJournal(
+            cfg.queue_journal_path, cfg.queue_journal_flush_ms / 1000
+        )
+        self.policy = WakePolicy(cfg)
+        self.logs = RunnerLogStore(cfg)
+        self._policy_task: asyncio.Task | None = None
+        self._stopping = False
 
     @property
-    def state(self) -> WorkerState:
-        return self._state
+    def workers(self) -> list[Worker]:
+        return list(self._workers)
 
     @property
     def queue_size(self) -> int:
-        return self._queue.qsize()
+        return self._depth
+
+    def queue_depths(self) -> dict[str, int]:
+        return {",".join(sorted(key)): len(q) for key, q in self._queues.items() if q}
 
     def start(self) -> None:
-        asyncio.create_task(self._process_loop(), name="queue-processor")
-        log.info("Queue processor started")
+        for payload in self._journal.load():
+            self._seen_jobs.add(payload["workflow_job"]["id"])
+            if not self._admit(payload):
+                self._journal.record_done(payload["workflow_job"]["id"])
+        self._journal.start()
+        self.logs.start()
+        self._github.start()
+        if self.cfg.adaptive_policy:
+            self.policy.load()
+            self._policy_task = asyncio.create_task(self._policy_loop(), name="wake-policy")
+        log.info(
+            "Queue manager started (%d workers, %d queued)",
+            len(self._workers), self._depth,
+        )
+
+    async def stop(self) -> None:
+        self._stopping = True
+        standbys = [t for w in self._workers if (t := w.take_standby())]
+        for task in standbys:
+            task.cancel()
+        if standbys:
+            await asyncio.wait(standbys)
+        for w in self._workers:
+            if w.wake_retry:
+                w.wake_retry.cancel()
+        if self._policy_task:
+            self._policy_task.cancel()
+            self.policy.save()
+        await self._github.close()
+        await self._journal.close()
+        await self.logs.close()
+
+    def worker_ready(self, name: str) -> bool:
+        for w in self._workers:
+            if w.name == name:
+                w.ready.set()
+                return True
+        return False
 
     async def enqueue(self, payload: dict) -> None:
         job_id = payload["workflow_job"]["id"]
-        if self._suspend_task and not self._suspend_task.done():
-            log.info("Job %s arrived — cancelling pending suspend", job_id)
-            self._suspend_task.cancel()
-        depth = self._queue.qsize() + 1
-        log.info("Enqueued job %s (queue depth: %d)", job_id, depth)
-        await self._queue.put(payload)
+        if not self._seen_jobs.add(job_id):
+            log.info("Ignoring duplicate queued event for job %s", job_id)
+            return
+        self.policy.record(time.time())
+        # Stamped before admission: a free worker may take the job immediately
+        self._enqueued_at[job_id] = time.monotonic()
+        if self._admit(payload):
+            self._journal.record_queued(payload)
+        else:
+            del self._enqueued_at[job_id]
+
+    async def job_started(self, payload: dict) -> None:
+        job_id = payload["workflow_job"]["id"]
+        runner_name = payload["workflow_job"].get("runner_name")
+        self.logs.tag(runner_name, job_id)
+        self._standby_started(runner_name)
+        enqueued = self._enqueued_at.get(job_id)
+        if enqueued is not None:
+            latency = time.monotonic() - enqueued
+            metrics.QUEUE_TO_START_SECONDS.observe(latency)
+            log.info(
+                "Job %s picked up by %s after %.1fs",
+                job_id, payload["workflow_job"].get("runner_name"), latency,
+            )
+
+    def _admit(self, payload: dict) -> bool:
+        job_id = payload["workflow_job"]["id"]
+        key = job_labels(payload)
+        if not self._index(key):
+            log.info(
+                "Ignoring job %s — no worker matches labels %s", job_id, sorted(key)
+            )
+            return False
+        self._push(key, (next(self._seq), payload))
+        log.info(
+            "Enqueued job %s for %s (queue depth: %d)",
+            job_id, sorted(key), self._depth,
+        )
+        self._schedule_job(key)
+        return True
 
     async def job_completed(self, payload: dict) -> None:
         job_id = payload["workflow_job"]["id"]
         conclusion = payload["workflow_job"].get("conclusion", "unknown")
         log.info("GitHub reports job %s completed: %s", job_id, conclusion)
+        # A completed job must never be (re)queued by a late or redelivered event
+        self._seen_jobs.add(job_id)
+        self._enqueued_at.pop(job_id, None)
+        key = self._queued_keys.pop(job_id, None)
+        if key is None:
+            return
+        # Finished (or cancelled) before we got to it — e.g. picked up by
+        # another runner — so don't wake a worker for it.
+        q = self._queues[key]
+        for entry in q:
+            if entry[1]["workflow_job"]["id"] == job_id:
+                q.remove(entry)
+                self._depth -= 1
+                break
+        self._journal.record_done(job_id)
+        log.info("Removed job %s from queue (queue depth: %d)", job_id, self._depth)
+
+    # -- queue index -------------------------------------------------------
+
+    def _index(self, key: frozenset[str]) -> tuple[Worker, ...]:
+        eligible = self._eligible.get(key)
+        if eligible is None:
+            eligible = tuple(w for w in self._workers if key <= w.labels)
+            self._eligible[key] = eligible
+            self._queues[key] = deque()
+            for w in eligible:
+                self._served[w.name].append(key)
+        return eligible
+
+    def _push(self, key: frozenset[str], entry: tuple[int, dict], requeue: bool = False) -> None:
+        q = self._queues[key]
+        if requeue:
+            # Back into its original place in line, ahead of later arrivals
+            q.insert(next((i for i, e in enumerate(q) if e[0] > entry[0]), len(q)), entry)
+        else:
+            q.append(entry)
+        self._queued_keys[entry[1]["workflow_job"]["id"]] = key
+        self._depth += 1
+
+    def _pop(self, key: frozenset[str]) -> tuple[int, dict]:
+        entry = self._queues[key].popleft()
+        self._queued_keys.pop(entry[1]["workflow_job"]["id"], None)
+        self._depth -= 1
+        return entry
 
-    async def _process_loop(self) -> None:
+    # -- scheduling --------------------------------------------------------
+
+    def _schedule_job(self, key: frozenset[str]) -> None:
+        """A job was queued under ``key``: start it on the best free slot."""
+        free = [w for w in self._eligible[key] if w.available]
+        if free:
+            # Among machines that are already up, spread over the least loaded
+            worker = min(free, key=lambda w: (_WAKE_COST[w.state], w.occupancy))
+            self._start(worker, key)
+
+    def _schedule_worker(self, worker: Worker) -> bool:
+        """A slot on ``worker`` became free: give it the oldest job it can run."""
+        oldest: frozenset[str] | None = None
+        for key in self._served[worker.name]:
+            q = self._queues[key]
+            if q and (oldest is None or q[0][0] < self._queues[oldest][0][0]):
+                oldest = key
+        if oldest is None:
+            return False
+        self._start(worker, oldest)
+        return True
+
+    def _start(self, worker: Worker, key: frozenset[str]) -> None:
+        seq, payload = self._pop(key)
+        enqueued = self._enqueued_at.get(payload["workflow_job"]["id"])
+        if enqueued is not None:
+            self._queue_wait.observe(time.monotonic() - enqueued)
+        slot = worker.claim()
+        worker.cancel_suspend()
+        self._end_idle(worker)
+        metrics.DISPATCHES_TOTAL.labels(
+            "warm" if worker.state in (WorkerState.ONLINE, WorkerState.RUNNING) else "cold"
+        ).inc()
+        if worker.prewoken:
+            metrics.PREWAKE_HITS_TOTAL.inc()
+            self.policy.record_prewake(worker.prewoken, hit=True)
+            worker.prewoken = None
+        asyncio.create_task(
+            self._run_job(worker, slot, key, seq, payload),
+            name=f"dispatch-{worker.name}-{slot}",
+        )
+
+    async def _run_job(
+        self, worker: Worker, slot: int, key: frozenset[str], seq: int, payload: dict
+    ) -> None:
+        requeued = False
+        try:
+            if not await self._dispatch(worker, slot, payload):
+                # Keep the job's place in line; the worker is cooling down, so
+                # the job goes to another eligible worker if one is free
+                self._push(key, (seq, payload), requeue=True)
+                requeued = True
+        except Exception:
+            log.exception("Unhandled error dispatching job on %s — dropping", worker.name)
+        finally:
+            worker.release(slot)
+            if requeued:
+                self._schedule_job(key)
+            else:
+                # Done with, or dropped: nothing will read its enqueue time
+                # again, whether or not GitHub's completed event ever arrives
+                self._enqueued_at.pop(payload["workflow_job"]["id"], None)
+                self._journal.record_done(payload["workflow_job"]["id"])
+            self._worker_idle(worker)
+
+    def _fill_slots(self, worker: Worker) -> None:
+        while worker.available and self._schedule_worker(worker):
+            pass
+
+    def _worker_idle(self, worker: Worker) -> None:
+        """
+        A slot on ``worker`` freed up: fill free slots from the queue, and
+        start the suspend timer once every slot has drained.
+        """
+        self._fill_slots(worker)
+        self._start_standby(worker)
+        if worker.busy or (worker.suspend_task and not worker.suspend_task.done()):
+            return
+        if worker.state == WorkerState.ONLINE:
+            worker.idle_since = time.monotonic()
+        worker.suspend_task = asyncio.create_task(
+            self._deferred_suspend(worker), name=f"deferred-suspend-{worker.name}"
+        )
+
+    def _end_idle(self, worker: Worker) -> None:
+        if worker.idle_since is not None:
+            metrics.IDLE_ONLINE_SECONDS_TOTAL.labels(worker.name).inc(
+                time.monotonic() - worker.idle_since
+            )
+            worker.idle_since = None
+
+    # -- predictive wake ---------------------------------------------------
+
+    async def _policy_loop(self) -> None:
+        last_save = time.monotonic()
         while True:
-            payload = await self._queue.get()
+            await asyncio.sleep(POLICY_CHECK_INTERVAL)
             try:
-                await self._dispatch(payload)
+                self._maybe_prewake()
             except Exception:
-                log.exception("Unhandled error dispatching job — dropping")
-            finally:
-                self._queue.task_done()
-                if self._queue.empty():
-                    self._suspend_task = asyncio.create_task(
-                        self._deferred_suspend(), name="deferred-suspend"
-                    )
-
-    async def _ensure_online(self) -> bool:
-        if self._state != WorkerState.OFFLINE:
+                log.exception("Wake policy check failed")
+            if time.monotonic() - last_save >= POLICY_SAVE_INTERVAL:
+                await asyncio.to_thread(self.policy.save)
+                last_save = time.monotonic()
+
+    def _maybe_prewake(self) -> None:
+        # Something is already up or coming up; nothing to gain
+        if any(w.state != WorkerState.OFFLINE for w in self._workers):
+            return
+        if not self.policy.should_prewake(time.time()):
+            return
+        candidates = [w for w in self._workers if w.available]
+        if candidates:
+            worker = candidates[0]
+            # Hold a slot so the worker isn't suspended while it wakes
+            slot = worker.claim()
+            asyncio.create_task(self._prewake(worker, slot), name=f"prewake-{worker.name}")
+
+    async def _prewake(self, worker: Worker, slot: int) -> None:
+        log.info("Pre-waking %s ahead of expected jobs", worker.name)
+        metrics.PREWAKES_TOTAL.inc()
+        worker.prewoken = time.time()
+        try:
+            if not await self._ensure_online(worker):
+                worker.prewoken = None
+        finally:
+            worker.release(slot)
+            self._worker_idle(worker)
+
+    # -- hot standby -------------------------------------------------------
+
+    def _start_standby(self, worker: Worker) -> None:
+        """
+        Register an ephemeral runner in a free slot of an online worker ahead
+        of time.
+
+        GitHub hands the next matching job straight to the waiting runner, and
+        the dispatch for that job's webhook adopts the standby instead of
+        registering a new one. Registration is per label set rather than per
+        job, so a standby may end up running a different queued job than the
+        one whose dispatch adopts it; the totals still match up.
+        """
+        if (
+            not self.cfg.hot_standby
+            or self._stopping
+            or worker.standby
+            or not worker.available
+            or worker.state not in (WorkerState.ONLINE, WorkerState.RUNNING)
+        ):
+            return
+        slot = worker.slots.index(False)
+        runner_name = self._runner_name(worker, slot)
+        log.info("Pre-registering standby runner %r on %s", runner_name, worker.name)
+        task = asyncio.create_task(
+            self._run_runner(worker, runner_name, slot), name=f"standby-{worker.name}"
+        )
+        task.add_done_callback(lambda t: self._standby_done(worker, t))
+        worker.standby = task
+        worker.standby_slot = slot
+        worker.standby_runner = runner_name
+
+    def _standby_started(self, runner_name: str | None) -> None:
+        """
+        GitHub started a job on ``runner_name``. If that is a standby runner
+        no dispatch has adopted (a job we never saw queued), hold its slot
+        until it exits so the worker isn't suspended underneath the job.
+        """
+        for worker in self._workers:
+            slot = worker.standby_slot
+            if (
+                runner_name is None
+                or worker.standby_runner != runner_name
+                or slot is None
+                or worker.slots[slot]
+            ):
+                continue
+            log.info("Standby runner %r on %s took a job directly", runner_name, worker.name)
+            worker.slots[slot] = True
+            worker.standby_busy = True
+            worker.cancel_suspend()
+            self._end_idle(worker)
+            return
+
+    def _standby_done(self, worker: Worker, task: asyncio.Task) -> None:
+        if worker.standby is not task:
+            return  # adopted by a dispatch, or stopped for suspend or shutdown
+        slot, busy = worker.standby_slot, worker.standby_busy
+        worker.take_standby()
+        if busy:
+            worker.release(slot)
+        if self._stopping:
+            return
+        failed = task.cancelled() or task.exception() is not None or task.result() != 0
+        if failed and not busy:
+            return
+        # The slot is free again: refill it, keep a runner waiting, and start
+        # the suspend timer if the worker has drained
+        self._worker_idle(worker)
+
+    def _runner_name(self, worker: Worker, slot: int) -> str:
+        self._job_counter += 1
+        prefix = f"{worker.name}-slot{slot + 1}" if len(worker.slots) > 1 else worker.name
+        return f"{prefix}-{self._job_counter}-{int(time.time())}"
+
+    async def _run_runner(self, worker: Worker, runner_name: str, slot: int) -> int:
+        token = await self._github.get_registration_token()
+        started = time.monotonic()
+        runner_log = self.logs.open(runner_name, worker.name)
+        rc = None
+        try:
+            rc = await self._wm.run_runner(
+                self.cfg, worker.cfg, token, runner_name, runner_log, slot
+            )
+            return rc
+        finally:
+            self.logs.finish(runner_log, rc)
+            metrics.RUNNER_RUNTIME_SECONDS.labels(worker.name).observe(
+                time.monotonic() - started
+            )
+
+    async def _ensure_online(self, worker: Worker) -> bool:
+        # Slots dispatched together share one wake instead of each sending WoL
+        async with worker.wake_lock:
+            if worker.cooling_down:
+                return False  # the wake this slot queued behind just failed
+            return await self._wake_if_needed(worker)
+
+    async def _wake_if_needed(self, worker: Worker) -> bool:
+        if worker.state != WorkerState.OFFLINE:
             # Confirm the worker is still reachable before trusting cached state
-            if await wm.is_online(self.cfg):
+            if await self._wm.is_online(worker.cfg):
+                await self._wm.connect(worker.cfg)
                 return True
-            log.warning("Worker unreachable despite state=%s — attempting WoL", self._state.name)
-            self._state = WorkerState.OFFLINE
+            log.warning(
+                "Worker %s unreachable despite state=%s — attempting WoL",
+                worker.name, worker.state.name,
+            )
+            worker.state = WorkerState.OFFLINE
 
-        self._state = WorkerState.WAKING
-        wm.wake(self.cfg)
-        online = await wm.wait_online(self.cfg)
+        worker.state = WorkerState.WAKING
+        worker.ready.clear()
+        timeline = worker.last_wake = WakeTimeline(worker.name)
+        # WoL keeps being resent on its retry schedule until the worker answers
+        waker = asyncio.create_task(
+            self._wm.wake(self.cfg, worker.cfg, timeline), name=f"wol-{worker.name}"
+        )
+        expected = statistics.median(worker.wake_durations) if worker.wake_durations else None
+        try:
+            online = await self._wm.wait_online(self.cfg, worker.cfg, worker.ready, expected)
+        finally:
+            waker.cancel()
+            await asyncio.wait([waker])
+        if not waker.cancelled() and waker.exception() is not None:
+            log.error("Sending WoL to %s failed: %s", worker.name, waker.exception())
+        timeline.finish(online)
         if online:
-            self._state = WorkerState.ONLINE
+            took = time.monotonic() - timeline.started
+            worker.wake_durations.append(took)
+            metrics.WAKE_TO_ONLINE_SECONDS.labels(worker.name).observe(took)
+            await self._wm.connect(worker.cfg)
+            worker.state = WorkerState.ONLINE
+            worker.wake_failures = 0
         else:
-            self._state = WorkerState.OFFLINE
+            metrics.WAKE_FAILURES_TOTAL.labels(worker.name).inc()
+            worker.state = WorkerState.OFFLINE
+            self._back_off(worker)
         return online
 
-    async def _dispatch(self, payload: dict) -> None:
+    def _back_off(self, worker: Worker) -> None:
+        """Keep ``worker`` out of scheduling for a while after a failed wake."""
+        worker.wake_failures += 1
+        delay = min(
+            WAKE_RETRY_BACKOFF * 2 ** (worker.wake_failures - 1), WAKE_RETRY_BACKOFF_MAX
+        )
+        worker.wake_retry_at = time.monotonic() + delay
+        log.warning(
+            "Not waking %s again for %ds (%d failed wake(s) in a row)",
+            worker.name, delay, worker.wake_failures,
+        )
+        if worker.wake_retry:
+            worker.wake_retry.cancel()
+        worker.wake_retry = asyncio.get_running_loop().call_later(
+            delay, self._wake_retry_due, worker
+        )
+
+    def _wake_retry_due(self, worker: Worker) -> None:
+        worker.wake_retry = None
+        worker.wake_retry_at = 0.0
+        if not self._stopping:
+            # Jobs nobody else could take have been waiting for this worker
+            self._fill_slots(worker)
+
+    async def _dispatch(self, worker: Worker, slot: int, payload: dict) -> bool:
         job_id = payload["workflow_job"]["id"]
-        log.info("Dispatching job %s (worker state: %s)", job_id, self._state.name)
+        log.info(
+            "Dispatching job %s to %s slot %d (worker state: %s, %d/%d slots in use)",
+            job_id, worker.name, slot + 1, worker.state.name,
+            worker.occupancy, len(worker.slots),
+        )
 
-        if not await self._ensure_online():
-            log.error("Worker failed to come online — requeueing job %s", job_id)
-            await self._queue.put(payload)
-            return
+        if not await self._ensure_online(worker):
+            log.error("Worker %s failed to come online — requeueing job %s", worker.name, job_id)
+            return False
 
-        self._job_counter += 1
-        runner_name = f"worker-{self._job_counter}-{int(time.time())}"
-        self._state = WorkerState.RUNNING
+        worker.running += 1
+        worker.state = WorkerState.RUNNING
         try:
-            token = await get_registration_token(self.cfg)
-            await wm.run_runner(self.cfg, token, runner_name)
+            standby = worker.take_standby(slot)
+            if standby is not None:
+                log.info("Job %s handed to standby runner on %s", job_id, worker.name)
+                await standby
+            else:
+                await self._run_runner(worker, self._runner_name(worker, slot), slot)
         finally:
-            self._state = WorkerState.ONLINE
+            worker.running -= 1
+            if not worker.running:
+                worker.state = WorkerState.ONLINE
+        return True
 
-    async def _deferred_suspend(self) -> None:
-        grace = self.cfg.suspend_grace_seconds
-        log.info("Queue empty — suspending worker in %ds if no jobs arrive", grace)
+    async def _deferred_suspend(self, worker: Worker) -> None:
+        if self.cfg.adaptive_policy:
+            grace = self.policy.grace_seconds(time.time())
+        else:
+            grace = self.cfg.suspend_grace_seconds
+        metrics.SUSPEND_GRACE_SECONDS.labels(worker.name).set(grace)
+        log.info("No matching jobs — suspending %s in %ds if no jobs arrive", worker.name, grace)
         try:
             await asyncio.sleep(grace)
-            if self._queue.empty():
-                self._state = WorkerState.SUSPENDING
-                await wm.suspend(self.cfg)
-                self._state = WorkerState.OFFLINE
-                log.info("Worker suspended")
+            # Only once every slot has drained
+            if worker.occupancy == 0 and worker.state == WorkerState.ONLINE:
+                worker.state = WorkerState.SUSPENDING
+                standby = worker.take_standby()
+                if standby:
+                    standby.cancel()
+                    await asyncio.wait([standby])
+                await self._wm.suspend(worker.cfg)
+                worker.ready.clear()
+                metrics.SUSPENDS_TOTAL.labels(worker.name).inc()
+                self._end_idle(worker)
+                if worker.prewoken:
+                    metrics.PREWAKE_MISSES_TOTAL.inc()
+                    self.policy.record_prewake(worker.prewoken, hit=False)
+                    worker.prewoken = None
+                worker.state = WorkerState.OFFLINE
+                log.info("Worker %s suspended", worker.name)
+                # Jobs that queued while we were suspending can now use the worker
+                worker.suspend_task = None
+                self._fill_slots(worker)
         except asyncio.CancelledError:
-            log.info("Suspend cancelled — new job arrived in grace window")
+            log.info("Suspend of %s cancelled — new job arrived in grace window", worker.name)
@@ -0,0 +1,263 @@
+import asyncio
+import gzip
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator
+
+from .config import Config
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+# Finished logs kept in memory for /logs after their runner exits
+RECENT_LOGS = 20
+ARCHIVE_SUFFIX = ".log.gz"
+
+
+class RunnerLog:
+    """
+    Output of one ephemeral runner.
+
+    Chunks read from the runner's ssh session are kept as-is in a ring
+    buffer capped at ``capacity`` bytes; the oldest chunks fall off the front.
+    Byte offsets are absolute over the runner's lifetime, so a reader that
+    remembers how far it got can resume, and one that fell behind the ring
+    simply skips ahead to the oldest chunk still held. Readers get
+    ``memoryview`` slices of the stored chunks, so any number of them can
+    follow the same log without copying it.
+    """
+
+    def __init__(
+        self, name: str, worker: str, capacity: int, max_bytes: int, on_write=None
+    ) -> None:
+        self.name = name
+        self.worker = worker
+        self.job_id: int | None = None
+        self.started = time.time()
+        self.finished: float | None = None
+        self.exit_code: int | None = None
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.total = 0
+        self._chunks: deque[bytes] = deque()
+        self._base = 0  # offset of _chunks[0]
+        self._held = 0  # bytes in _chunks
+        self._changed = asyncio.Event()
+        # Chunks not yet written to the archive
+        self._pending: list[bytes] = []
+        self._truncated = False
+        self._on_write = on_write
+        # Set once the runner has exited and all of its output is archived
+        self.archived = False
+
+    @property
+    def running(self) -> bool:
+        return self.finished is None
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self._chunks.append(data)
+        self._held += len(data)
+        while self._held > self.capacity and len(self._chunks) > 1:
+            dropped = self._chunks.popleft()
+            self._base += len(dropped)
+            self._held -= len(dropped)
+
+        if self.total + len(data) <= self.max_bytes:
+            self._pending.append(data)
+        elif not self._truncated:
+            self._truncated = True
+            self._pending.append(b"\n[coordinator] log truncated at %d bytes\n" % self.total)
+        self.total += len(data)
+        metrics.RUNNER_LOG_BYTES_TOTAL.labels(self.worker).inc(len(data))
+        self._notify()
+        if self._on_write:
+            self._on_write(self)
+
+    def close(self, exit_code: int | None) -> None:
+        self.finished = time.time()
+        self.exit_code = exit_code
+        self._notify()
+
+    def take_pending(self) -> bytes:
+        data, self._pending = b"".join(self._pending), []
+        return data
+
+    def _notify(self) -> None:
+        # Wake every waiting reader at once, then arm a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _since(self, pos: int) -> list[memoryview]:
+        # Readers are usually near the tail, so walk back from the newest chunk
+        views = []
+        end = self._base + self._held
+        for chunk in reversed(self._chunks):
+            if end <= pos:
+                break
+            start = end - len(chunk)
+            views.append(memoryview(chunk)[max(pos - start, 0):])
+            end = start
+        views.reverse()
+        return views
+
+    async def follow(self, offset: int = 0) -> AsyncIterator[memoryview]:
+        """Yield buffered output from ``offset`` on, then new output until the runner exits."""
+        pos = offset
+        while True:
+            changed = self._changed
+            pos = max(pos, self._base)
+            for view in self._since(pos):
+                pos += len(view)
+                yield view
+            if not self.running and pos >= self._base + self._held:
+                return
+            await changed.wait()
+
+    def info(self) -> dict:
+        return {
+            "runner": self.name,
+            "worker": self.worker,
+            "job_id": self.job_id,
+            "started": round(self.started),
+            "finished": round(self.finished) if self.finished else None,
+            "exit_code": self.exit_code,
+            "bytes": self.total,
+        }
+
+
+class RunnerLogStore:
+    """
+    Per-runner logs: an in-memory ring buffer for live tailing, plus a
+    gzip archive per runner on disk.
+
+    Runner output never goes through the logging module. A single flusher
+    task appends whatever accumulated since its last pass to each runner's
+    archive (one gzip member per batch) off the event loop, and only the
+    newest ``runner_log_retain`` archives are kept.
+    """
+
+    def __init__(self, cfg: Config) -> None:
+        self.cfg = cfg
+        self.dir = cfg.runner_log_dir
+        self.flush_interval = cfg.runner_log_flush_ms / 1000
+        self._active: dict[str, RunnerLog] = {}
+        self._recent: OrderedDict[str, RunnerLog] = OrderedDict()
+        self._dirty: dict[str, RunnerLog] = {}
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        os.makedirs(self.dir, exist_ok=True)
+        self._task = asyncio.create_task(self._flush_loop(), name="runner-log-flusher")
+
+    async def close(self) -> None:
+        self._closing = True
+        self._wakeup.set()
+        if self._task:
+            await self._task
+
+    def open(self, runner_name: str, worker: str) -> RunnerLog:
+        runner_log = RunnerLog(
+            runner_name,
+            worker,
+            self.cfg.runner_log_buffer_bytes,
+            self.cfg.runner_log_max_bytes,
+            on_write=self.written,
+        )
+        self._active[runner_name] = runner_log
+        return runner_log
+
+    def written(self, runner_log: RunnerLog) -> None:
+        self._dirty[runner_log.name] = runner_log
+        self._wakeup.set()
+
+    def finish(self, runner_log: RunnerLog, exit_code: int | None) -> None:
+        runner_log.close(exit_code)
+        self._active.pop(runner_log.name, None)
+        self._recent[runner_log.name] = runner_log
+        while len(self._recent) > RECENT_LOGS:
+            self._recent.popitem(last=False)
+        self.written(runner_log)
+
+    def tag(self, runner_name: str | None, job_id: int) -> None:
+        """Record which job GitHub handed to a runner."""
+        runner_log = self.get(runner_name) if runner_name else None
+        if runner_log is not None:
+            runner_log.job_id = job_id
+
+    def get(self, runner_name: str) -> RunnerLog | None:
+        return self._active.get(runner_name) or self._recent.get(runner_name)
+
+    def summaries(self) -> list[dict]:
+        logs = [*self._active.values(), *reversed(self._recent.values())]
+        return [runner_log.info() for runner_log in logs]
+
+    def archive_path(self, runner_name: str) -> str | None:
+        # Names come from the URL; refuse anything that isn't a plain file name
+        if not runner_name or os.path.basename(runner_name) != runner_name or runner_name[0] == ".":
+            return None
+        path = os.path.join(self.dir, runner_name + ARCHIVE_SUFFIX)
+        return path if os.path.exists(path) else None
+
+    async def read_archive(self, path: str) -> bytes:
+        return await asyncio.to_thread(_read_gzip, path)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if not self._closing:
+                # Batch up everything the runners print in the meantime
+                await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                await self._flush()
+            except OSError:
+                log.exception("Failed to write runner logs to %s", self.dir)
+            if self._closing:
+                return
+
+    async def _flush(self) -> None:
+        batches = []
+        finished = []
+        dirty, self._dirty = self._dirty, {}
+        for name, runner_log in dirty.items():
+            data = runner_log.take_pending()
+            if data:
+                batches.append((os.path.join(self.dir, name + ARCHIVE_SUFFIX), data))
+            if not runner_log.running:
+                finished.append(runner_log)
+        if batches:
+            await asyncio.to_thread(_append_gzip, batches)
+        for runner_log in finished:
+            runner_log.archived = True
+        if finished:
+            live = {name + ARCHIVE_SUFFIX for name in self._active}
+            await asyncio.to_thread(self._prune, live)
+
+    def _prune(self, live: set[str]) -> None:
+        archives = [
+            entry for entry in os.scandir(self.dir) if entry.name.endswith(ARCHIVE_SUFFIX)
+        ]
+        if len(archives) <= self.cfg.runner_log_retain:
+            return
+        archives.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in archives[self.cfg.runner_log_retain:]:
+            if entry.name not in live:
+                os.unlink(entry.path)
+
+
+def _append_gzip(batches: list[tuple[str, bytes]]) -> None:
+    # Each batch becomes its own gzip member; readers see one continuous stream
+    for path, data in batches:
+        with gzip.open(path, "ab", compresslevel=6) as fh:
+            fh.write(data)
+
+
+def _read_gzip(path: str) -> bytes:
+    with gzip.open(path, "rb") as fh:
+        return fh.read()
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import socket
+import time
+
+from .config import Config, WorkerConfig
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+
+def magic_packet(mac: str) -> bytes:
+    mac_bytes = bytes.fromhex(mac.replace(":", "").replace("-", ""))
+    if len(mac_bytes) != 6:
+        raise ValueError(f"Invalid MAC address: {mac!r}")
+    return b"\xff" * 6 + mac_bytes * 16
+
+
+class WakeTimeline:
+    """What was sent where during one wake, for the log and /status."""
+
+    def __init__(self, worker: str) -> None:
+        self.worker = worker
+        self.started = time.monotonic()
+        self.sends: list[tuple[float, str, int]] = []
+        self.errors: list[tuple[float, str, str]] = []
+        self.outcome: str | None = None
+        self.took: float | None = None
+
+    def offset(self) -> float:
+        return round(time.monotonic() - self.started, 2)
+
+    def sent(self, at: float, target: str, packets: int) -> None:
+        self.sends.append((at, target, packets))
+
+    def failed(self, target: str, error: OSError) -> None:
+        self.errors.append((self.offset(), target, str(error)))
+
+    def finish(self, online: bool) -> None:
+        self.took = self.offset()
+        self.outcome = "online" if online else "timeout"
+        sends = ", ".join(f"+{at:.2f}s {target} x{n}" for at, target, n in self.sends)
+        log.log(
+            logging.INFO if online else logging.ERROR,
+            "Wake of %s: %s after %.1fs — %d send(s): %s%s",
+            self.worker, self.outcome, self.took, len(self.sends), sends or "none",
+            f" — {len(self.errors)} send error(s)" if self.errors else "",
+        )
+
+    def summary(self) -> dict:
+        return {
+            "outcome": self.outcome,
+            "seconds": self.took,
+            "sends": [{"at": at, "target": t, "packets": n} for at, t, n in self.sends],
+            "errors": [{"at": at, "target": t, "error": e} for at, t, e in self.errors],
+        }
+
+
+async def _resolve(targets: tuple[tuple[str, int], ...]) -> list[tuple[str, tuple]]:
+    loop = asyncio.get_running_loop()
+    resolved = []
+    for host, port in targets:
+        try:
+            infos = await loop.getaddrinfo(
+                host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM
+            )
+        except OSError:
+            log.warning("Cannot resolve WoL target %s — skipping", host)
+            continue
+        resolved.append((f"{host}:{port}", infos[0][4]))
+    return resolved
+
+
+async def send_burst(
+    cfg: Config,
+    worker: WorkerConfig,
+    addresses: list[tuple[str, tuple]],
+    timeline: WakeTimeline,
+) -> None:
+    """Send ``cfg.wol_burst`` magic packets to every target, a few ms apart."""
+    packet = magic_packet(worker.mac)
+    at = timeline.offset()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.setblocking(False)
+        for i in range(cfg.wol_burst):
+            if i:
+                await asyncio.sleep(cfg.wol_burst_interval_ms / 1000)
+            for label, addr in addresses:
+                try:
+                    sock.sendto(packet, addr)
+                except OSError as exc:
+                    timeline.failed(label, exc)
+    for label, _addr in addresses:
+        timeline.sent(at, label, cfg.wol_burst)
+
+
+async def keep_waking(cfg: Config, worker: WorkerConfig, timeline: WakeTimeline) -> None:
+    """
+    Send WoL bursts on ``cfg.wol_retry_schedule`` until cancelled.
+
+    Magic packets are fire-and-forget UDP, so a single lost packet used to
+    cost a full WORKER_ONLINE_TIMEOUT. The caller runs this alongside the
+    readiness probes and cancels it once the worker answers; until then
+    every scheduled resend is another chance for a packet to get through.
+    """
+    addresses = await _resolve(worker.wol_addresses)
+    if not addresses:
+        log.error("No usable WoL targets for %s", worker.name)
+        return
+    await send_burst(cfg, worker, addresses, timeline)
+    log.info(
+        "WoL magic packets sent to %s (%s) via %s",
+        worker.mac, worker.name, ", ".join(label for label, _ in addresses),
+    )
+    for offset in cfg.wol_retry_schedule:
+        await asyncio.sleep(max(0.0, timeline.started + offset - time.monotonic()))
+        metrics.WOL_RETRIES_TOTAL.labels(worker.name).inc()
+        log.info("Resending WoL to %s (%.1fs since first burst)", worker.name, offset)
+        await send_burst(cfg, worker, addresses, timeline)
@@ -1,26 +1,22 @@
 import asyncio
 import logging
 import shlex
-import socket
+from collections.abc import Iterator
 
-from .config import Config
+from .config import Config, WorkerConfig
+from .runner_logs import RunnerLog
+from .wol import WakeTimeline
+from . import wol
 
 log = logging.getLogger(__name__)
 
+# Bytes per read of a runner's output
+RUNNER_READ_SIZE = 64 * 1024
 
-def _magic_packet(mac: str) -> bytes:
-    mac_bytes = bytes.fromhex(mac.replace(":", "").replace("-", ""))
-    if len(mac_bytes) != 6:
-        raise ValueError(f"Invalid MAC address: {mac!r}")
-    return b"\xff" * 6 + mac_bytes * 16
 
-
-def wake(cfg: Config) -> None:
-    packet = _magic_packet(cfg.worker_mac)
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        sock.sendto(packet, ("255.255.255.255", 9))
-    log.info("WoL magic packet sent to %s", cfg.worker_mac)
+async def wake(cfg: Config, worker: WorkerConfig, timeline: WakeTimeline) -> None:
+    """Keep sending WoL to ``worker`` until cancelled; see ``wol.keep_waking``."""
+    await wol.keep_waking(cfg, worker, timeline)
 
 
 async def _tcp_probe(host: str, port: int = 22, timeout: float = 3.0) -> bool:
@@ -35,35 +31,186 @@ async def _tcp_probe(host: str, port: int = 22, timeout: float = 3.0) -> bool:
         return False
 
 
-async def is_online(cfg: Config) -> bool:
-    return await _tcp_probe(cfg.worker_host)
+async def is_online(worker: WorkerConfig) -> bool:
+    if await _control(worker, "check"):
+        # Open a session over the live master: one round trip, no key exchange
+        if await _ssh_quick(worker, "true"):
+            return True
+        # The master process is alive but its connection isn't (stale after a
+        # network blip or a resume); drop it and judge the host on its own
+        log.info("Closing stale ssh control connection to %s", worker.name)
+        await disconnect(worker)
+    return await _tcp_probe(worker.host)
 
 
-async def wait_online(cfg: Config) -> bool:
-    loop = asyncio.get_event_loop()
-    deadline = loop.time() + cfg.worker_online_timeout
-    while loop.time() < deadline:
-        if await _tcp_probe(cfg.worker_host):
-            log.info("Worker %s is online", cfg.worker_host)
-            return True
-        await asyncio.sleep(cfg.worker_online_poll_interval)
-    log.error("Worker did not come online within %ds", cfg.worker_online_timeout)
+# First gap between probes after WoL; doubles up to the configured interval
+FIRST_PROBE_DELAY = 0.25
+# Probe spacing around the worker's usual boot time
+TIGHT_PROBE_INTERVAL = 0.25
+
+
+def _probe_offsets(poll_interval: float, expected: float | None) -> Iterator[float]:
+    """
+    Seconds after WoL at which to launch each readiness probe.
+
+    Gaps start short and grow exponentially up to ``poll_interval`` (but
+    never drop below ``FIRST_PROBE_DELAY``). When the worker's typical boot
+    time is known, probes are packed tightly from 80% of that time until
+    well past it, where readiness is most likely.
+    """
+    t, step = 0.0, FIRST_PROBE_DELAY
+    while True:
+        yield t
+        if expected and t < expected * 0.8 <= t + step:
+            t = expected * 0.8
+        elif expected and expected * 0.8 <= t < expected * 2:
+            t += TIGHT_PROBE_INTERVAL
+        else:
+            t += step
+            # Never below the first delay, even with a poll interval <= 0
+            step = max(min(step * 2, poll_interval), FIRST_PROBE_DELAY)
+
+
+async def wait_online(
+    cfg: Config,
+    worker: WorkerConfig,
+    ready: asyncio.Event | None = None,
+    expected: float | None = None,
+) -> bool:
+    """
+    Wait until ``worker`` accepts ssh connections, or ``ready`` is set by the
+    worker's own readiness callback, whichever comes first.
+
+    Probes are launched on the ``_probe_offsets`` schedule without waiting
+    for earlier ones to time out, so a slow failing probe never delays the
+    one that would succeed.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + cfg.worker_online_timeout
+    offsets = _probe_offsets(cfg.worker_online_poll_interval, expected)
+    next_probe = start + next(offsets)
+    sources: dict[asyncio.Future, str] = {}
+    if ready is not None:
+        sources[asyncio.ensure_future(ready.wait())] = "readiness callback"
+    try:
+        while (now := loop.time()) < deadline:
+            if now >= next_probe:
+                sources[asyncio.ensure_future(_tcp_probe(worker.host))] = "ssh probe"
+                next_probe = start + next(offsets)
+                continue
+            timeout = min(next_probe, deadline) - now
+            if not sources:
+                await asyncio.sleep(timeout)
+                continue
+            done, _ = await asyncio.wait(
+                sources, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            for fut in done:
+                source = sources.pop(fut)
+                if fut.result():
+                    log.info(
+                        "Worker %s (%s) is online after %.1fs (%s)",
+                        worker.name, worker.host, loop.time() - start, source,
+                    )
+                    return True
+    finally:
+        for fut in sources:
+            fut.cancel()
+    log.error(
+        "Worker %s did not come online within %ds", worker.name, cfg.worker_online_timeout
+    )
     return False
 
 
-def _ssh_cmd(cfg: Config) -> list[str]:
+# One multiplexed ssh master per worker; %C hashes user/host/port so the
+# path stays short enough for a unix socket.
+CONTROL_PATH = "/tmp/ssh-mux-%C"
+
+
+def _ssh_opts(worker: WorkerConfig) -> list[str]:
     return [
         "ssh",
-        "-i", cfg.worker_ssh_key,
+        "-i", worker.ssh_key,
         "-o", "StrictHostKeyChecking=accept-new",
         "-o", "BatchMode=yes",
         "-o", "ConnectTimeout=10",
-        f"{cfg.worker_ssh_user}@{cfg.worker_host}",
+        "-o", f"ControlPath={CONTROL_PATH}",
+        # Drop a dead master quickly (e.g. the worker suspended underneath us)
+        "-o", "ServerAliveInterval=10",
+        "-o", "ServerAliveCountMax=2",
     ]
 
 
-async def run_runner(cfg: Config, token: str, runner_name: str) -> int:
-    runner_dir = cfg.worker_runner_dir
+def _ssh_cmd(worker: WorkerConfig) -> list[str]:
+    # Reuse the master when it is up, otherwise connect directly; never let
+    # an ordinary command become the master, as a backgrounded master would
+    # keep the command's stdout pipe open.
+    return _ssh_opts(worker) + [
+        "-o", "ControlMaster=no",
+        f"{worker.ssh_user}@{worker.host}",
+    ]
+
+
+async def _control(worker: WorkerConfig, op: str) -> bool:
+    proc = await asyncio.create_subprocess_exec(
+        *_ssh_opts(worker), "-O", op, f"{worker.ssh_user}@{worker.host}",
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    return await proc.wait() == 0
+
+
+async def _ssh_quick(worker: WorkerConfig, command: str, timeout: float = 5.0) -> bool:
+    proc = await asyncio.create_subprocess_exec(
+        *_ssh_cmd(worker), command,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        return await asyncio.wait_for(proc.wait(), timeout) == 0
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return False
+
+
+async def connect(worker: WorkerConfig) -> bool:
+    """Open the persistent master connection that later commands multiplex over."""
+    if await _control(worker, "check"):
+        return True
+    proc = await asyncio.create_subprocess_exec(
+        *_ssh_opts(worker),
+        "-o", "ControlMaster=yes",
+        "-o", "ControlPersist=yes",
+        "-N", "-f",
+        f"{worker.ssh_user}@{worker.host}",
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    ok = await proc.wait() == 0
+    if ok:
+        log.info("Opened ssh control connection to %s", worker.name)
+    else:
+        log.warning("Could not open ssh control connection to %s", worker.name)
+    return ok
+
+
+async def disconnect(worker: WorkerConfig) -> None:
+    await _control(worker, "exit")
+
+
+async def run_runner(
+    cfg: Config,
+    worker: WorkerConfig,
+    token: str,
+    runner_name: str,
+    output: RunnerLog | None = None,
+    slot: int = 0,
+) -> int:
+    runner_dir = worker.slot_runner_dir(slot)
     # Single-quoted token prevents shell expansion of special chars in the token value
     script = (
         f"cd {shlex.quote(runner_dir)} && "
@@ -71,28 +218,39 @@ async def run_runner(cfg: Config, token: str, runner_name: str) -> int:
         f" --url {shlex.quote(f'https://github.com/{cfg.github_repo}')}"
         f" --token {shlex.quote(token)}"
         f" --name {shlex.quote(runner_name)}"
-        f" --labels {shlex.quote(cfg.runner_labels)}"
+        f" --labels {shlex.quote(worker.labels)}"
         f" --ephemeral"
         f" --unattended"
         f" --replace"
         f" && ./run.sh"
     )
-    cmd = _ssh_cmd(cfg) + [script]
-    log.info("Starting ephemeral runner %r on %s", runner_name, cfg.worker_host)
+    cmd = _ssh_cmd(worker) + [script]
+    log.info("Starting ephemeral runner %r on %s", runner_name, worker.name)
     proc = await asyncio.create_subprocess_exec(
         *cmd,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.STDOUT,
     )
-    async for line in proc.stdout:
-        log.info("[runner] %s", line.decode().rstrip())
-    rc = await proc.wait()
+    try:
+        # Whole reads rather than lines: chatty builds cost one call per
+        # pipe read, not one per line
+        while chunk := await proc.stdout.read(RUNNER_READ_SIZE):
+            if output is not None:
+                output.write(chunk)
+        rc = await proc.wait()
+    except asyncio.CancelledError:
+        # Don't leave an orphaned ssh session holding the runner open
+        proc.terminate()
+        await proc.wait()
+        log.info("Runner %r stopped", runner_name)
+        raise
     log.info("Runner %r exited with code %d", runner_name, rc)
     return rc
 
 
-async def suspend(cfg: Config) -> None:
-    cmd = _ssh_cmd(cfg) + [cfg.worker_suspend_cmd]
-    log.info("Suspending worker: %s", cfg.worker_suspend_cmd)
+async def suspend(worker: WorkerConfig) -> None:
+    cmd = _ssh_cmd(worker) + [worker.suspend_cmd]
+    log.info("Suspending worker %s: %s", worker.name, worker.suspend_cmd)
     proc = await asyncio.create_subprocess_exec(*cmd)
     await proc.wait()
+    await disconnect(worker)
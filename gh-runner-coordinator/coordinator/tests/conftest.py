@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from app.config import Config, WorkerConfig
+from app.queue_manager import QueueManager
+
+
+@pytest.fixture
+def make_worker():
+    def make(name: str = "worker", labels: str = "self-hosted", slots: int = 1) -> WorkerConfig:
+        return WorkerConfig(
+            name=name, mac="00:11:22:33:44:55", host=f"{name}.local", ssh_user="runner",
+            ssh_key="/ssh/id_rsa", runner_dir="/home/runner/actions-runner",
+            suspend_cmd="systemctl suspend", labels=labels, slots=slots,
+            wol_targets="255.255.255.255:9",
+        )
+    return make
+
+
+@pytest.fixture
+def make_config(tmp_path, make_worker):
+    """A Config with every file under tmp_path; keyword arguments override fields."""
+    def make(**overrides) -> Config:
+        fields = dict(
+            github_webhook_secret="s3cret", github_token="token", github_repo="owner/repo",
+            workers=(make_worker(),), worker_online_timeout=120, worker_online_poll_interval=5,
+            worker_ready_token="", wol_burst=1, wol_burst_interval_ms=100,
+            wol_retry_schedule=(), suspend_grace_seconds=30, hot_standby=False,
+            adaptive_policy=False, suspend_grace_min_seconds=10, suspend_grace_max_seconds=600,
+            prewake_lookahead_seconds=600, prewake_threshold=1.0,
+            policy_history_path=str(tmp_path / "arrivals.json"),
+            queue_journal_path=str(tmp_path / "queue.jsonl"), queue_journal_flush_ms=0,
+            dedup_ttl_seconds=3600, dedup_max_entries=100, webhook_queue_size=1000,
+            runner_log_dir=str(tmp_path / "runner-logs"), runner_log_buffer_bytes=1024,
+            runner_log_max_bytes=1 << 20, runner_log_retain=10, runner_log_flush_ms=0,
+            runner_log_token="",
+        )
+        fields.update(overrides)
+        return Config(**fields)
+    return make
+
+
+class FakeWorkers:
+    """
+    Stand-in for the worker_manager functions QueueManager calls.
+
+    Wakes succeed at once unless the worker is listed in ``unreachable``;
+    each runner keeps running until the test calls ``finish``.
+    """
+
+    def __init__(self) -> None:
+        self.unreachable: set[str] = set()
+        self.awake: set[str] = set()
+        self.wakes: list[str] = []
+        self.suspends: list[str] = []
+        # runner name -> (worker, slot, future resolved with the exit code)
+        self.runners: dict[str, tuple[str, int, asyncio.Future]] = {}
+
+    async def settle(self) -> None:
+        """Let every task that can make progress run until it blocks."""
+        for _ in range(100):
+            await asyncio.sleep(0)
+
+    def running(self, worker: str | None = None) -> list[str]:
+        return [
+            name for name, (w, _, fut) in self.runners.items()
+            if not fut.done() and worker in (None, w)
+        ]
+
+    def finish(self, runner_name: str, rc: int = 0) -> None:
+        self.runners[runner_name][2].set_result(rc)
+
+    async def wake(self, cfg, worker, timeline=None) -> None:
+        self.wakes.append(worker.name)
+
+    async def is_online(self, worker) -> bool:
+        return worker.name in self.awake
+
+    async def connect(self, worker) -> bool:
+        return True
+
+    async def wait_online(self, cfg, worker, ready=None, expected=None) -> bool:
+        await asyncio.sleep(0)
+        if worker.name in self.unreachable:
+            return False
+        self.awake.add(worker.name)
+        return True
+
+    async def run_runner(self, cfg, worker, token, runner_name, output=None, slot=0) -> int:
+        fut = asyncio.get_running_loop().create_future()
+        self.runners[runner_name] = (worker.name, slot, fut)
+        return await fut
+
+    async def suspend(self, worker) -> None:
+        self.suspends.append(worker.name)
+        self.awake.discard(worker.name)
+
+
+class FakeGitHub:
+    def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def get_registration_token(self) -> str:
+        return "token"
+
+
+class RecordingQueue(QueueManager):
+    """QueueManager that records which job each dispatch carries."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.dispatched: list[tuple[int, str, int]] = []
+
+    async def _dispatch(self, worker, slot, payload) -> bool:
+        self.dispatched.append((payload["workflow_job"]["id"], worker.name, slot))
+        return await super()._dispatch(worker, slot, payload)
+
+    def queued(self, *labels: str) -> list[int]:
+        key = frozenset(labels)
+        return [payload["workflow_job"]["id"] for _, payload in self._queues.get(key, ())]
+
+
+@pytest.fixture
+def fake_workers() -> FakeWorkers:
+    return FakeWorkers()
+
+
+@pytest.fixture
+def make_queue(make_config, fake_workers):
+    """A RecordingQueue on fake workers; call ``start()`` inside the event loop."""
+    def make(**overrides) -> RecordingQueue:
+        return RecordingQueue(make_config(**overrides), fake_workers, FakeGitHub())
+    return make
+
+
+def job(job_id: int, *labels: str, action: str = "queued", runner: str | None = None) -> dict:
+    workflow_job = {"id": job_id, "labels": list(labels or ("self-hosted",))}
+    if runner is not None:
+        workflow_job["runner_name"] = runner
+    return {"action": action, "workflow_job": workflow_job}
+
+
+@pytest.fixture
+def make_job():
+    return job
@@ -0,0 +1,67 @@
+import types
+
+import pytest
+
+from app import dedup
+from app.dedup import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(dedup, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_add_reports_duplicates(clock):
+    cache = TTLCache(ttl=60, maxsize=10)
+
+    assert cache.add("a") is True
+    assert cache.add("a") is False
+    assert "a" in cache
+
+
+def test_keys_expire_after_ttl(clock):
+    cache = TTLCache(ttl=60, maxsize=10)
+    cache.add("a")
+    clock[0] += 30
+    cache.add("b")
+
+    clock[0] += 30
+    assert "a" not in cache
+    assert "b" in cache
+    assert len(cache) == 1
+    # An expired key counts as new again
+    assert cache.add("a") is True
+
+
+def test_full_cache_evicts_oldest_unexpired_key(clock):
+    cache = TTLCache(ttl=60, maxsize=2)
+    for key in ("a", "b", "c"):
+        cache.add(key)
+        clock[0] += 1
+
+    assert len(cache) == 2
+    assert "a" not in cache
+    assert "b" in cache and "c" in cache
+    assert cache.add("a") is True
+
+
+def test_duplicate_does_not_refresh_expiry(clock):
+    cache = TTLCache(ttl=60, maxsize=10)
+    cache.add("a")
+    clock[0] += 59
+    assert cache.add("a") is False
+
+    clock[0] += 1
+    assert "a" not in cache
+
+
+def test_discard_forgets_a_key(clock):
+    cache = TTLCache(ttl=60, maxsize=10)
+    cache.add("a")
+    cache.discard("a")
+    cache.discard("missing")
+
+    assert "a" not in cache
+    assert cache.add("a") is True
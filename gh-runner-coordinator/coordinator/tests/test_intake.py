@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import hmac
+import json
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.intake import WebhookIntake
+from app.main import create_app
+
+SECRET = "s3cret"
+
+
+def _payload(job_id: int) -> dict:
+    return {"action": "queued", "workflow_job": {"id": job_id, "labels": ["self-hosted"]}}
+
+
+class StalledQueue:
+    """Queue manager whose enqueue blocks until released, so the intake backs up."""
+
+    def __init__(self) -> None:
+        self.applied: list[int] = []
+        self.busy = asyncio.Event()
+        self.release = asyncio.Event()
+
+    def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def enqueue(self, payload: dict) -> None:
+        self.busy.set()
+        await self.release.wait()
+        self.applied.append(payload["workflow_job"]["id"])
+
+    job_started = job_completed = enqueue
+
+
+async def _post(client: TestClient, payload: dict, delivery: str):
+    body = json.dumps(payload).encode()
+    sig = "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return await client.post("/webhook", data=body, headers={
+        "X-GitHub-Event": "workflow_job",
+        "X-GitHub-Delivery": delivery,
+        "X-Hub-Signature-256": sig,
+    })
+
+
+def test_submit_refuses_when_full():
+    async def run() -> None:
+        intake = WebhookIntake(StalledQueue(), maxsize=2)
+        assert intake.submit(_payload(1)) and intake.submit(_payload(2))
+        assert intake.full
+        assert intake.submit(_payload(3)) is False
+        assert intake.depth == 2
+
+    asyncio.run(run())
+
+
+def test_webhook_returns_503_when_intake_full(make_config):
+    async def run() -> None:
+        queue = StalledQueue()
+        app = create_app(make_config(webhook_queue_size=1), queue)
+        async with TestClient(TestServer(app)) as client:
+            intake = app["intake"]
+            assert (await _post(client, _payload(1), "d1")).status == 200
+            # The consumer is stuck applying job 1; job 2 fills the intake
+            await queue.busy.wait()
+            assert (await _post(client, _payload(2), "d2")).status == 200
+            assert intake.full
+
+            resp = await _post(client, _payload(3), "d3")
+            assert resp.status == 503
+            assert resp.headers["Retry-After"] == "5"
+            # A refused delivery isn't remembered, so GitHub's redelivery gets in
+            assert "d3" not in app["deliveries"]
+
+            queue.release.set()
+            await intake._events.join()
+            assert (await _post(client, _payload(3), "d3")).status == 200
+            await intake._events.join()
+        assert queue.applied == [1, 2, 3]
+
+    asyncio.run(run())
+
+
+def test_webhook_returns_503_when_submit_is_refused(make_config):
+    async def run() -> None:
+        queue = StalledQueue()
+        app = create_app(make_config(webhook_queue_size=10), queue)
+        async with TestClient(TestServer(app)) as client:
+            intake = app["intake"]
+            # The intake filling between the full check and the hand-off
+            intake.submit = lambda payload: False
+
+            resp = await _post(client, _payload(1), "d1")
+            assert resp.status == 503
+            assert resp.headers["Retry-After"] == "5"
+            assert "d1" not in app["deliveries"]
+
+            del intake.submit
+            assert (await _post(client, _payload(1), "d1")).status == 200
+            queue.release.set()
+            await intake._events.join()
+        assert queue.applied == [1]
+
+    asyncio.run(run())
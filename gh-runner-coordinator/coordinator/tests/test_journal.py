@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from app.journal import JobJournal
+
+
+def _job(job_id: int) -> dict:
+    return {"action": "queued", "workflow_job": {"id": job_id, "labels": ["self-hosted"]}}
+
+
+def _line(rec: dict) -> str:
+    return json.dumps(rec, separators=(",", ":")) + "\n"
+
+
+def test_replay_skips_torn_trailing_line(tmp_path):
+    path = tmp_path / "queue.jsonl"
+    torn = _line({"op": "queued", "job": _job(3)})[:-12]
+    path.write_text(
+        _line({"op": "queued", "job": _job(1)})
+        + _line({"op": "queued", "job": _job(2)})
+        + _line({"op": "done", "id": 1})
+        + torn,
+        encoding="utf-8",
+    )
+
+    jobs = JobJournal(str(path), 0.0).load()
+
+    assert [j["workflow_job"]["id"] for j in jobs] == [2]
+    # Replay compacts the file, so the torn record is gone for good
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["job"]["workflow_job"]["id"] for line in lines] == [2]
+
+
+def test_replay_skips_corrupt_line_in_the_middle(tmp_path):
+    path = tmp_path / "queue.jsonl"
+    path.write_text(
+        _line({"op": "queued", "job": _job(1)})
+        + '{"op":"queued","job":{"act\n'
+        + _line({"op": "queued", "job": _job(2)}),
+        encoding="utf-8",
+    )
+
+    jobs = JobJournal(str(path), 0.0).load()
+
+    assert [j["workflow_job"]["id"] for j in jobs] == [1, 2]
+
+
+def test_replay_creates_missing_directory(tmp_path):
+    path = tmp_path / "data" / "queue.jsonl"
+
+    assert JobJournal(str(path), 0.0).load() == []
+    assert path.exists()
+
+
+def test_recorded_jobs_survive_a_restart(tmp_path):
+    path = str(tmp_path / "queue.jsonl")
+
+    async def run() -> None:
+        journal = JobJournal(path, 0.0)
+        journal.load()
+        journal.start()
+        for job_id in (1, 2, 3):
+            journal.record_queued(_job(job_id))
+        journal.record_done(2)
+        await journal.close()
+
+    asyncio.run(run())
+    # Simulate a crash mid-append after the last flush
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write('{"op":"done","i')
+
+    jobs = JobJournal(path, 0.0).load()
+
+    assert [j["workflow_job"]["id"] for j in jobs] == [1, 3]
+
+
+def test_compaction_syncs_the_directory(tmp_path, monkeypatch):
+    path = tmp_path / "queue.jsonl"
+    path.write_text(json.dumps({"op": "queued", "job": _job(1)}) + "\n", encoding="utf-8")
+    synced = []
+    monkeypatch.setattr("app.journal._fsync_dir", synced.append)
+
+    JobJournal(str(path), 0.0).load()
+
+    assert synced == [str(tmp_path)]
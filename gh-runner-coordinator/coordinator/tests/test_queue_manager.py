@@ -0,0 +1,389 @@
+import asyncio
+import time
+
+from app import queue_manager
+from app.queue_manager import WorkerState
+
+
+def _run(coro_fn):
+    asyncio.run(coro_fn())
+
+
+# -- routing and order -------------------------------------------------------
+
+def test_job_goes_only_to_a_worker_with_all_its_labels(make_queue, make_worker, make_job, fake_workers):
+    queue = make_queue(workers=(
+        make_worker("gpu", labels="self-hosted,gpu"),
+        make_worker("arm", labels="self-hosted,arm64"),
+    ))
+
+    async def run() -> None:
+        queue.start()
+        await queue.enqueue(make_job(1, "self-hosted", "GPU"))
+        await queue.enqueue(make_job(2, "arm64"))
+        await queue.enqueue(make_job(3, "gpu", "arm64"))   # nobody has both
+        await queue.enqueue(make_job(4, "gpu"))
+        await fake_workers.settle()
+
+        assert queue.dispatched == [(1, "gpu", 0), (2, "arm", 0)]
+        # The gpu worker is busy; the idle arm worker must not take job 4
+        assert queue.queued("gpu") == [4]
+        assert queue.queue_size == 1
+
+        fake_workers.finish(fake_workers.running("gpu")[0])
+        await fake_workers.settle()
+        assert queue.dispatched[-1] == (4, "gpu", 0)
+        await queue.stop()
+
+    _run(run)
+
+
+def test_jobs_with_the_same_labels_run_in_arrival_order(make_queue, make_job, fake_workers):
+    queue = make_queue()
+
+    async def run() -> None:
+        queue.start()
+        for job_id in (1, 2, 3):
+            await queue.enqueue(make_job(job_id))
+        await fake_workers.settle()
+        assert [d[0] for d in queue.dispatched] == [1]
+        assert queue.queued("self-hosted") == [2, 3]
+
+        for expected in ([1, 2], [1, 2, 3]):
+            fake_workers.finish(fake_workers.running()[0])
+            await fake_workers.settle()
+            assert [d[0] for d in queue.dispatched] == expected
+        await queue.stop()
+
+    _run(run)
+
+
+def test_freed_worker_takes_the_oldest_job_across_label_sets(
+    make_queue, make_worker, make_job, fake_workers
+):
+    queue = make_queue(workers=(make_worker(labels="self-hosted,linux,gpu"),))
+
+    async def run() -> None:
+        queue.start()
+        await queue.enqueue(make_job(1, "linux"))
+        await queue.enqueue(make_job(2, "gpu"))
+        await queue.enqueue(make_job(3, "linux"))
+        await queue.enqueue(make_job(4, "gpu"))
+        await fake_workers.settle()
+        for _ in range(3):
+            fake_workers.finish(fake_workers.running()[0])
+            await fake_workers.settle()
+
+        assert [d[0] for d in queue.dispatched] == [1, 2, 3, 4]
+        await queue.stop()
+
+    _run(run)
+
+
+# -- failed dispatches -------------------------------------------------------
+
+def test_failed_wake_requeues_the_job_onto_another_worker(
+    make_queue, make_worker, make_job, fake_workers
+):
+    queue = make_queue(workers=(make_worker("a"), make_worker("b")))
+    fake_workers.unreachable.add("a")
+
+    async def run() -> None:
+        queue.start()
+        await queue.enqueue(make_job(1))
+        await fake_workers.settle()
+
+        assert queue.dispatched == [(1, "a", 0), (1, "b", 0)]
+        assert fake_workers.wakes == ["a", "b"]
+        a, b = queue.workers
+        assert a.cooling_down and not a.available
+        assert b.state is WorkerState.RUNNING
+        assert queue.queue_size == 0
+        await queue.stop()
+
+    _run(run)
+
+
+def test_requeued_job_keeps_its_place_in_line(make_queue, make_worker, make_job, fake_workers):
+    queue = make_queue(workers=(make_worker(slots=2),))
+    fake_workers.unreachable.add("worker")
+
+    async def run() -> None:
+        queue.start()
+        for job_id in (1, 2, 3):
+            await queue.enqueue(make_job(job_id))
+        await fake_workers.settle()
+
+        # Both slots were dispatched, but they share a single failed wake
+        assert [d[0] for d in queue.dispatched] == [1, 2]
+        assert fake_workers.wakes == ["worker"]
+        assert queue.queued("self-hosted") == [1, 2, 3]
+        await queue.stop()
+
+    _run(run)
+
+
+def test_failed_worker_is_rewoken_after_a_growing_backoff(
+    make_queue, make_job, fake_workers, monkeypatch
+):
+    monkeypatch.setattr(queue_manager, "WAKE_RETRY_BACKOFF", 0.05)
+    monkeypatch.setattr(queue_manager, "WAKE_RETRY_BACKOFF_MAX", 0.1)
+    queue = make_queue()
+    fake_workers.unreachable.add("worker")
+    worker = queue.workers[0]
+
+    async def run() -> None:
+        queue.start()
+        await queue.enqueue(make_job(1))
+        await fake_workers.settle()
+        assert fake_workers.wakes == ["worker"]
+        assert queue.queued("self-hosted") == [1]
+
+        await asyncio.sleep(0.06)
+        await fake_workers.settle()
+        assert fake_workers.wakes == ["worker"] * 2
+        assert worker.wake_failures == 2
+        assert 0.05 < worker.wake_retry_at - time.monotonic() <= 0.1
+
+        # Capped at WAKE_RETRY_BACKOFF_MAX
+        await asyncio.sleep(0.11)
+        await fake_workers.settle()
+        assert worker.wake_failures == 3
+        assert worker.wake_retry_at - time.monotonic() <= 0.1
+
+        fake_workers.unreachable.clear()
+        await asyncio.sleep(0.11)
+        await fake_workers.settle()
+        assert fake_workers.running() and queue.queue_size == 0
+        assert worker.wake_failures == 0
+        await queue.stop()
+
+    _run(run)
+
+
+# -- bookkeeping -------------------------------------------------------------
+
+def test_enqueue_time_is_forgotten_without_a_completed_event(make_queue, make_job, fake_workers):
+    queue = make_queue()
+
+    async def run() -> None:
+        queue.start()
+        await queue.enqueue(make_job(1))
+        await queue.enqueue(make_job(2))
+        await fake_workers.settle()
+        await queue.job_started(make_job(1, action="in_progress", runner=fake_workers.running()[0]))
+        assert set(queue._enqueued_at) == {1, 2}
+
+        # Job 1's runner exits and its completed webhook is lost
+        fake_workers.finish(fake_workers.running()[0])
+        await fake_workers.settle()
+        assert set(queue._enqueued_at) == {2}
+
+        # Job 2's dispatch blows up and the job is dropped
+        fake_workers.runners[fake_workers.running()[0]][2].set_exception(RuntimeError("boom"))
+        await fake_workers.settle()
+        assert queue._enqueued_at == {}
+        await queue.stop()
+
+    _run(run)
+
+
+# -- multi-slot workers ------------------------------------------------------
+
+def test_worker_runs_at_most_one_job_per_slot(make_queue, make_worker, make_job, fake_workers):
+    queue = make_queue(workers=(make_worker(slots=2),))
+    worker = queue.workers[0]
+
+    async def run() -> None:
+        queue.start()
+        for job_id in (1, 2, 3, 4):
+            await queue.enqueue(make_job(job_id))
+        await fake_workers.settle()
+
+        assert queue.dispatched == [(1, "worker", 0), (2, "worker", 1)]
+        assert len(fake_workers.running()) == 2
+        assert worker.occupancy == 2 and not worker.available
+        assert fake_workers.wakes == ["worker"]   # one wake for both slots
+        assert queue.queued("self-hosted") == [3, 4]
+        await queue.stop()
+
+    _run(run)
+
+
+def test_freed_slot_pulls_the_next_job(make_queue, make_worker, make_job, fake_workers):
+    queue = make_queue(workers=(make_worker(slots=2),))
+
+    async def run() -> None:
+        queue.start()
+        for job_id in (1, 2, 3):
+            await queue.enqueue(make_job(job_id))
+        await fake_workers.settle()
+
+        # The runner in slot 2 (job 2) finishes first
+        second = next(n for n, (_, slot, _) in fake_workers.runners.items() if slot == 1)
+        fake_workers.finish(second)
+        await fake_workers.settle()
+
+        assert queue.dispatched[-1] == (3, "worker", 1)
+        assert len(fake_workers.running()) == 2
+        assert queue.queue_size == 0
+        await queue.stop()
+
+    _run(run)
+
+
+def test_suspend_waits_for_every_slot_to_drain(make_queue, make_worker, make_job, fake_workers):
+    queue = make_queue(workers=(make_worker(slots=3),), suspend_grace_seconds=0)
+    worker = queue.workers[0]
+
+    async def run() -> None:
+        queue.start()
+        for job_id in (1, 2, 3):
+            await queue.enqueue(make_job(job_id))
+        await fake_workers.settle()
+
+        first, *rest = fake_workers.running()
+        fake_workers.finish(first)
+        await fake_workers.settle()
+        assert worker.suspend_task is None
+        assert fake_workers.suspends == []
+
+        fake_workers.finish(rest[0])
+        await fake_workers.settle()
+        assert worker.suspend_task is None
+        assert fake_workers.suspends == []
+
+        fake_workers.finish(rest[1])
+        await fake_workers.settle()
+        assert fake_workers.suspends == ["worker"]
+        assert worker.state is WorkerState.OFFLINE
+        await queue.stop()
+
+    _run(run)
+
+
+def test_jobs_spread_over_the_least_loaded_running_worker(
+    make_queue, make_worker, make_job, fake_workers
+):
+    queue = make_queue(workers=(make_worker("a", slots=2), make_worker("b", slots=2)))
+
+    async def run() -> None:
+        queue.start()
+        await queue.enqueue(make_job(1))
+        await fake_workers.settle()
+        # b is awake too, so the next job goes to whichever has fewer runners
+        fake_workers.awake.add("b")
+        queue.workers[1].state = WorkerState.ONLINE
+        await queue.enqueue(make_job(2))
+        await queue.enqueue(make_job(3))
+        await fake_workers.settle()
+
+        assert [(d[0], d[1]) for d in queue.dispatched] == [(1, "a"), (2, "b"), (3, "a")]
+        await queue.stop()
+
+    _run(run)
+
+
+# -- hot standby -------------------------------------------------------------
+
+async def _with_standby(queue, make_job, fake_workers):
+    """Run one job so the worker is up, and leave a standby runner waiting."""
+    queue.start()
+    await queue.enqueue(make_job(100))
+    await fake_workers.settle()
+    fake_workers.finish(fake_workers.running()[0])
+    await fake_workers.settle()
+    worker = queue.workers[0]
+    assert worker.standby_runner in fake_workers.running()
+    assert worker.occupancy == 0
+    return worker
+
+
+def test_standby_that_takes_a_job_holds_its_slot(make_queue, make_worker, make_job, fake_workers):
+    queue = make_queue(workers=(make_worker(slots=2),), hot_standby=True)
+
+    async def run() -> None:
+        worker = await _with_standby(queue, make_job, fake_workers)
+        standby, slot = worker.standby_runner, worker.standby_slot
+        assert worker.suspend_task is not None
+
+        # GitHub hands the standby a job whose queued event we never saw
+        await queue.job_started(make_job(7, action="in_progress", runner=standby))
+
+        assert worker.slots[slot] and worker.standby_busy
+        assert worker.occupancy == 1
+        assert worker.suspend_task.cancelled() or worker.suspend_task.cancelling()
+        # Only the other slot is left, and a queued job takes that one
+        await queue.enqueue(make_job(8))
+        await fake_workers.settle()
+        assert queue.dispatched[-1] == (8, "worker", 1 - slot)
+        assert worker.occupancy == 2 and not worker.available
+        await queue.enqueue(make_job(9))
+        await fake_workers.settle()
+        assert queue.queued("self-hosted") == [9]
+        await queue.stop()
+
+    _run(run)
+
+
+def test_busy_standby_is_replaced_after_it_exits(make_queue, make_job, fake_workers):
+    queue = make_queue(hot_standby=True)
+
+    async def run() -> None:
+        worker = await _with_standby(queue, make_job, fake_workers)
+        standby = worker.standby_runner
+        await queue.job_started(make_job(7, action="in_progress", runner=standby))
+        assert not worker.available
+
+        fake_workers.finish(standby)
+        await fake_workers.settle()
+
+        assert worker.standby_runner not in (None, standby)
+        assert worker.standby_runner in fake_workers.running()
+        assert not worker.standby_busy
+        assert worker.occupancy == 0 and worker.available
+        await queue.stop()
+
+    _run(run)
+
+
+def test_adopted_standby_is_counted_once(make_queue, make_worker, make_job, fake_workers):
+    queue = make_queue(workers=(make_worker(slots=2),), hot_standby=True)
+
+    async def run() -> None:
+        worker = await _with_standby(queue, make_job, fake_workers)
+        standby, slot = worker.standby_runner, worker.standby_slot
+
+        # The job's queued webhook arrives first and its dispatch adopts the standby
+        await queue.enqueue(make_job(7))
+        await fake_workers.settle()
+        assert queue.dispatched[-1] == (7, "worker", slot)
+        # ...then GitHub reports the job running on that runner
+        await queue.job_started(make_job(7, action="in_progress", runner=standby))
+
+        assert worker.standby is None and not worker.standby_busy
+        assert worker.occupancy == 1
+        assert worker.available
+        assert len(fake_workers.running()) == 1
+
+        # When it exits, the freed slot gets a new standby
+        fake_workers.finish(standby)
+        await fake_workers.settle()
+        assert worker.occupancy == 0
+        assert worker.standby_runner not in (None, standby)
+        await queue.stop()
+
+    _run(run)
+
+
+def test_no_standby_restarts_during_shutdown(make_queue, make_job, fake_workers):
+    queue = make_queue(hot_standby=True)
+
+    async def run() -> None:
+        worker = await _with_standby(queue, make_job, fake_workers)
+        await queue.stop()
+        await fake_workers.settle()
+        assert worker.standby is None
+        assert fake_workers.running() == []
+
+    _run(run)
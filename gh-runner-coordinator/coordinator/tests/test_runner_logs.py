@@ -0,0 +1,77 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.main import create_app
+from app.runner_logs import RunnerLogStore
+
+TOKEN = "logs-token"
+AUTH = {"Authorization": f"Bearer {TOKEN}"}
+
+
+class LogQueue:
+    """Just enough of QueueManager for the /logs endpoints."""
+
+    def __init__(self, cfg) -> None:
+        self.logs = RunnerLogStore(cfg)
+
+    def start(self) -> None:
+        self.logs.start()
+
+    async def stop(self) -> None:
+        await self.logs.close()
+
+
+def _client(make_config, **overrides):
+    cfg = make_config(runner_log_token=TOKEN, **overrides)
+    queue = LogQueue(cfg)
+    return TestClient(TestServer(create_app(cfg, queue))), queue
+
+
+def test_negative_offset_is_rejected(make_config):
+    async def run() -> None:
+        client, queue = _client(make_config)
+        async with client:
+            queue.logs.open("runner-1", "worker").write(b"hello\n")
+            resp = await client.get("/logs/runner-1?offset=-3", headers=AUTH)
+            assert resp.status == 400
+            resp = await client.get("/logs/runner-1?offset=x", headers=AUTH)
+            assert resp.status == 400
+
+    asyncio.run(run())
+
+
+def test_finished_runner_is_served_from_the_complete_archive(make_config):
+    async def run() -> None:
+        # A ring that only holds the last chunk
+        client, queue = _client(make_config, runner_log_buffer_bytes=8)
+        async with client:
+            runner_log = queue.logs.open("runner-1", "worker")
+            for line in (b"first line\n", b"second line\n", b"third line\n"):
+                runner_log.write(line)
+            queue.logs.finish(runner_log, 0)
+            while not runner_log.archived:
+                await asyncio.sleep(0.01)
+
+            resp = await client.get("/logs/runner-1", headers=AUTH)
+            assert resp.status == 200
+            assert await resp.read() == b"first line\nsecond line\nthird line\n"
+            resp = await client.get("/logs/runner-1?offset=11", headers=AUTH)
+            assert await resp.read() == b"second line\nthird line\n"
+
+    asyncio.run(run())
+
+
+def test_running_runner_is_served_from_memory(make_config):
+    async def run() -> None:
+        client, queue = _client(make_config)
+        async with client:
+            runner_log = queue.logs.open("runner-1", "worker")
+            runner_log.write(b"building\n")
+            resp = await client.get("/logs/runner-1?offset=2", headers=AUTH)
+            runner_log.write(b"done\n")
+            queue.logs.finish(runner_log, 0)
+            assert await resp.read() == b"ilding\ndone\n"
+            assert not runner_log.running
+
+    asyncio.run(run())
@@ -0,0 +1,60 @@
+import asyncio
+
+from app import worker_manager as wm
+from app.config import WorkerConfig
+
+WORKER = WorkerConfig(
+    name="worker", mac="00:11:22:33:44:55", host="worker.local", ssh_user="runner",
+    ssh_key="/ssh/id_rsa", runner_dir="/home/runner/actions-runner",
+    suspend_cmd="systemctl suspend", labels="self-hosted", slots=1,
+    wol_targets="255.255.255.255:9",
+)
+
+
+def _patch(monkeypatch, master: bool, session: bool, probe: bool) -> list[str]:
+    calls = []
+
+    async def control(worker, op):
+        calls.append(f"control {op}")
+        return master if op == "check" else True
+
+    async def ssh_quick(worker, command, timeout=5.0):
+        calls.append("ssh")
+        return session
+
+    async def tcp_probe(host, port=22, timeout=3.0):
+        calls.append("probe")
+        return probe
+
+    monkeypatch.setattr(wm, "_control", control)
+    monkeypatch.setattr(wm, "_ssh_quick", ssh_quick)
+    monkeypatch.setattr(wm, "_tcp_probe", tcp_probe)
+    return calls
+
+
+def test_live_master_answers_without_probing(monkeypatch):
+    calls = _patch(monkeypatch, master=True, session=True, probe=False)
+
+    assert asyncio.run(wm.is_online(WORKER)) is True
+    assert calls == ["control check", "ssh"]
+
+
+def test_stale_master_is_closed_and_host_probed(monkeypatch):
+    calls = _patch(monkeypatch, master=True, session=False, probe=True)
+
+    assert asyncio.run(wm.is_online(WORKER)) is True
+    assert calls == ["control check", "ssh", "control exit", "probe"]
+
+
+def test_offline_only_when_probe_fails_too(monkeypatch):
+    calls = _patch(monkeypatch, master=True, session=False, probe=False)
+
+    assert asyncio.run(wm.is_online(WORKER)) is False
+    assert calls[-1] == "probe"
+
+
+def test_no_master_probes_directly(monkeypatch):
+    calls = _patch(monkeypatch, master=False, session=True, probe=True)
+
+    assert asyncio.run(wm.is_online(WORKER)) is True
+    assert calls == ["control check", "probe"]
@@ -0,0 +1,214 @@
+"""
+Backtest the rebalancer over the recorded holdings history.
+
+For every snapshot date, rebalance() is replayed: blend the regions, drop
+the excluded names, keep the top N and renormalise. The result is measured
+against the full blended index. Every date is computed at once as a dense
+dates x tickers array, so a scenario costs a handful of array operations
+rather than a pandas groupby per date.
+
+Tracking error is derived from the snapshots themselves. Between two
+consecutive dates a name's index weight moves by its return relative to the
+index, so each name's weight ratio is its relative growth. Regions are
+assumed to move together (the rebalancer resets the US/intl split anyway).
+What is measured is therefore the cost of holding N names instead of the
+whole index, which is the part --max-stocks and exclusions control.
+
+Usage:
+    python -m sp500.backtest backfill                  # import cached downloads
+    python -m sp500.backtest run --max-stocks 50,100,200
+    python -m sp500.backtest run --us-weight 0.6,1 --exclude TSLA --exclude none
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+from sp500 import rebalance
+from sp500.cache import HoldingsCache
+from sp500.history import HistoryStore, HistoryUnavailable, Panel, build_panel
+from sp500.lazy import lazy_import
+from sp500.scenarios import exclude_label, grid_list
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Fallbacks first, so a primary source's snapshot wins a shared date
+_SOURCES = (
+    ("slickcharts", rebalance._parse_slickcharts),
+    ("spy", rebalance._parse_spy),
+    ("iefa", rebalance._parse_iefa),
+    ("vea", rebalance._parse_vea),
+)
+
+
+def run_backtest(
+    panel: Panel,
+    us_weights: list[float],
+    max_stocks: list[int],
+    excludes: list[list[str]],
+) -> pd.DataFrame:
+    """One row per (us_weight, exclude set, max_stocks) scenario."""
+    if len(panel.dates) < 2:
+        raise ValueError("need at least two snapshot dates to backtest")
+    span_days = (panel.dates[-1] - panel.dates[0]) / np.timedelta64(1, "D")
+    periods_per_year = (len(panel.dates) - 1) / (span_days / 365.25)
+    exclude_sets = [sorted({t.strip().upper() for t in ex if t.strip()}) for ex in excludes]
+    exclude_masks = [np.isin(panel.tickers, ex) for ex in exclude_sets]
+    rows: list[dict] = []
+
+    for a in us_weights:
+        index = a * panel.us + (1 - a) * panel.intl
+        # Each name's growth relative to the index between consecutive dates;
+        # names entering or leaving the index count as flat
+        prev, nxt = index[:-1], index[1:]
+        growth = np.ones_like(prev)
+        live = (prev > 0) & (nxt > 0)
+        growth[live] = nxt[live] / prev[live]
+        bench = (prev * growth).sum(axis=1)
+
+        for ex, ex_mask in zip(exclude_sets, exclude_masks):
+            kept = np.where(ex_mask, 0.0, index)
+            excluded_weight = index[:, ex_mask].sum(axis=1)
+            # Rank every name once per date; each top-N cut is then a comparison
+            order = np.argsort(-kept, axis=1, kind="stable")
+            rank = np.empty_like(order)
+            np.put_along_axis(rank, order, np.arange(kept.shape[1])[None, :], axis=1)
+
+            for n in max_stocks:
+                held = (rank < n) & (kept > 0)
+                port = np.where(held, kept, 0.0)
+                port /= port.sum(axis=1, keepdims=True)
+                grown = port[:-1] * growth
+                active = grown.sum(axis=1) - bench
+                drifted = grown / grown.sum(axis=1, keepdims=True)
+                turnover = 0.5 * np.abs(port[1:] - drifted).sum(axis=1)
+                rows.append({
+                    "us_weight": a,
+                    "max_stocks": n,
+                    "exclude": exclude_label(ex),
+                    "dates": len(panel.dates),
+                    "tracking_error_pct": float(active.std(ddof=1)) * np.sqrt(periods_per_year) * 100
+                    if len(active) > 1 else float("nan"),
+                    "active_return_pct": float(active.mean()) * periods_per_year * 100,
+                    "coverage_pct": float((index * held).sum(axis=1).mean()) * 100,
+                    "us_coverage_pct": float((panel.us * held).sum(axis=1).mean()) * 100 if a > 0 else 0.0,
+                    "intl_coverage_pct": float((panel.intl * held).sum(axis=1).mean()) * 100 if a < 1 else 0.0,
+                    "excluded_weight_pct": float(excluded_weight.mean()) * 100,
+                    "turnover_pct": float(turnover.mean()) * 100,
+                })
+    return pd.DataFrame(rows)
+
+
+def print_backtest(results: pd.DataFrame, panel: Panel) -> None:
+    first, last = (str(d)[:10] for d in (panel.dates[0], panel.dates[-1]))
+    print(f"\nBacktest: {len(panel.dates)} snapshot dates, {first} to {last}\n")
+    with pd.option_context("display.max_rows", None, "display.width", 200,
+                           "display.max_colwidth", 40):
+        print(
+            results.to_string(
+                index=False,
+                formatters={
+                    "us_weight": "{:.2f}".format,
+                    "tracking_error_pct": "{:,.2f}".format,
+                    "active_return_pct": "{:+,.2f}".format,
+                    "coverage_pct": "{:,.1f}".format,
+                    "us_coverage_pct": "{:,.1f}".format,
+                    "intl_coverage_pct": "{:,.1f}".format,
+                    "excluded_weight_pct": "{:,.2f}".format,
+                    "turnover_pct": "{:,.2f}".format,
+                },
+            )
+        )
+    print("\ntracking_error_pct and active_return_pct are annualised; "
+          "turnover_pct is per rebalance.")
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def cmd_backfill(args: argparse.Namespace, cache: HoldingsCache, store: HistoryStore) -> None:
+    added = 0
+    recorded = {r: set(store.dates(r)) for r in ("us", "intl")}
+    for source, parse in _SOURCES:
+        for entry in cache.entries(source):
+            df = cache.frame(
+                entry.blob, f"{source}-v{rebalance.PARSER_VERSION}",
+                lambda: parse(cache.body(entry)),
+            )
+            region = str(df["region"].iloc[0]).lower() if not df.empty else None
+            if region is None or entry.as_of in recorded[region] and not args.force:
+                continue
+            store.record(df, source, entry.as_of)
+            added += 1
+    print(f"Recorded {added} snapshot(s) into {store.root}")
+    for region in ("us", "intl"):
+        dates = store.dates(region)
+        span = f"{dates[0]} to {dates[-1]}" if dates else "none"
+        print(f"  {region:<5} {len(dates):5d} dates ({span})")
+
+
+def cmd_run(args: argparse.Namespace, cache: HoldingsCache, store: HistoryStore) -> None:
+    ap = args.parser
+    us_weights = grid_list(ap, "--us-weight", args.us_weight, float,
+                           rebalance.DEFAULT_US_WEIGHT)
+    max_stocks = grid_list(ap, "--max-stocks", args.max_stocks, int,
+                           rebalance.DEFAULT_MAX_STOCKS)
+    if not all(0.0 <= w <= 1.0 for w in us_weights):
+        ap.error("--us-weight values must be between 0 and 1")
+    if not all(n > 0 for n in max_stocks):
+        ap.error("--max-stocks values must be > 0")
+    excludes = [
+        [] if spec.strip().lower() in ("", "none") else spec.split(",")
+        for spec in args.exclude or [",".join(rebalance.DEFAULT_EXCLUDE)]
+    ]
+
+    us = store.load("us", args.start, args.end) if max(us_weights) > 0 else None
+    intl = store.load("intl", args.start, args.end) if min(us_weights) < 1 else None
+    panel = build_panel(us, intl)
+    results = run_backtest(panel, us_weights, max_stocks, excludes)
+    print_backtest(results, panel)
+    if args.csv:
+        results.to_csv(args.csv, index=False)
+        print(f"\nWrote {args.csv}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Backtest the rebalancer on recorded holdings.")
+    ap.add_argument("--cache-dir", type=str, default=None,
+                    help="Holdings cache directory (default: $SP500_CACHE_DIR or "
+                         "~/.cache/sp500-rebalance)")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    backfill = sub.add_parser("backfill", help="Record every cached download in the history")
+    backfill.add_argument("--force", action="store_true",
+                          help="Overwrite dates that are already recorded")
+    backfill.set_defaults(run=cmd_backfill)
+
+    run = sub.add_parser("run", help="Replay rebalance() over the history")
+    run.add_argument("--us-weight", type=str, default=None, metavar="LIST",
+                     help=f"Comma-separated US weights (default: {rebalance.DEFAULT_US_WEIGHT})")
+    run.add_argument("--max-stocks", type=str, default=None, metavar="LIST",
+                     help=f"Comma-separated holding caps (default: {rebalance.DEFAULT_MAX_STOCKS})")
+    run.add_argument("--exclude", type=str, action="append", default=None, metavar="TICKERS",
+                     help="One exclude set (comma-separated, or 'none'); repeat for more "
+                          "sets (default: the rebalancer's exclusion list)")
+    run.add_argument("--start", type=str, default=None, help="First date (YYYY-MM-DD)")
+    run.add_argument("--end", type=str, default=None, help="Last date (YYYY-MM-DD)")
+    run.add_argument("--csv", type=str, default=None, help="Write the results to this CSV path")
+    run.set_defaults(run=cmd_run, parser=run)
+
+    args = ap.parse_args()
+    cache = HoldingsCache(args.cache_dir)
+    store = HistoryStore(cache.root)
+    try:
+        args.run(args, cache, store)
+    except (HistoryUnavailable, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
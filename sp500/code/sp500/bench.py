@@ -0,0 +1,326 @@
+"""
+Micro-benchmarks for the rebalancer's hot spots.
+
+Usage:
+    python -m sp500.bench xlsx                      # synthetic SPY workbook
+    python -m sp500.bench xlsx holdings-daily-us-en-spy.xlsx --repeat 10
+    python -m sp500.bench core                      # rebalance() at 500 / 5k / 50k rows
+    python -m sp500.bench core --rows 10000 --max-stocks 200
+    python -m sp500.bench startup                   # CLI import time vs. a budget
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from sp500 import rebalance
+from sp500.cache import Entry, HoldingsCache, _atomic_write
+
+
+def _timeit(fn, repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _report(label: str, times: list[float]) -> float:
+    best, median = min(times), statistics.median(times)
+    print(f"{label:<28} best {best * 1000:8.1f}ms   median {median * 1000:8.1f}ms")
+    return median
+
+
+# ---------------------------------------------------------------------------
+# xlsx: SPY holdings parsing
+# ---------------------------------------------------------------------------
+
+def _parse_spy_two_pass(content: bytes) -> pd.DataFrame:
+    """
+    The previous parser: read the whole workbook once to find the header row,
+    then again from there. (Its skiprows offset also swallowed the header
+    row itself; that is corrected here so the two outputs can be compared.)
+    """
+    raw = pd.read_excel(io.BytesIO(content), header=None)
+    header_row = raw.index[raw.iloc[:, 0].astype(str).str.strip() == "Ticker"][0]
+    df = pd.read_excel(io.BytesIO(content), skiprows=header_row)
+    df.columns = [c.strip() for c in df.columns]
+    df = df.rename(columns={"Ticker": "ticker", "Name": "name", "Weight": "weight"})
+    df = df[["ticker", "name", "weight"]].dropna(subset=["ticker"])
+    df["ticker"] = df["ticker"].astype(str).str.strip().str.upper()
+    df["weight"] = pd.to_numeric(df["weight"], errors="coerce") / 100.0
+    df = df.dropna(subset=["weight"])
+    df = df[~df["ticker"].isin(["-", "CASH_USD", "USD"])]
+    df["region"] = "US"
+    return df.reset_index(drop=True)
+
+
+def synthetic_spy_xlsx(rows: int = 503) -> bytes:
+    """A workbook shaped like SSGA's daily SPY holdings file."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["Fund Name:", "SPDR® S&P 500® ETF Trust"])
+    ws.append(["Ticker Symbol:", "SPY"])
+    ws.append(["Holdings:", "As of 01-Jan-2026"])
+    ws.append([])
+    ws.append(["Ticker", "Name", "Identifier", "SEDOL", "Weight", "Sector",
+               "Shares Held", "Local Currency"])
+    for i in range(rows):
+        ws.append([f"T{i:03d}", f"COMPANY {i} INC", f"{i:09d}", f"{i:07d}",
+                   round(100 / rows, 6), "Information Technology", 1000 + i, "USD"])
+    ws.append(["CASH_USD", "US DOLLAR", None, None, 0.1, None, 1, "USD"])
+    ws.append([])
+    ws.append(["Past performance is not a reliable indicator of future performance."])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def bench_xlsx(args: argparse.Namespace) -> None:
+    if args.path:
+        with open(args.path, "rb") as fh:
+            content = fh.read()
+        print(f"SPY workbook: {args.path} ({len(content) / 1024:.0f} KiB)")
+    else:
+        content = synthetic_spy_xlsx()
+        print(f"SPY workbook: synthetic, 503 holdings ({len(content) / 1024:.0f} KiB)")
+
+    new = rebalance._parse_spy(content)
+    try:
+        old = _parse_spy_two_pass(content)
+    except IndexError:
+        old = None
+        print("[warn] two-pass parser can't find a first-column 'Ticker' header "
+              "in this file; timing single-pass only", file=sys.stderr)
+    if old is not None:
+        # The legacy parser predates the sector column
+        pd.testing.assert_frame_equal(old, new.drop(columns="sector"), check_dtype=False)
+        print(f"parsers agree on {len(new)} holdings\n")
+        before = _report(
+            "two-pass pd.read_excel", _timeit(lambda: _parse_spy_two_pass(content), args.repeat)
+        )
+    after = _report(
+        "single-pass openpyxl", _timeit(lambda: rebalance._parse_spy(content), args.repeat)
+    )
+    if old is not None:
+        print(f"\nspeedup: {before / after:.1f}x")
+
+
+# ---------------------------------------------------------------------------
+# core: _blend / rebalance
+# ---------------------------------------------------------------------------
+
+def _rebalance_pandas(
+    us: pd.DataFrame, intl: pd.DataFrame, exclude: list[str], max_stocks: int, us_weight: float
+) -> tuple[pd.DataFrame, float, float, float]:
+    """
+    The previous DataFrame core: copy and concat both frames, groupby/agg,
+    sort, isin/copy for exclusions, and rescan the original frames for
+    coverage. Returns the picks and the excluded weight and coverages.
+    """
+    u = us.copy()
+    u["weight"] = u["weight"] * us_weight
+    i = intl.copy()
+    i["weight"] = i["weight"] * (1 - us_weight)
+    blended = pd.concat([u, i], ignore_index=True)
+    blended = (
+        blended.groupby("ticker", as_index=False)
+        .agg({"name": "first", "weight": "sum", "region": "first"})
+    )
+    blended = blended.sort_values("weight", ascending=False).reset_index(drop=True)
+
+    excl_mask = blended["ticker"].isin(exclude)
+    excluded_weight = float(blended.loc[excl_mask, "weight"].sum())
+    kept = blended.loc[~excl_mask].copy()
+    picked = kept.head(max_stocks).copy()
+    us_coverage = float(us.loc[us["ticker"].isin(picked["ticker"]), "weight"].sum())
+    intl_coverage = float(intl.loc[intl["ticker"].isin(picked["ticker"]), "weight"].sum())
+    picked["rebalanced_weight"] = picked["weight"] / picked["weight"].sum()
+    picked = picked.sort_values("rebalanced_weight", ascending=False).reset_index(drop=True)
+    return picked, excluded_weight, us_coverage, intl_coverage
+
+
+def synthetic_region(rows: int, prefix: str, region: str, seed: int = 0) -> pd.DataFrame:
+    """A holdings frame with a cap-weighted (heavy-tailed) weight profile."""
+    rng = np.random.default_rng(seed)
+    weight = rng.pareto(1.1, rows) + 0.01
+    tickers = [f"{prefix}{i:05d}" for i in range(rows)]
+    return pd.DataFrame({
+        "ticker": tickers,
+        "name": [f"COMPANY {t}" for t in tickers],
+        "weight": weight / weight.sum(),
+        "region": region,
+    })
+
+
+def bench_core(args: argparse.Namespace) -> None:
+    print(f"rebalance(): top {args.max_stocks}, 10 exclusions, both regions\n")
+    for rows in args.rows:
+        us = synthetic_region(rows // 2, "U", "US", seed=1)
+        intl = synthetic_region(rows - rows // 2, "I", "INTL", seed=2)
+        # A few cross-listings, as in the real feeds
+        intl.loc[:4, "ticker"] = us["ticker"].iloc[:5].to_numpy()
+        exclude = list(us["ticker"].iloc[::7][:5]) + list(intl["ticker"].iloc[::5][:5])
+
+        old = _rebalance_pandas(us, intl, exclude, args.max_stocks, 0.6)
+        plan = rebalance.rebalance(us, "us", intl, "intl", exclude, 1.0, args.max_stocks, 0.6)
+        assert list(old[0]["ticker"]) == list(plan.df["ticker"])
+        np.testing.assert_allclose(old[0]["rebalanced_weight"], plan.df["rebalanced_weight"])
+        np.testing.assert_allclose(
+            old[1:], (plan.excluded_weight, plan.us_coverage, plan.intl_coverage)
+        )
+
+        print(f"{rows:,} rows (results agree)")
+        before = _report(
+            "  pandas groupby core",
+            _timeit(lambda: _rebalance_pandas(us, intl, exclude, args.max_stocks, 0.6),
+                    args.repeat),
+        )
+        after = _report(
+            "  array core",
+            _timeit(lambda: rebalance.rebalance(
+                us, "us", intl, "intl", exclude, 1.0, args.max_stocks, 0.6
+            ), args.repeat),
+        )
+        print(f"  speedup: {before / after:.1f}x\n")
+
+
+# ---------------------------------------------------------------------------
+# startup: import cost of the CLI
+# ---------------------------------------------------------------------------
+
+HEAVY_MODULES = ("pandas", "numpy", "requests", "openpyxl", "pyarrow")
+HELP_BUDGET_MS = 60.0       # argparse and our own modules only
+RUN_BUDGET_MS = 1500.0      # pandas, but no requests, openpyxl or Parquet writer
+
+
+def _import_profile(argv: list[str]) -> tuple[float, set[str]]:
+    """
+    Run ``python -X importtime <argv>`` and return the total import time in
+    ms (the sum of the top-level imports' cumulative times) and the names of
+    every module imported.
+    """
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(rebalance.__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *argv],
+        capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} exited {proc.returncode}:\n{proc.stderr[-2000:]}")
+    total_us = 0
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip())
+        if not name.startswith("  "):  # nested imports are indented below their parent
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def _seed_cache(root: str) -> None:
+    """A fresh cache entry and parsed frame for SPY and VEA, so a run never downloads."""
+    cache = HoldingsCache(root)
+    frames = {
+        "spy": synthetic_region(503, "U", "US", seed=1),
+        "vea": synthetic_region(3_000, "I", "INTL", seed=2),
+    }
+    for source, df in frames.items():
+        body = f"synthetic {source} holdings".encode()
+        digest = hashlib.sha256(body).hexdigest()
+        _atomic_write(os.path.join(root, "blobs", digest), body)
+        cache._save_entry(Entry(source=source, as_of=time.strftime("%Y-%m-%d"), url="",
+                                blob=digest, fetched_at=time.time()))
+        df = df.assign(sector=None)[["ticker", "name", "weight", "sector", "region"]]
+        cache.frame(digest, f"{source}-v{rebalance.PARSER_VERSION}", lambda: df)
+
+
+def bench_startup(args: argparse.Namespace) -> None:
+    failed = False
+    with tempfile.TemporaryDirectory() as root:
+        _seed_cache(root)
+        scenarios = [
+            ("--help", ["-m", "sp500.rebalance", "--help"],
+             args.help_budget_ms, HEAVY_MODULES),
+            ("cached run", ["-m", "sp500.rebalance", "--amount", "100000", "--cache-dir", root],
+             args.run_budget_ms, ("requests", "openpyxl", "pyarrow.parquet")),
+        ]
+        # Interpreter startup (site, encodings, .pth files) isn't the CLI's doing
+        baseline = statistics.median(_import_profile(["-c", "pass"])[0] for _ in range(args.repeat))
+        print(f"bare interpreter imports {baseline:.1f}ms (subtracted below)\n")
+        for label, argv, budget, forbidden in scenarios:
+            _import_profile(argv)  # warm the bytecode cache
+            runs = [_import_profile(argv) for _ in range(args.repeat)]
+            median = statistics.median(ms for ms, _ in runs) - baseline
+            # pandas itself imports core pyarrow when it is installed; only
+            # pyarrow.parquet (a history write) is off limits for a cached run
+            imported = {m for _, mods in runs for m in mods}
+            loaded = sorted(
+                f for f in forbidden
+                if any(m == f or m.startswith(f + ".") for m in imported)
+            )
+            ok = median <= budget and not loaded
+            failed |= not ok
+            print(f"{label:<12} imports {median:7.1f}ms (budget {budget:g}ms)  "
+                  f"{'ok' if ok else 'OVER BUDGET' if not loaded else 'FAIL'}")
+            if loaded:
+                print(f"             imported {', '.join(loaded)}; "
+                      f"this path should not need them")
+    if failed:
+        sys.exit(1)
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Rebalancer micro-benchmarks.")
+    sub = ap.add_subparsers(dest="bench", required=True)
+
+    xlsx = sub.add_parser("xlsx", help="SPY holdings workbook parsing")
+    xlsx.add_argument("path", nargs="?", default=None,
+                      help="Saved SPY holdings .xlsx (default: a synthetic one)")
+    xlsx.add_argument("--repeat", type=int, default=5)
+    xlsx.set_defaults(run=bench_xlsx)
+
+    core = sub.add_parser("core", help="_blend / rebalance() on synthetic universes")
+    core.add_argument("--rows", type=lambda v: [int(r) for r in v.split(",")],
+                      default=[500, 5_000, 50_000],
+                      help="Comma-separated total universe sizes (default: 500,5000,50000)")
+    core.add_argument("--max-stocks", type=int, default=100)
+    core.add_argument("--repeat", type=int, default=20)
+    core.set_defaults(run=bench_core)
+
+    startup = sub.add_parser("startup", help="CLI import time (python -X importtime) "
+                                             "against a budget; exits 1 when over")
+    startup.add_argument("--help-budget-ms", type=float, default=HELP_BUDGET_MS,
+                         help=f"Import budget for --help (default: {HELP_BUDGET_MS:g})")
+    startup.add_argument("--run-budget-ms", type=float, default=RUN_BUDGET_MS,
+                         help=f"Import budget for a run served from the holdings cache "
+                              f"(default: {RUN_BUDGET_MS:g})")
+    startup.add_argument("--repeat", type=int, default=5)
+    startup.set_defaults(run=bench_startup)
+
+    args = ap.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
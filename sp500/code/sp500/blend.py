@@ -0,0 +1,146 @@
+"""
+The blend core shared by rebalance() and the scenario grid.
+
+The two regions' holdings become one universe keyed by integer ticker
+codes: an unsorted factorize over both feeds' tickers, then a bincount per
+region for the weights. Exclusions, ordering and top-N cuts are array
+operations on those codes, and only the rows actually output become a
+DataFrame again (_frame).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from sp500.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+@dataclass
+class _Blended:
+    """
+    The blended universe as arrays indexed by ticker code, built without
+    copying or concatenating frames. Descriptive columns stay in their
+    source rows; ``columns`` maps each to (all rows, the row holding each
+    code's value) and only the rows actually output are ever looked up.
+    """
+    tickers: pd.Index
+    weight: np.ndarray            # blended weight; 0 for names only in a skipped region
+    present: np.ndarray           # name is in a region that is blended in
+    columns: dict[str, tuple[pd.Series, np.ndarray]]
+    us_weight: np.ndarray | None  # original US index weight per code, for coverage
+    intl_weight: np.ndarray | None
+
+
+def _first_rows(codes: np.ndarray, valid: np.ndarray, k: int) -> np.ndarray:
+    """Per code, the first row with a value (-1 if none), as groupby().first() picks."""
+    rows = np.flatnonzero(valid)[::-1]
+    first = np.full(k, -1)
+    # Reversed, so the earliest row is the one left standing for each code
+    first[codes[rows]] = rows
+    return first
+
+
+def _blend_codes(
+    us: pd.DataFrame | None,
+    intl: pd.DataFrame | None,
+    us_weight: float,
+) -> _Blended:
+    regions = [(df, scale) for df, scale in ((us, us_weight), (intl, 1 - us_weight))
+               if df is not None]
+    if not any(scale > 0 for _df, scale in regions):
+        raise ValueError("No regions selected.")
+
+    # Codes span every loaded frame, so coverage can be read off either
+    # region even when it isn't blended in (as _coverage always did).
+    # Unsorted factorize is a single hash pass.
+    codes, tickers = pd.factorize(
+        pd.concat([df["ticker"] for df, _ in regions], ignore_index=True)
+    )
+    k = len(tickers)
+    weight = np.zeros(k)
+    present = np.zeros(k, dtype=bool)
+    blended_rows = np.zeros(len(codes), dtype=bool)
+    region_weights: list[np.ndarray] = []
+    start = 0
+    for df, scale in regions:
+        rows = slice(start, start + len(df))
+        start += len(df)
+        # bincount sums duplicate rows, like the old groupby().sum()
+        region_w = np.bincount(codes[rows], weights=df["weight"].to_numpy(dtype=float),
+                               minlength=k)
+        region_weights.append(region_w)
+        if scale > 0:
+            weight += region_w * scale
+            present[codes[rows]] = True
+            blended_rows[rows] = True
+
+    columns = {}
+    for col in ("name", "region", "sector"):
+        if not any(col in df.columns for df, scale in regions if scale > 0):
+            continue
+        values = pd.concat(
+            [df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+             for df, _ in regions],
+            ignore_index=True,
+        )
+        valid = blended_rows & values.notna().to_numpy()
+        columns[col] = (values, _first_rows(codes, valid, k))
+
+    by_region = iter(region_weights)
+    return _Blended(
+        tickers=tickers,
+        weight=weight,
+        present=present,
+        columns=columns,
+        us_weight=next(by_region) if us is not None else None,
+        intl_weight=next(by_region) if intl is not None else None,
+    )
+
+
+def _frame(blended: _Blended, idx: np.ndarray, **extra: np.ndarray) -> pd.DataFrame:
+    """Rows ``idx`` of the blended universe as a DataFrame."""
+    def column(col: str) -> np.ndarray:
+        values, first = blended.columns[col]
+        rows = first[idx]
+        out = values.take(np.maximum(rows, 0)).to_numpy(dtype=object, copy=True)
+        out[rows < 0] = None
+        return out
+
+    data = {"ticker": blended.tickers[idx]}
+    if "name" in blended.columns:
+        data["name"] = column("name")
+    data["weight"] = blended.weight[idx]
+    for col in ("region", "sector"):
+        if col in blended.columns:
+            data[col] = column(col)
+    data.update(extra)
+    return pd.DataFrame(data)
+
+
+def _heaviest_first(weight: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    # Ties keep feed order (codes number tickers by first appearance)
+    return idx[np.lexsort((idx, -weight[idx]))]
+
+
+def _top_n(weight: np.ndarray, candidates: np.ndarray, n: int) -> np.ndarray:
+    """The ``n`` heaviest ``candidates``, heaviest first, without a full sort."""
+    if n < len(candidates):
+        candidates = candidates[np.argpartition(-weight[candidates], n - 1)[:n]]
+    return _heaviest_first(weight, candidates)
+
+
+def _exclusions(blended: _Blended, exclude: list[str]) -> tuple[np.ndarray, list[str], list[str]]:
+    """
+    Mask of the excluded codes among the blended names, plus the excluded
+    tickers that were found and those that weren't.
+    """
+    exclude_up = {t.strip().upper() for t in exclude if t.strip()}
+    mask = np.zeros(len(blended.tickers), dtype=bool)
+    codes = blended.tickers.get_indexer(list(exclude_up))
+    mask[codes[codes >= 0]] = True
+    mask &= blended.present
+    found = sorted(blended.tickers[mask])
+    return mask, found, sorted(exclude_up.difference(found))
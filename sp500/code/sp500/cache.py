@@ -0,0 +1,222 @@
+"""
+On-disk cache for holdings downloads.
+
+Layout under the cache directory:
+
+    blobs/<sha256>                   raw response bodies, content-addressed
+    frames/<sha256>-<parser>.pkl     parsed DataFrames for a given body
+    <source>/<YYYY-MM-DD>.json       what a source served on a given day
+                                     (blob hash, ETag, Last-Modified, fetch time)
+
+A source's newest entry is reused as-is while it is younger than the TTL.
+After that it is revalidated with If-None-Match / If-Modified-Since, so an
+unchanged file costs a 304 instead of a full download. Identical bodies
+share one blob, and a body is only ever parsed once.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sp500.lazy import lazy_import
+
+pd = lazy_import("pandas")
+requests = lazy_import("requests")
+
+DEFAULT_TTL_HOURS = 12.0
+
+
+def default_cache_dir() -> str:
+    if os.environ.get("SP500_CACHE_DIR"):
+        return os.environ["SP500_CACHE_DIR"]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "sp500-rebalance")
+
+
+class CacheMiss(RuntimeError):
+    """Offline and nothing cached for the source."""
+
+
+@dataclass
+class Entry:
+    source: str
+    as_of: str
+    url: str
+    blob: str
+    fetched_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class HoldingsCache:
+    def __init__(
+        self,
+        root: str | None = None,
+        ttl_hours: float = DEFAULT_TTL_HOURS,
+        offline: bool = False,
+        refresh: bool = False,
+    ) -> None:
+        self.root = root or default_cache_dir()
+        self.ttl = ttl_hours * 3600
+        self.offline = offline
+        self.refresh = refresh
+        # Sources whose body was downloaded (not served from cache) this run
+        self.downloaded: set[str] = set()
+
+    # -- entries -----------------------------------------------------------
+
+    def _latest(self, source: str) -> Entry | None:
+        folder = os.path.join(self.root, source)
+        try:
+            days = sorted(n for n in os.listdir(folder) if n.endswith(".json"))
+        except FileNotFoundError:
+            return None
+        for name in reversed(days):
+            try:
+                with open(os.path.join(folder, name), encoding="utf-8") as fh:
+                    entry = Entry(**json.load(fh))
+            except (OSError, ValueError, TypeError):
+                continue
+            if os.path.exists(self._blob_path(entry.blob)):
+                return entry
+        return None
+
+    def _save_entry(self, entry: Entry) -> None:
+        path = os.path.join(self.root, entry.source, f"{entry.as_of}.json")
+        _atomic_write(path, json.dumps(entry.__dict__, indent=1).encode())
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", digest)
+
+    def _read_blob(self, entry: Entry) -> bytes:
+        with open(self._blob_path(entry.blob), "rb") as fh:
+            return fh.read()
+
+    def _store(self, source: str, url: str, resp: requests.Response) -> str:
+        body = resp.content
+        digest = hashlib.sha256(body).hexdigest()
+        self.downloaded.add(source)
+        entry = Entry(
+            source=source,
+            as_of=time.strftime("%Y-%m-%d"),
+            url=url,
+            blob=digest,
+            fetched_at=time.time(),
+            etag=resp.headers.get("ETag"),
+            last_modified=resp.headers.get("Last-Modified"),
+        )
+        try:
+            if not os.path.exists(self._blob_path(digest)):
+                _atomic_write(self._blob_path(digest), body)
+            self._save_entry(entry)
+        except OSError as e:
+            # A read-only or full cache shouldn't stop the run
+            print(f"[warn] could not cache {source}: {e}", file=sys.stderr)
+        return digest
+
+    def _revalidated(self, entry: Entry) -> None:
+        entry.fetched_at = time.time()
+        entry.as_of = time.strftime("%Y-%m-%d")
+        try:
+            self._save_entry(entry)
+        except OSError as e:
+            print(f"[warn] could not cache {entry.source}: {e}", file=sys.stderr)
+
+    # -- public API --------------------------------------------------------
+
+    def latest(self, source: str) -> Entry | None:
+        """Newest cached entry for ``source`` (what the last fetch served)."""
+        return self._latest(source)
+
+    def entries(self, source: str) -> list[Entry]:
+        """Every cached day for ``source`` whose body is still present, oldest first."""
+        folder = os.path.join(self.root, source)
+        try:
+            days = sorted(n for n in os.listdir(folder) if n.endswith(".json"))
+        except FileNotFoundError:
+            return []
+        found = []
+        for name in days:
+            try:
+                with open(os.path.join(folder, name), encoding="utf-8") as fh:
+                    entry = Entry(**json.load(fh))
+            except (OSError, ValueError, TypeError):
+                continue
+            if os.path.exists(self._blob_path(entry.blob)):
+                found.append(entry)
+        return found
+
+    def body(self, entry: Entry) -> bytes:
+        return self._read_blob(entry)
+
+    def fetch(self, source: str, url: str, headers: dict[str, str]) -> tuple[bytes, str]:
+        """Return ``(body, sha256)`` for ``url``, from cache when possible."""
+        cached = self._latest(source)
+        if self.offline:
+            if cached is None:
+                raise CacheMiss(f"offline and no cached copy of {source}")
+            return self._read_blob(cached), cached.blob
+        if cached and not self.refresh and time.time() - cached.fetched_at < self.ttl:
+            return self._read_blob(cached), cached.blob
+
+        conditional = dict(headers)
+        if cached and cached.url == url:
+            if cached.etag:
+                conditional["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                conditional["If-Modified-Since"] = cached.last_modified
+        try:
+            resp = requests.get(url, headers=conditional, timeout=30)
+            if resp.status_code == 304 and cached:
+                self._revalidated(cached)
+                return self._read_blob(cached), cached.blob
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            if cached is None:
+                raise
+            print(
+                f"[warn] {source} download failed ({e}); "
+                f"using cached copy from {cached.as_of}",
+                file=sys.stderr,
+            )
+            return self._read_blob(cached), cached.blob
+        return resp.content, self._store(source, url, resp)
+
+    def frame(
+        self, digest: str, parser: str, parse: Callable[[], pd.DataFrame]
+    ) -> pd.DataFrame:
+        """Parsed form of blob ``digest``; ``parse`` only runs on a miss."""
+        path = os.path.join(self.root, "frames", f"{digest}-{parser}.pkl")
+        try:
+            return pd.read_pickle(path)
+        except (
+            OSError, ValueError, EOFError, pickle.UnpicklingError, ImportError, AttributeError
+        ):
+            pass  # not cached yet, or written by an incompatible pandas
+        df = parse()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            df.to_pickle(path)
+        except OSError as e:
+            print(f"[warn] could not cache parsed {parser}: {e}", file=sys.stderr)
+        return df
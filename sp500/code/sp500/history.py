@@ -0,0 +1,163 @@
+"""
+Local store of daily holdings snapshots, for backtesting.
+
+Every holdings download the rebalancer parses is also saved here, one Parquet
+file per region and day, with the columns ``date, source, ticker, weight``:
+
+    history/us/<YYYY-MM-DD>.parquet
+    history/intl/<YYYY-MM-DD>.parquet
+
+A later download on the same day replaces that day's file; runs served from
+the cache record nothing. Parquet needs pyarrow (``pip install
+sp500-rebalance[history]``). Without it nothing is recorded
+and the backtest refuses to run; the rebalancer itself works as before.
+``python -m sp500.backtest backfill`` imports whatever is already in the
+holdings cache.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import io
+import os
+import sys
+from dataclasses import dataclass
+
+from sp500.cache import _atomic_write
+from sp500.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# pandas' Parquet engine; optional: pip install sp500-rebalance[history].
+# Only looked up here, pandas imports it when a snapshot is written or read.
+_HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+REGIONS = ("us", "intl")
+
+
+class HistoryUnavailable(RuntimeError):
+    """pyarrow is not installed."""
+
+
+class HistoryStore:
+    def __init__(self, root: str) -> None:
+        self.root = os.path.join(root, "history")
+
+    @property
+    def enabled(self) -> bool:
+        return _HAS_PYARROW
+
+    def _path(self, region: str, as_of: str) -> str:
+        return os.path.join(self.root, region, f"{as_of}.parquet")
+
+    def record(self, df: pd.DataFrame, source: str, as_of: str) -> None:
+        """Save one parsed snapshot; a no-op without pyarrow."""
+        if not self.enabled or df.empty:
+            return
+        region = str(df["region"].iloc[0]).lower()
+        snap = pd.DataFrame({
+            "date": pd.Timestamp(as_of),
+            "source": source,
+            "ticker": df["ticker"].astype(str),
+            "weight": df["weight"].astype("float64"),
+        })
+        buf = io.BytesIO()
+        snap.to_parquet(buf, index=False)
+        try:
+            _atomic_write(self._path(region, as_of), buf.getvalue())
+        except OSError as e:
+            print(f"[warn] could not record {source} history: {e}", file=sys.stderr)
+
+    def dates(self, region: str) -> list[str]:
+        try:
+            names = os.listdir(os.path.join(self.root, region))
+        except FileNotFoundError:
+            return []
+        return sorted(n.removesuffix(".parquet") for n in names if n.endswith(".parquet")
+                      and not n.startswith("."))
+
+    def load(self, region: str, start: str | None = None, end: str | None = None) -> pd.DataFrame:
+        """All snapshots for ``region`` (optionally within a date range) as one long frame."""
+        if not self.enabled:
+            raise HistoryUnavailable("the holdings history needs pyarrow "
+                                     "(pip install sp500-rebalance[history])")
+        if not self.dates(region):
+            return pd.DataFrame(columns=["date", "ticker", "weight"])
+        filters = []
+        if start:
+            filters.append(("date", ">=", pd.Timestamp(start)))
+        if end:
+            filters.append(("date", "<=", pd.Timestamp(end)))
+        # One dataset scan over the directory; dot-prefixed temp files are skipped
+        return pd.read_parquet(
+            os.path.join(self.root, region),
+            columns=["date", "ticker", "weight"],
+            filters=filters or None,
+        )
+
+
+def weight_matrix(
+    snapshots: pd.DataFrame,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pivot a long ``date, ticker, weight`` frame into a dense dates x tickers
+    array with rows normalised to 1. Returns ``(dates, tickers, weights)``.
+
+    Built from factorised codes with one scatter-add rather than a pivot
+    table, so duplicate rows within a snapshot sum (as in _blend) at no
+    extra cost.
+    """
+    d_codes, dates = pd.factorize(snapshots["date"], sort=True)
+    t_codes, tickers = pd.factorize(snapshots["ticker"], sort=True)
+    weights = np.zeros((len(dates), len(tickers)))
+    np.add.at(weights, (d_codes, t_codes), snapshots["weight"].to_numpy(dtype=float))
+    totals = weights.sum(axis=1, keepdims=True)
+    np.divide(weights, totals, out=weights, where=totals > 0)
+    return np.asarray(dates), np.asarray(tickers), weights
+
+
+@dataclass
+class Panel:
+    dates: np.ndarray             # datetime64, ascending
+    tickers: np.ndarray
+    us: np.ndarray                # dates x tickers, rows sum to 1 (zeros if not loaded)
+    intl: np.ndarray
+
+
+def _align(
+    matrix: tuple[np.ndarray, np.ndarray, np.ndarray] | None,
+    dates: np.ndarray,
+    tickers: np.ndarray,
+) -> np.ndarray:
+    """A region's weights on the shared grid, carrying each snapshot forward."""
+    out = np.zeros((len(dates), len(tickers)))
+    if matrix is None:
+        return out
+    r_dates, r_tickers, weights = matrix
+    rows = np.searchsorted(r_dates, dates, side="right") - 1
+    cols = np.searchsorted(tickers, r_tickers)
+    out[:, cols] = weights[rows]
+    return out
+
+
+def build_panel(us: pd.DataFrame | None, intl: pd.DataFrame | None) -> Panel:
+    """
+    Put both regions on one date x ticker grid. Dates are the union of the
+    regions' snapshot dates, from the first date every loaded region has data.
+    """
+    if any(s is not None and s.empty for s in (us, intl)):
+        raise ValueError("no recorded history for a region the scenarios need")
+    us_m = weight_matrix(us) if us is not None else None
+    intl_m = weight_matrix(intl) if intl is not None else None
+    loaded = [m for m in (us_m, intl_m) if m is not None]
+    start = max(m[0][0] for m in loaded)
+    dates = np.unique(np.concatenate([m[0] for m in loaded]))
+    dates = dates[dates >= start]
+    tickers = np.unique(np.concatenate([m[1] for m in loaded]))
+    return Panel(
+        dates=dates,
+        tickers=tickers,
+        us=_align(us_m, dates, tickers),
+        intl=_align(intl_m, dates, tickers),
+    )
@@ -0,0 +1,34 @@
+"""
+Deferred imports for the heavy dependencies.
+
+pandas, numpy, requests and openpyxl together take most of a second to
+import. ``pd = lazy_import("pandas")`` binds a module whose real import
+only runs on its first attribute access (importlib's LazyLoader). So
+``--help``, argument errors and code paths that never touch a module don't
+pay for it: a cached run never imports requests or openpyxl. Annotations
+are never evaluated (``from __future__ import annotations``), so they don't
+count as a use.
+
+``python -m sp500.bench startup`` checks that this stays true.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import sys
+import types
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """``import name``, deferred until the module is first used."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,146 @@
+"""
+Price snapshot for sizing whole-share orders.
+
+Last prices come from Stooq's batch quote CSV, up to ``BATCH_SIZE`` symbols
+per request, with a few requests in flight at once. Several hundred tickers
+therefore cost a handful of round trips rather than one lookup each. The
+prices are kept in ``<cache dir>/prices/snapshot.json``, and a price younger
+than the TTL is reused without asking again.
+
+Only US listings are quoted this way. The international feeds carry local
+exchange codes that don't map to a quote symbol, so those names need a
+price from ``--prices`` (or a positions file); otherwise they stay dollar
+orders.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sp500.cache import _atomic_write
+from sp500.lazy import lazy_import
+from sp500.trades import _PRICE_COLUMNS, _TICKER_COLUMNS, _money, _pick
+
+pd = lazy_import("pandas")
+requests = lazy_import("requests")
+
+PRICE_URL = "https://stooq.com/q/l/"
+BATCH_SIZE = 50
+MAX_CONCURRENT = 4
+DEFAULT_PRICE_TTL_MINUTES = 30.0
+
+
+def _symbol(ticker: str, region: str | None) -> str | None:
+    """Stooq symbol for a US ticker (BRK.B -> BRK-B.US); None if it can't be quoted."""
+    if region != "US":
+        return None
+    return f"{ticker.replace('.', '-')}.US"
+
+
+def _fetch_batch(symbols: list[str], headers: dict[str, str]) -> dict[str, float]:
+    # Stooq wants literal '+' separators, so the query string is built by hand
+    url = f"{PRICE_URL}?s={'+'.join(symbols)}&f=sc&h&e=csv"
+    resp = requests.get(url, headers=headers, timeout=30)
+    resp.raise_for_status()
+    df = pd.read_csv(io.StringIO(resp.text))
+    df.columns = [c.strip().lower() for c in df.columns]
+    close = pd.to_numeric(df["close"], errors="coerce")  # "N/D" for unknown symbols
+    return {
+        str(sym).upper(): float(px)
+        for sym, px in zip(df["symbol"], close)
+        if pd.notna(px) and px > 0
+    }
+
+
+def read_prices(path: str) -> dict[str, float]:
+    """``ticker, price`` pairs from a CSV (symbol/last price/close headers also work)."""
+    raw = pd.read_csv(path, dtype=str)
+    columns = {c.strip().lower(): c for c in raw.columns}
+    ticker_col = _pick(columns, _TICKER_COLUMNS)
+    price_col = _pick(columns, _PRICE_COLUMNS + ("close",))
+    if ticker_col is None or price_col is None:
+        raise ValueError(f"{path}: need a ticker/symbol and a price column")
+    prices = _money(raw[price_col])
+    return {
+        str(t).strip().upper(): float(p)
+        for t, p in zip(raw[ticker_col], prices)
+        if pd.notna(p) and p > 0
+    }
+
+
+class PriceCache:
+    def __init__(
+        self,
+        root: str,
+        ttl_minutes: float = DEFAULT_PRICE_TTL_MINUTES,
+        offline: bool = False,
+        refresh: bool = False,
+    ) -> None:
+        self.path = os.path.join(root, "prices", "snapshot.json")
+        self.ttl = ttl_minutes * 60
+        self.offline = offline
+        self.refresh = refresh
+
+    def _read(self) -> dict[str, dict]:
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, snapshot: dict[str, dict]) -> None:
+        try:
+            _atomic_write(self.path, json.dumps(snapshot, indent=0).encode())
+        except OSError as e:
+            print(f"[warn] could not cache prices: {e}", file=sys.stderr)
+
+    def get(
+        self, tickers: list[str], regions: list[str | None], headers: dict[str, str]
+    ) -> dict[str, float]:
+        """Prices for whichever of ``tickers`` can be priced; fetches only stale ones."""
+        snapshot = self._read()
+        now = time.time()
+        prices: dict[str, float] = {}
+        to_fetch: dict[str, str] = {}
+        for ticker, region in zip(tickers, regions):
+            entry = snapshot.get(ticker)
+            fresh = entry is not None and not self.refresh and now - entry["at"] < self.ttl
+            if entry is not None and (fresh or self.offline):
+                prices[ticker] = entry["price"]
+                continue
+            symbol = _symbol(ticker, region)
+            if symbol is not None:
+                to_fetch[symbol] = ticker
+        if not to_fetch or self.offline:
+            return prices
+
+        symbols = list(to_fetch)
+        batches = [symbols[i:i + BATCH_SIZE] for i in range(0, len(symbols), BATCH_SIZE)]
+        fetched: dict[str, float] = {}
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT) as pool:
+            futures = [pool.submit(_fetch_batch, batch, headers) for batch in batches]
+            for fut in futures:
+                try:
+                    fetched.update(fut.result())
+                except (requests.RequestException, ValueError, KeyError) as e:
+                    print(f"[warn] price batch failed: {e}", file=sys.stderr)
+
+        stale = []
+        for symbol, ticker in to_fetch.items():
+            if symbol in fetched:
+                prices[ticker] = fetched[symbol]
+                snapshot[ticker] = {"price": fetched[symbol], "at": now}
+            elif ticker in snapshot:
+                prices[ticker] = snapshot[ticker]["price"]
+                stale.append(ticker)
+        if stale:
+            print(f"[warn] no fresh price for {len(stale)} ticker(s); using cached ones",
+                  file=sys.stderr)
+        if fetched:
+            self._save(snapshot)
+        return prices
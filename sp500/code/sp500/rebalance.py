@@ -11,18 +11,45 @@ Usage:
     python -m sp500.rebalance --amount 100000 --max-stocks 50
     python -m sp500.rebalance --amount 100000 --us-weight 0.7
     python -m sp500.rebalance --amount 100000 --us-only
+    python -m sp500.rebalance --amount 100000 --max-stocks 100 --optimize
     python -m sp500.rebalance --amount 100000 --exclude TSLA,MSFT --csv plan.csv
+    python -m sp500.rebalance --amount 100000 --offline
+    python -m sp500.rebalance --amount 5000 --positions positions.csv --baskets
+    python -m sp500.rebalance --amount 100000 --whole-shares --basket-csv-prefix basket
+    python -m sp500.rebalance --amount 100000 --grid-max-stocks 50,100,200 \
+        --grid-us-weight 0.6,0.7,0.8 --grid-exclude TSLA --grid-exclude none
 """
 
 from __future__ import annotations
 
 import argparse
+import dataclasses
 import io
+import json
 import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
 from dataclasses import dataclass
 
-import pandas as pd
-import requests
+from sp500.blend import _blend_codes, _exclusions, _frame, _heaviest_first, _top_n
+from sp500.cache import DEFAULT_TTL_HOURS, HoldingsCache
+from sp500.history import HistoryStore, Panel, build_panel
+from sp500.lazy import lazy_import
+from sp500.optimize import build_risk_model, min_tracking_error
+from sp500.prices import DEFAULT_PRICE_TTL_MINUTES, PriceCache, read_prices
+from sp500.scenarios import grid_list, print_grid, run_grid
+from sp500.trades import (
+    DEFAULT_DRIFT_BAND,
+    DEFAULT_MIN_ORDER,
+    print_trades,
+    read_positions,
+    trade_deltas,
+    whole_share_orders,
+)
+
+np = lazy_import("numpy")
+openpyxl = lazy_import("openpyxl")
+pd = lazy_import("pandas")
 
 # ---------------------------------------------------------------------------
 # Defaults
@@ -48,27 +75,85 @@ UA = {"User-Agent": "Mozilla/5.0 (compatible; sp500-rebalance/2.0)"}
 
 FIDELITY_BASKET_SIZE = 50
 
+# Bump when a parser changes so cached parsed frames are not reused
+PARSER_VERSION = 3
+
+
+_cache = HoldingsCache()
+_history = HistoryStore(_cache.root)
+
+
+def configure_cache(cache: HoldingsCache) -> None:
+    global _cache, _history
+    _cache = cache
+    _history = HistoryStore(cache.root)
+
 
 # ---------------------------------------------------------------------------
 # Data sources
 # ---------------------------------------------------------------------------
 
+def _load(source: str, url: str, parse) -> pd.DataFrame:
+    """Download ``url`` through the holdings cache and parse it once per body."""
+    content, digest = _cache.fetch(source, url, UA)
+    df = _cache.frame(digest, f"{source}-v{PARSER_VERSION}", lambda: parse(content))
+    entry = _cache.latest(source)
+    if entry is not None and entry.blob == digest:
+        df.attrs.update(source=source, as_of=entry.as_of)
+    return df
+
+
+def _record(df: pd.DataFrame) -> None:
+    """
+    Add the snapshot a region was actually built from to the history.
+
+    Only a body downloaded by this run is new; cache hits, revalidations and
+    ``--offline`` runs leave the history (and pyarrow) alone.
+    """
+    if "as_of" in df.attrs and df.attrs["source"] in _cache.downloaded:
+        _history.record(df, df.attrs["source"], df.attrs["as_of"])
+
+
 def fetch_spy() -> pd.DataFrame:
     """SSGA SPDR S&P 500 ETF (SPY) holdings file."""
     url = (
         "https://www.ssga.com/us/en/intermediary/library-content/"
         "products/fund-data/etfs/us/holdings-daily-us-en-spy.xlsx"
     )
-    resp = requests.get(url, headers=UA, timeout=30)
-    resp.raise_for_status()
+    return _load("spy", url, _parse_spy)
+
+
+def _read_spy_rows(content: bytes) -> pd.DataFrame:
+    """
+    Ticker/name/weight/sector columns of the SPY workbook in one streaming pass.
+
+    The holdings table sits below a few lines of fund metadata; its header
+    is the first row with a "Ticker" cell. Rows are read with openpyxl in
+    read-only mode, so the sheet is never materialised as cells or parsed
+    twice.
+    """
+    wb = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        for row in rows:
+            labels = [str(c).strip() if c is not None else "" for c in row]
+            if "Ticker" in labels:
+                break
+        else:
+            raise ValueError("SPY workbook has no 'Ticker' header row")
+        cols = [labels.index(c) for c in ("Ticker", "Name", "Weight")]
+        cols.append(labels.index("Sector") if "Sector" in labels else len(labels))
+        data = [
+            [row[i] if i < len(row) else None for i in cols]
+            for row in rows
+        ]
+    finally:
+        wb.close()
+    return pd.DataFrame(data, columns=["ticker", "name", "weight", "sector"])
 
-    raw = pd.read_excel(io.BytesIO(resp.content), header=None)
-    header_row = raw.index[raw.iloc[:, 0].astype(str).str.strip() == "Ticker"][0]
-    df = pd.read_excel(io.BytesIO(resp.content), skiprows=header_row + 1)
-    df.columns = [c.strip() for c in df.columns]
 
-    df = df.rename(columns={"Ticker": "ticker", "Name": "name", "Weight": "weight"})
-    df = df[["ticker", "name", "weight"]].dropna(subset=["ticker"])
+def _parse_spy(content: bytes) -> pd.DataFrame:
+    df = _read_spy_rows(content).dropna(subset=["ticker"])
     df["ticker"] = df["ticker"].astype(str).str.strip().str.upper()
     df["weight"] = pd.to_numeric(df["weight"], errors="coerce") / 100.0
     df = df.dropna(subset=["weight"])
@@ -79,10 +164,11 @@ def fetch_spy() -> pd.DataFrame:
 
 def fetch_slickcharts() -> pd.DataFrame:
     """Fallback for SPY: slickcharts.com index weights."""
-    url = "https://www.slickcharts.com/sp500"
-    resp = requests.get(url, headers=UA, timeout=30)
-    resp.raise_for_status()
-    tables = pd.read_html(io.StringIO(resp.text))
+    return _load("slickcharts", "https://www.slickcharts.com/sp500", _parse_slickcharts)
+
+
+def _parse_slickcharts(content: bytes) -> pd.DataFrame:
+    tables = pd.read_html(io.StringIO(content.decode("utf-8", errors="replace")))
     t = tables[0].rename(
         columns={"Symbol": "ticker", "Company": "name", "Weight": "weight"}
     )
@@ -91,7 +177,8 @@ def fetch_slickcharts() -> pd.DataFrame:
         t["weight"].astype(str).str.replace("%", "", regex=False).astype(float) / 100.0
     )
     t["region"] = "US"
-    return t[["ticker", "name", "weight", "region"]].reset_index(drop=True)
+    t["sector"] = None  # not published; the optimiser treats it as its own sector
+    return t[["ticker", "name", "weight", "sector", "region"]].reset_index(drop=True)
 
 
 def fetch_vea() -> pd.DataFrame:
@@ -103,9 +190,11 @@ def fetch_vea() -> pd.DataFrame:
         "https://api.vanguard.com/rs/ire/01/ind/fund/0936/"
         "portfolio-holding/stock.json"
     )
-    resp = requests.get(url, headers=UA, timeout=30)
-    resp.raise_for_status()
-    payload = resp.json()
+    return _load("vea", url, _parse_vea)
+
+
+def _parse_vea(content: bytes) -> pd.DataFrame:
+    payload = json.loads(content)
     rows = (
         payload.get("fund", {})
         .get("entity", [{}])[0]
@@ -123,9 +212,12 @@ def fetch_vea() -> pd.DataFrame:
             "shortName": "name",
             "longName": "name",
             "percentWeight": "weight",
+            "sectorName": "sector",
         }
     )
-    df = df[[c for c in ["ticker", "name", "weight"] if c in df.columns]]
+    if "sector" not in df.columns:
+        df["sector"] = None
+    df = df[[c for c in ["ticker", "name", "weight", "sector"] if c in df.columns]]
     df = df.dropna(subset=["ticker", "weight"])
     df["ticker"] = df["ticker"].astype(str).str.strip().str.upper()
     df["weight"] = pd.to_numeric(df["weight"], errors="coerce") / 100.0
@@ -147,9 +239,11 @@ def fetch_iefa() -> pd.DataFrame:
         "ishares-core-msci-eafe-etf/1467271812596.ajax"
         "?fileType=csv&fileName=IEFA_holdings&dataType=fund"
     )
-    resp = requests.get(url, headers=UA, timeout=30)
-    resp.raise_for_status()
-    text = resp.content.decode("utf-8", errors="replace")
+    return _load("iefa", url, _parse_iefa)
+
+
+def _parse_iefa(content: bytes) -> pd.DataFrame:
+    text = content.decode("utf-8", errors="replace")
     lines = text.splitlines()
     header_idx = next(
         i for i, ln in enumerate(lines) if ln.lstrip().startswith("Ticker,")
@@ -161,9 +255,12 @@ def fetch_iefa() -> pd.DataFrame:
             "Ticker": "ticker",
             "Name": "name",
             "Weight (%)": "weight",
+            "Sector": "sector",
         }
     )
-    df = df[["ticker", "name", "weight"]].dropna(subset=["ticker"])
+    if "sector" not in df.columns:
+        df["sector"] = None
+    df = df[["ticker", "name", "weight", "sector"]].dropna(subset=["ticker"])
     df["ticker"] = df["ticker"].astype(str).str.strip().str.upper()
     df["weight"] = pd.to_numeric(df["weight"], errors="coerce") / 100.0
     df = df.dropna(subset=["weight"])
@@ -173,32 +270,114 @@ def fetch_iefa() -> pd.DataFrame:
     return df.reset_index(drop=True)
 
 
-def _try_sources(sources: list[tuple], min_rows: int) -> tuple[pd.DataFrame, str]:
-    for fn, label in sources:
+def _background(fn, *args) -> Future:
+    """
+    Run ``fn`` in a daemon thread. Unlike a ThreadPoolExecutor worker, an
+    abandoned download (the loser of a hedge) can't hold up interpreter exit
+    while it waits out its timeout.
+    """
+    fut: Future = Future()
+
+    def run() -> None:
+        if not fut.set_running_or_notify_cancel():
+            return
         try:
-            df = fn()
-            if len(df) >= min_rows:
-                return df, label
+            fut.set_result(fn(*args))
+        except BaseException as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return fut
+
+
+def _usable(fut: Future, label: str, min_rows: int) -> pd.DataFrame | None:
+    try:
+        df = fut.result()
+    except Exception as e:
+        print(f"[warn] {label} failed: {e}", file=sys.stderr)
+        return None
+    if len(df) < min_rows:
+        print(
+            f"[warn] {label} returned only {len(df)} rows, trying next source",
+            file=sys.stderr,
+        )
+        return None
+    return df
+
+
+def _try_sources(
+    sources: list[tuple], min_rows: int, hedge_after: float | None = None
+) -> tuple[pd.DataFrame, str]:
+    """
+    First usable result from ``sources`` in order of preference.
+
+    Without ``hedge_after`` each source is tried only once the previous one
+    has failed. With it, the next source is also started whenever the
+    current ones have been running for ``hedge_after`` seconds, and whichever
+    usable result arrives first wins; a failure starts the next one at once.
+    """
+    remaining = list(sources)
+    pending: dict[Future, tuple[int, str]] = {}
+
+    def launch() -> None:
+        fn, label = remaining.pop(0)
+        pending[_background(fn)] = (len(sources) - len(remaining), label)
+
+    launch()
+    while pending:
+        timeout = hedge_after if remaining else None
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
             print(
-                f"[warn] {label} returned only {len(df)} rows, trying next source",
+                f"[info] no answer after {hedge_after:g}s, also trying "
+                f"{remaining[0][1]}",
                 file=sys.stderr,
             )
-        except Exception as e:
-            print(f"[warn] {label} failed: {e}", file=sys.stderr)
+            launch()
+            continue
+        # Prefer the earlier source when several finish together
+        for fut in sorted(done, key=lambda f: pending[f][0]):
+            _rank, label = pending.pop(fut)
+            df = _usable(fut, label, min_rows)
+            if df is not None:
+                return df, label
+        if remaining and (hedge_after is None or not pending):
+            launch()
     raise RuntimeError("No data source succeeded.")
 
 
-def load_us() -> tuple[pd.DataFrame, str]:
-    return _try_sources(
+def load_us(hedge_after: float | None = None) -> tuple[pd.DataFrame, str]:
+    df, label = _try_sources(
         [(fetch_spy, "SSGA SPY holdings"), (fetch_slickcharts, "slickcharts.com")],
         min_rows=400,
+        hedge_after=hedge_after,
     )
+    _record(df)
+    return df, label
 
 
-def load_intl() -> tuple[pd.DataFrame, str]:
-    return _try_sources(
+def load_intl(hedge_after: float | None = None) -> tuple[pd.DataFrame, str]:
+    df, label = _try_sources(
         [(fetch_vea, "Vanguard VEA holdings"), (fetch_iefa, "iShares IEFA holdings")],
         min_rows=200,
+        hedge_after=hedge_after,
+    )
+    _record(df)
+    return df, label
+
+
+def load_regions(
+    us_weights: list[float], hedge_after: float | None = None
+) -> tuple[tuple[pd.DataFrame, str] | None, tuple[pd.DataFrame, str] | None]:
+    """Load the regions any of ``us_weights`` needs concurrently; ``None`` for a skipped one."""
+    # Finish the deferred pandas import here rather than racing on it in the
+    # workers (LazyLoader is only thread-safe from Python 3.12)
+    pd.DataFrame
+    us = _background(load_us, hedge_after) if max(us_weights) > 0 else None
+    intl = _background(load_intl, hedge_after) if min(us_weights) < 1 else None
+    return (
+        us.result() if us else None,
+        intl.result() if intl else None,
     )
 
 
@@ -208,7 +387,7 @@ def load_intl() -> tuple[pd.DataFrame, str]:
 
 @dataclass
 class Plan:
-    df: pd.DataFrame              # final allocation table (top-N)
+    df: pd.DataFrame              # final allocation table (top-N or optimised)
     us_source: str
     intl_source: str | None
     us_weight: float
@@ -221,6 +400,10 @@ class Plan:
     us_coverage: float            # fraction of US index captured by final picks
     intl_coverage: float          # fraction of intl index captured by final picks
     total_amount: float
+    method: str = "top-n"
+    tracking_error: float | None = None        # ex-ante, annualised (min-te only)
+    top_n_tracking_error: float | None = None  # what top-N would have had, for comparison
+    risk_model: str | None = None
 
 
 def _blend(
@@ -231,28 +414,11 @@ def _blend(
     """
     Combine the two universes. Each fund's weights already sum to ~1
     within its own region; we scale by us_weight / (1 - us_weight) so
-    blended weights sum to ~1 across both.
+    blended weights sum to ~1 across both. A ticker in both feeds
+    (cross-listings) gets the sum of its weights.
     """
-    parts = []
-    if us is not None and us_weight > 0:
-        u = us.copy()
-        u["weight"] = u["weight"] * us_weight
-        parts.append(u)
-    if intl is not None and us_weight < 1:
-        i = intl.copy()
-        i["weight"] = i["weight"] * (1 - us_weight)
-        parts.append(i)
-    if not parts:
-        raise ValueError("No regions selected.")
-
-    blended = pd.concat(parts, ignore_index=True)
-    # In the unlikely case the same ticker appears in both feeds
-    # (cross-listings), sum the weights.
-    blended = (
-        blended.groupby("ticker", as_index=False)
-        .agg({"name": "first", "weight": "sum", "region": "first"})
-    )
-    return blended.sort_values("weight", ascending=False).reset_index(drop=True)
+    blended = _blend_codes(us, intl, us_weight)
+    return _frame(blended, _heaviest_first(blended.weight, np.flatnonzero(blended.present)))
 
 
 def rebalance(
@@ -264,44 +430,63 @@ def rebalance(
     amount: float,
     max_stocks: int,
     us_weight: float,
+    method: str = "top-n",
+    history: Panel | None = None,
 ) -> Plan:
-    blended = _blend(us, intl, us_weight)
+    """
+    ``method`` "top-n" keeps the heaviest ``max_stocks`` names and scales them
+    up proportionally. "min-te" picks and weights up to ``max_stocks`` names to
+    minimise tracking error against the blended index (see sp500.optimize),
+    using ``history`` for the risk model when given.
 
-    exclude_up = {t.strip().upper() for t in exclude if t.strip()}
-    in_universe = set(blended["ticker"])
-    excluded_found = sorted(t for t in exclude_up if t in in_universe)
-    excluded_missing = sorted(t for t in exclude_up if t not in in_universe)
+    Works on ticker codes and arrays throughout; only the final picks become
+    a DataFrame.
+    """
+    if method not in ("top-n", "min-te"):
+        raise ValueError(f"Unknown method {method!r}")
+    blended = _blend_codes(us, intl, us_weight)
 
-    excl_mask = blended["ticker"].isin(excluded_found)
-    excluded_weight = float(blended.loc[excl_mask, "weight"].sum())
+    excl_mask, excluded_found, excluded_missing = _exclusions(blended, exclude)
+    excluded_weight = float(blended.weight[excl_mask].sum())
 
-    kept = blended.loc[~excl_mask].copy()
-    if kept.empty:
+    kept = np.flatnonzero(blended.present & ~excl_mask)
+    if len(kept) == 0:
         raise ValueError("All weights excluded - nothing to allocate.")
 
     # Cap to the top N by blended weight
     universe_size = len(kept)
-    picked = kept.head(max_stocks).copy()
+    picks = _top_n(blended.weight, kept, max_stocks)
+    target = blended.weight[picks]
+
+    optimised = {}
+    if method == "min-te":
+        order = _heaviest_first(blended.weight, np.flatnonzero(blended.present))
+        universe = _frame(blended, order)
+        model = build_risk_model(universe, history)
+        bench = blended.weight[order] / blended.weight[order].sum()
+        top_n = np.zeros(len(blended.tickers))
+        top_n[picks] = target / target.sum()
+        weights = min_tracking_error(model, bench, ~excl_mask[order], max_stocks)
+        held = weights > 0
+        optimised = dict(
+            tracking_error=model.tracking_error(weights, bench),
+            top_n_tracking_error=model.tracking_error(top_n[order], bench),
+            risk_model=model.source,
+        )
+        picks, target = order[held], weights[held]
+        ranked = np.lexsort((picks, -target))
+        picks, target = picks[ranked], target[ranked]
 
     # Coverage diagnostics: how much of each underlying index do the
     # picks cover? Compute against the original (pre-blend) weights.
-    def _coverage(orig: pd.DataFrame | None) -> float:
-        if orig is None or orig.empty:
-            return 0.0
-        chosen = orig[orig["ticker"].isin(picked["ticker"])]
-        return float(chosen["weight"].sum())
-
-    us_coverage = _coverage(us)
-    intl_coverage = _coverage(intl)
+    us_coverage = float(blended.us_weight[picks].sum()) if blended.us_weight is not None else 0.0
+    intl_coverage = (
+        float(blended.intl_weight[picks].sum()) if blended.intl_weight is not None else 0.0
+    )
 
     # Renormalize so the chosen names sum to 1
-    total_w = picked["weight"].sum()
-    picked["rebalanced_weight"] = picked["weight"] / total_w
-    picked["dollars"] = picked["rebalanced_weight"] * amount
-
-    picked = picked.sort_values("rebalanced_weight", ascending=False).reset_index(
-        drop=True
-    )
+    rebalanced = target / target.sum()
+    picked = _frame(blended, picks, rebalanced_weight=rebalanced, dollars=rebalanced * amount)
 
     return Plan(
         df=picked,
@@ -317,6 +502,8 @@ def rebalance(
         us_coverage=us_coverage,
         intl_coverage=intl_coverage,
         total_amount=amount,
+        method=method,
+        **optimised,
     )
 
 
@@ -373,13 +560,21 @@ def print_report(plan: Plan, top: int | None) -> None:
     print(
         f"Index coverage by final picks: "
         f"S&P 500 {plan.us_coverage * 100:.1f}%, "
-        f"FTSE Dev ex-US {plan.intl_coverage * 100:.1f}%\n"
+        f"FTSE Dev ex-US {plan.intl_coverage * 100:.1f}%"
     )
+    if plan.tracking_error is not None:
+        print(
+            f"Ex-ante tracking error vs blended index: {plan.tracking_error * 100:.2f}% "
+            f"(top-{plan.max_stocks} by weight: {plan.top_n_tracking_error * 100:.2f}%; "
+            f"risk model: {plan.risk_model})"
+        )
+    print()
 
     view = plan.df.copy()
     view["weight_%"] = view["weight"] * 100
     view["rebalanced_%"] = view["rebalanced_weight"] * 100
-    view = view[["ticker", "name", "region", "weight_%", "rebalanced_%", "dollars"]]
+    view = view[["ticker", "name", "region", "weight_%", "rebalanced_%"]
+                + _share_columns(view) + ["dollars"]]
 
     if top:
         print(f"Top {top} of {len(view)} allocations:")
@@ -394,18 +589,31 @@ def print_report(plan: Plan, top: int | None) -> None:
                 formatters={
                     "weight_%": "{:,.3f}".format,
                     "rebalanced_%": "{:,.3f}".format,
+                    "shares": "{:,.0f}".format,
+                    "price": "${:,.2f}".format,
                     "dollars": "${:.2f}".format,
                 },
             )
         )
 
     total_dollars = view["dollars"].sum()
+    if "shares" in view.columns:
+        print(
+            f"\nTotal in whole-share orders: ${total_dollars:,.2f} "
+            f"(cash left: ${plan.total_amount - total_dollars:,.2f})"
+        )
+        return
     print(
         f"\nTotal allocated: ${total_dollars:.2f} "
         f"(rounding diff: ${plan.total_amount - total_dollars:.4f})"
     )
 
 
+def _share_columns(df: pd.DataFrame) -> list[str]:
+    """``shares``/``price`` once a plan has been sized into whole-share orders."""
+    return ["shares", "price"] if "shares" in df.columns else []
+
+
 def print_baskets(plan: Plan, basket_size: int = FIDELITY_BASKET_SIZE) -> None:
     df = assign_baskets(plan, basket_size)
     n_baskets = int(df["basket"].max())
@@ -433,7 +641,7 @@ def print_baskets(plan: Plan, basket_size: int = FIDELITY_BASKET_SIZE) -> None:
 
     for b in range(1, n_baskets + 1):
         rows = df[df["basket"] == b][
-            ["ticker", "name", "basket_weight_pct", "dollars"]
+            ["ticker", "name", "basket_weight_pct"] + _share_columns(df) + ["dollars"]
         ]
         print(f"\n--- Basket {b} ({len(rows)} tickers) ---")
         with pd.option_context("display.max_rows", None, "display.width", 140):
@@ -442,6 +650,8 @@ def print_baskets(plan: Plan, basket_size: int = FIDELITY_BASKET_SIZE) -> None:
                     index=False,
                     formatters={
                         "basket_weight_pct": "{:,.3f}".format,
+                        "shares": "{:,.0f}".format,
+                        "price": "${:,.2f}".format,
                         "dollars": "${:,.2f}".format,
                     },
                 )
@@ -454,7 +664,7 @@ def write_basket_csvs(plan: Plan, prefix: str, basket_size: int = FIDELITY_BASKE
     written: list[str] = []
     for b in range(1, n_baskets + 1):
         rows = df[df["basket"] == b][
-            ["ticker", "name", "basket_weight_pct", "dollars"]
+            ["ticker", "name", "basket_weight_pct"] + _share_columns(df) + ["dollars"]
         ]
         path = f"{prefix}_{b:02d}.csv"
         rows.to_csv(path, index=False)
@@ -466,12 +676,81 @@ def write_basket_csvs(plan: Plan, prefix: str, basket_size: int = FIDELITY_BASKE
 # CLI
 # ---------------------------------------------------------------------------
 
+def _price_snapshot(
+    tickers: list[str],
+    regions: list[str | None],
+    args: argparse.Namespace,
+    overrides: dict[str, float],
+) -> dict[str, float]:
+    """
+    Prices for ``tickers``: the cached/batched snapshot (with --whole-shares),
+    then the --prices ``overrides`` on top.
+    """
+    prices: dict[str, float] = {}
+    if args.whole_shares:
+        cache = PriceCache(_cache.root, args.price_ttl, offline=args.offline,
+                           refresh=args.refresh)
+        prices = cache.get(tickers, regions, UA)
+    prices.update((t, overrides[t]) for t in tickers if t in overrides)
+    return prices
+
+
+def _risk_history(us_weight: float) -> Panel | None:
+    """Recorded snapshots for the optimiser's risk model, if there are any."""
+    if not _history.enabled:
+        return None
+    us = _history.load("us") if us_weight > 0 else None
+    intl = _history.load("intl") if us_weight < 1 else None
+    try:
+        return build_panel(us, intl)
+    except ValueError:
+        return None
+
+
+def run_grid_mode(
+    ap: argparse.ArgumentParser, args: argparse.Namespace, us_weight: float, exclude: list[str]
+) -> None:
+    if (args.baskets or args.basket_csv_prefix or args.positions or args.optimize
+            or args.whole_shares):
+        ap.error("--baskets, --basket-csv-prefix, --positions, --optimize and "
+                 "--whole-shares apply to a single plan, not a grid")
+    us_weights = grid_list(ap, "--grid-us-weight", args.grid_us_weight, float, us_weight)
+    max_stocks = grid_list(ap, "--grid-max-stocks", args.grid_max_stocks, int, args.max_stocks)
+    if not all(0.0 <= w <= 1.0 for w in us_weights):
+        ap.error("--grid-us-weight values must be between 0 and 1")
+    if not all(n > 0 for n in max_stocks):
+        ap.error("--grid-max-stocks values must be > 0")
+    excludes = [
+        [] if spec.strip().lower() in ("", "none") else spec.split(",")
+        for spec in args.grid_exclude or [",".join(exclude)]
+    ]
+
+    us, intl = load_regions(us_weights, args.hedge_after)
+    us_df, us_src = us or (None, None)
+    intl_df, intl_src = intl or (None, None)
+    print(f"US source:   {us_src or '(none)'}")
+    print(f"Intl source: {intl_src or '(none)'}")
+    summary, allocations = run_grid(
+        us_df, intl_df, us_weights, max_stocks, excludes, args.amount,
+        with_allocations=bool(args.grid_allocations_csv),
+    )
+    print_grid(summary)
+
+    if args.csv:
+        summary.to_csv(args.csv, index=False)
+        print(f"\nWrote {args.csv}")
+    if args.grid_allocations_csv:
+        allocations.to_csv(args.grid_allocations_csv, index=False)
+        print(f"\nWrote {args.grid_allocations_csv}")
+
+
 def main() -> None:
     ap = argparse.ArgumentParser(
         description="Simplified blended SP500 + FTSE Developed rebalancer."
     )
     ap.add_argument("--amount", type=float, required=True,
-                    help="Dollar amount to invest (e.g. 100000)")
+                    help="Dollar amount to invest (e.g. 100000); with --positions, "
+                         "new cash on top of the current holdings (may be 0)")
     ap.add_argument("--exclude", type=str, default=",".join(DEFAULT_EXCLUDE),
                     help=f"Comma-separated tickers to exclude "
                          f"(default: {','.join(DEFAULT_EXCLUDE)})")
@@ -497,6 +776,70 @@ def main() -> None:
                     help="Write one CSV per basket as PREFIX_01.csv, PREFIX_02.csv, ...")
     ap.add_argument("--basket-size", type=int, default=FIDELITY_BASKET_SIZE,
                     help=f"Tickers per basket (default: {FIDELITY_BASKET_SIZE})")
+    ap.add_argument("--cache-dir", type=str, default=None,
+                    help="Holdings cache directory (default: $SP500_CACHE_DIR or "
+                         "~/.cache/sp500-rebalance)")
+    ap.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL_HOURS,
+                    help=f"Hours a cached download is used without revalidating "
+                         f"(default: {DEFAULT_TTL_HOURS:g})")
+    ap.add_argument("--hedge-after", type=float, default=None,
+                    help="Also start the fallback source if the primary hasn't "
+                         "answered within this many seconds; first usable "
+                         "result wins (default: fallback only after a failure)")
+    ap.add_argument("--optimize", action="store_true",
+                    help="Choose and weight up to --max-stocks names to minimise "
+                         "tracking error against the blended index, instead of "
+                         "taking the top N by weight")
+    delta = ap.add_argument_group(
+        "trade deltas",
+        "Rebalance an existing portfolio: only names outside the drift band are "
+        "traded, in whole shares, and baskets hold just the buys.",
+    )
+    delta.add_argument("--positions", type=str, default=None, metavar="CSV",
+                       help="Current holdings (ticker/symbol, shares/quantity, and "
+                            "price or market value columns)")
+    delta.add_argument("--drift-band", type=float, default=DEFAULT_DRIFT_BAND,
+                       help=f"Skip names within this fraction of their target value "
+                            f"(default: {DEFAULT_DRIFT_BAND:g})")
+    delta.add_argument("--min-order", type=float, default=DEFAULT_MIN_ORDER,
+                       help=f"Drop orders under this many dollars "
+                            f"(default: {DEFAULT_MIN_ORDER:g})")
+    ap.add_argument("--whole-shares", action="store_true",
+                    help="Size the plan into whole-share orders from a price snapshot "
+                         "(with --positions: fill in prices the positions file lacks)")
+    ap.add_argument("--prices", type=str, default=None, metavar="CSV",
+                    help="ticker,price overrides, e.g. for international names the "
+                         "quote feed can't price")
+    ap.add_argument("--price-ttl", type=float, default=DEFAULT_PRICE_TTL_MINUTES,
+                    help=f"Minutes a cached price is used without refetching "
+                         f"(default: {DEFAULT_PRICE_TTL_MINUTES:g})")
+    ap.add_argument("--lot-size", type=int, default=1,
+                    help="Trade shares in multiples of this, with --whole-shares or "
+                         "--positions (default: 1)")
+    delta.add_argument("--trades-csv", type=str, default=None,
+                       help="Write the buy/sell orders to this CSV path")
+    grid = ap.add_argument_group(
+        "scenario grid",
+        "Compare every combination of the listed values in one table instead of "
+        "printing a single plan. Holdings are loaded once; an axis left out "
+        "uses the matching single-plan option.",
+    )
+    grid.add_argument("--grid-us-weight", type=str, default=None, metavar="LIST",
+                      help="Comma-separated US weights, e.g. 0.6,0.7,0.8")
+    grid.add_argument("--grid-max-stocks", type=str, default=None, metavar="LIST",
+                      help="Comma-separated holding caps, e.g. 50,100,200")
+    grid.add_argument("--grid-exclude", type=str, action="append", default=None,
+                      metavar="TICKERS",
+                      help="One exclude set (comma-separated, or 'none'); "
+                           "repeat for more sets")
+    grid.add_argument("--grid-allocations-csv", type=str, default=None,
+                      help="Write every scenario's holdings to this CSV path "
+                           "(--csv writes the comparison table)")
+    cache_mode = ap.add_mutually_exclusive_group()
+    cache_mode.add_argument("--offline", action="store_true",
+                            help="Run entirely from the cache; never touch the network")
+    cache_mode.add_argument("--refresh", action="store_true",
+                            help="Revalidate cached downloads even if within the TTL")
     args = ap.parse_args()
 
     if args.us_only:
@@ -509,28 +852,78 @@ def main() -> None:
         ap.error("--us-weight must be between 0 and 1")
     if args.max_stocks <= 0:
         ap.error("--max-stocks must be > 0")
-
-    us_df: pd.DataFrame | None = None
-    us_src: str | None = None
-    intl_df: pd.DataFrame | None = None
-    intl_src: str | None = None
-    if us_weight > 0:
-        us_df, us_src = load_us()
-    if us_weight < 1:
-        intl_df, intl_src = load_intl()
+    if args.drift_band < 0 or args.min_order < 0:
+        ap.error("--drift-band and --min-order must be >= 0")
+    if args.lot_size <= 0:
+        ap.error("--lot-size must be > 0")
+    configure_cache(HoldingsCache(
+        args.cache_dir, args.cache_ttl, offline=args.offline, refresh=args.refresh
+    ))
 
     exclude = [t for t in args.exclude.split(",") if t.strip()]
+    if args.grid_us_weight or args.grid_max_stocks or args.grid_exclude:
+        run_grid_mode(ap, args, us_weight, exclude)
+        return
+
+    positions = None
+    if args.positions:
+        try:
+            positions = read_positions(args.positions)
+        except (OSError, ValueError) as e:
+            ap.error(f"--positions: {e}")
+    overrides: dict[str, float] = {}
+    if args.prices:
+        try:
+            overrides = read_prices(args.prices)
+        except (OSError, ValueError) as e:
+            ap.error(f"--prices: {e}")
+
+    us, intl = load_regions([us_weight], args.hedge_after)
+    us_df, us_src = us or (None, None)
+    intl_df, intl_src = intl or (None, None)
+
+    amount = args.amount
+    if positions is not None:
+        # Price held names the file didn't before sizing the plan, so the plan
+        # and the trades see the same holdings. One still without a price is
+        # left out of both (trade_deltas leaves it alone).
+        unpriced = positions.loc[positions["price"].isna(), "ticker"]
+        if not unpriced.empty:
+            us_tickers = set(us_df["ticker"]) if us_df is not None else set()
+            regions = ["US" if t in us_tickers else None for t in unpriced]
+            held_prices = _price_snapshot(list(unpriced), regions, args, overrides)
+            positions["price"] = positions["price"].fillna(
+                positions["ticker"].map(held_prices)
+            )
+        amount += float((positions["shares"] * positions["price"]).sum())
+
     plan = rebalance(
         us=us_df,
         us_source=us_src,
         intl=intl_df,
         intl_source=intl_src,
         exclude=exclude,
-        amount=args.amount,
+        amount=amount,
         max_stocks=args.max_stocks,
         us_weight=us_weight,
+        method="min-te" if args.optimize else "top-n",
+        history=_risk_history(us_weight) if args.optimize else None,
     )
 
+    prices = {}
+    if args.whole_shares or overrides:
+        prices = _price_snapshot(list(plan.df["ticker"]), list(plan.df["region"]), args,
+                                 overrides)
+    if args.whole_shares and positions is None:
+        if not prices:
+            tickers = list(plan.df["ticker"])
+            print(f"error: --whole-shares: no price for any of the plan's {len(tickers)} "
+                  f"names ({', '.join(tickers[:10])}{' ...' if len(tickers) > 10 else ''}); "
+                  f"check the network or pass --prices", file=sys.stderr)
+            sys.exit(1)
+        orders, _cash = whole_share_orders(plan.df, prices, plan.total_amount, args.lot_size)
+        plan = dataclasses.replace(plan, df=orders)
+
     print_report(plan, args.top)
 
     if args.csv:
@@ -539,16 +932,41 @@ def main() -> None:
         out["rebalanced_weight_pct"] = out["rebalanced_weight"] * 100
         out = out[
             ["ticker", "name", "region", "weight_pct",
-             "rebalanced_weight_pct", "dollars"]
+             "rebalanced_weight_pct"] + _share_columns(out) + ["dollars"]
         ]
         out.to_csv(args.csv, index=False)
         print(f"\nWrote {args.csv}")
 
+    basket_plan = plan
+    if positions is not None:
+        if prices:
+            # Prices for names to buy that aren't held yet
+            new = sorted(set(plan.df["ticker"]).difference(positions["ticker"]) & set(prices))
+            positions = pd.concat([positions, pd.DataFrame(
+                {"ticker": new, "shares": 0.0, "price": [prices[t] for t in new]}
+            )], ignore_index=True)
+        trades = trade_deltas(
+            plan.df, positions, args.amount,
+            drift_band=args.drift_band, min_order=args.min_order, lot_size=args.lot_size,
+        )
+        print_trades(trades)
+        if args.trades_csv:
+            trades.orders.to_csv(args.trades_csv, index=False)
+            print(f"\nWrote {args.trades_csv}")
+        # Baskets only need to carry the buys
+        buys = trades.buys
+        basket_plan = dataclasses.replace(
+            plan, df=buys, total_amount=float(buys["dollars"].sum())
+        )
+        if buys.empty and (args.baskets or args.basket_csv_prefix):
+            print("\nNo buys - no baskets to write.")
+            return
+
     if args.baskets:
-        print_baskets(plan, args.basket_size)
+        print_baskets(basket_plan, args.basket_size)
 
     if args.basket_csv_prefix:
-        written = write_basket_csvs(plan, args.basket_csv_prefix, args.basket_size)
+        written = write_basket_csvs(basket_plan, args.basket_csv_prefix, args.basket_size)
         print("\nWrote basket CSVs:")
         for p in written:
             print(f"  {p}")
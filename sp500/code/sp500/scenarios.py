@@ -0,0 +1,124 @@
+"""
+Scenario grid: evaluate many rebalance() parameter combinations at once.
+
+The grid runs on the same code core as rebalance() (sp500.blend). For each
+US weight the universe is blended and sorted once. Each exclude set is a
+boolean mask over that shared order, and every --max-stocks cut is a
+prefix of it, so coverage and weight totals for all cuts come from one
+cumulative sum.
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from sp500.blend import _blend_codes, _exclusions, _frame, _heaviest_first
+from sp500.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+def grid_list(ap: argparse.ArgumentParser, flag: str, value: str | None, cast, default) -> list:
+    """Parse a comma-separated grid flag, de-duplicated in order; ``[default]`` if unset."""
+    if not value:
+        return [default]
+    try:
+        items = [cast(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        ap.error(f"{flag}: expected a comma-separated list, got {value!r}")
+    return list(dict.fromkeys(items))
+
+
+def exclude_label(exclude: list[str]) -> str:
+    return ",".join(exclude) if exclude else "(none)"
+
+
+def run_grid(
+    us: pd.DataFrame | None,
+    intl: pd.DataFrame | None,
+    us_weights: list[float],
+    max_stocks: list[int],
+    excludes: list[list[str]],
+    amount: float,
+    with_allocations: bool = False,
+) -> tuple[pd.DataFrame, pd.DataFrame | None]:
+    """
+    Evaluate every (us_weight, exclude set, max_stocks) combination.
+
+    Returns a summary table with one row per scenario and, when
+    ``with_allocations`` is set, a long table of each scenario's holdings
+    (the same numbers rebalance() would put in Plan.df).
+    """
+    rows: list[dict] = []
+    allocations: list[pd.DataFrame] = []
+
+    for a in us_weights:
+        blended = _blend_codes(us, intl, a)
+        w = blended.weight
+        # One ordering per us_weight; every exclude set and top-N cut reuses it
+        order = _heaviest_first(w, np.flatnonzero(blended.present))
+
+        for ex in excludes:
+            ex_mask, found, missing = _exclusions(blended, ex)
+            label = exclude_label(sorted(set(found) | set(missing)))
+            kept = order[~ex_mask[order]]
+            if len(kept) == 0:
+                raise ValueError(f"All weights excluded for {label} - nothing to allocate.")
+            cum_w = np.cumsum(w[kept])
+            cum_us = np.cumsum(blended.us_weight[kept]) if blended.us_weight is not None else None
+            cum_intl = (
+                np.cumsum(blended.intl_weight[kept]) if blended.intl_weight is not None else None
+            )
+
+            for n_max in max_stocks:
+                n = min(n_max, len(kept))
+                picks = kept[:n]
+                rebalanced = w[picks] / cum_w[n - 1]
+                scenario = len(rows) + 1
+                rows.append({
+                    "scenario": scenario,
+                    "us_weight": a,
+                    "max_stocks": n_max,
+                    "exclude": label,
+                    "holdings": n,
+                    "universe_size": len(kept),
+                    "excluded_found": len(found),
+                    "excluded_missing": len(missing),
+                    "excluded_weight_pct": float(w[ex_mask].sum()) * 100,
+                    # As in rebalance(): coverage of every loaded index
+                    "us_coverage_pct": float(cum_us[n - 1]) * 100 if cum_us is not None else 0.0,
+                    "intl_coverage_pct":
+                        float(cum_intl[n - 1]) * 100 if cum_intl is not None else 0.0,
+                    "largest": f"{blended.tickers[picks[0]]} {rebalanced[0] * 100:.2f}%",
+                    "min_dollars": float(rebalanced[-1] * amount),
+                })
+                if with_allocations:
+                    df = _frame(blended, picks, rebalanced_weight=rebalanced,
+                                dollars=rebalanced * amount)
+                    df.insert(0, "scenario", scenario)
+                    allocations.append(df)
+
+    summary = pd.DataFrame(rows)
+    alloc = pd.concat(allocations, ignore_index=True) if with_allocations else None
+    return summary, alloc
+
+
+def print_grid(summary: pd.DataFrame) -> None:
+    n = len(summary)
+    print(f"\nScenario grid: {n} scenario{'s' if n != 1 else ''}\n")
+    with pd.option_context("display.max_rows", None, "display.width", 200,
+                           "display.max_colwidth", 40):
+        print(
+            summary.to_string(
+                index=False,
+                formatters={
+                    "us_weight": "{:.2f}".format,
+                    "excluded_weight_pct": "{:,.2f}".format,
+                    "us_coverage_pct": "{:,.1f}".format,
+                    "intl_coverage_pct": "{:,.1f}".format,
+                    "min_dollars": "${:,.2f}".format,
+                },
+            )
+        )
+
@@ -0,0 +1,264 @@
+"""
+Trade-delta mode: turn a target plan into the orders that get an existing
+portfolio there.
+
+Rebuying the whole plan every time means one order per holding. Here the
+current positions are compared with the target, and orders are emitted only
+for names that drifted outside a tolerance band. Orders are sized in whole
+shares (or multiples of a lot size), and anything below a minimum order value
+is dropped. Held names that left the plan (newly excluded, or no longer in the
+top N) are sold outright.
+"""
+
+from __future__ import annotations
+
+import math
+import sys
+from dataclasses import dataclass
+
+from sp500.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+DEFAULT_DRIFT_BAND = 0.10    # leave a name alone within ±10% of its target
+DEFAULT_MIN_ORDER = 50.0     # dollars
+
+# Column names accepted in a positions CSV (lower-cased), e.g. a brokerage export
+_TICKER_COLUMNS = ("ticker", "symbol")
+_SHARES_COLUMNS = ("shares", "quantity", "qty")
+_PRICE_COLUMNS = ("price", "last price", "last_price", "current price")
+_VALUE_COLUMNS = ("market value", "market_value", "current value", "value")
+
+
+def _pick(columns: dict[str, str], names: tuple[str, ...]) -> str | None:
+    for name in names:
+        if name in columns:
+            return columns[name]
+    return None
+
+
+def _money(col: pd.Series) -> pd.Series:
+    cleaned = col.astype(str).str.replace(r"[$,+\s]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+
+def read_positions(path: str) -> pd.DataFrame:
+    """
+    Load current holdings as ``ticker, shares, price``.
+
+    Needs a ticker/symbol column and a shares/quantity column. The price comes
+    from a price column, or else from market value / shares. Rows with zero
+    shares can be included just to provide a price for a name you don't hold
+    yet. Cash and money-market lines, and footer text, are dropped.
+    """
+    raw = pd.read_csv(path, dtype=str, skip_blank_lines=True)
+    columns = {c.strip().lower(): c for c in raw.columns}
+    ticker_col = _pick(columns, _TICKER_COLUMNS)
+    shares_col = _pick(columns, _SHARES_COLUMNS)
+    if ticker_col is None or shares_col is None:
+        raise ValueError(f"{path}: need a ticker/symbol and a shares/quantity column")
+    price_col = _pick(columns, _PRICE_COLUMNS)
+    value_col = _pick(columns, _VALUE_COLUMNS)
+
+    df = pd.DataFrame({
+        "ticker": raw[ticker_col].astype(str).str.strip().str.upper().str.rstrip("*"),
+        "shares": _money(raw[shares_col]),
+    })
+    if price_col is not None:
+        df["price"] = _money(raw[price_col])
+    else:
+        df["price"] = float("nan")
+    if value_col is not None:
+        derived = _money(raw[value_col]) / df["shares"].where(df["shares"] != 0)
+        df["price"] = df["price"].fillna(derived)
+
+    df = df[df["ticker"].str.fullmatch(r"[A-Z0-9.\-]+") & df["shares"].notna()]
+    df = df[~df["ticker"].isin(["CASH", "USD", "SPAXX", "FDRXX", "CORE"])]
+    # A ticker can appear once per account; combine them
+    df = df.groupby("ticker", as_index=False).agg(shares=("shares", "sum"), price=("price", "first"))
+    return df.reset_index(drop=True)
+
+
+@dataclass
+class TradeList:
+    orders: pd.DataFrame          # one row per order, buys and sells
+    held_value: float             # market value of the positions file
+    cash_added: float             # new money on top of held_value
+    in_band: int                  # target names left alone (within the drift band)
+    too_small: int                # trades dropped for being under min_order
+    unpriced: list[str]           # target names with no price; bought in dollars
+
+    @property
+    def buys(self) -> pd.DataFrame:
+        return self.orders[self.orders["side"] == "BUY"].reset_index(drop=True)
+
+    @property
+    def sells(self) -> pd.DataFrame:
+        return self.orders[self.orders["side"] == "SELL"].reset_index(drop=True)
+
+
+def trade_deltas(
+    target: pd.DataFrame,
+    positions: pd.DataFrame,
+    cash_added: float,
+    drift_band: float = DEFAULT_DRIFT_BAND,
+    min_order: float = DEFAULT_MIN_ORDER,
+    lot_size: int = 1,
+) -> TradeList:
+    """
+    Orders that move ``positions`` to ``target`` (a Plan.df sized for the
+    positions' market value plus ``cash_added``).
+
+    A target name trades only when its current value is off by more than
+    ``drift_band`` of its target value. Share counts round toward zero to a
+    multiple of ``lot_size``, so buys never spend more than the plan says.
+    Names that are held but not in the target are sold in full, whatever
+    their size.
+    """
+    held = positions.assign(current=positions["shares"] * positions["price"])
+    merged = target[["ticker", "name", "dollars"]].merge(
+        held, on="ticker", how="outer", indicator="origin"
+    )
+    merged["dollars"] = merged["dollars"].fillna(0.0)
+    merged["shares"] = merged["shares"].fillna(0.0)
+    merged["current"] = merged["current"].fillna(0.0)
+    merged["name"] = merged["name"].fillna("")
+
+    orders = []
+    in_band = too_small = 0
+    unpriced: list[str] = []
+    for row in merged.itertuples(index=False):
+        exiting = row.origin == "right_only"
+        if exiting:
+            if row.shares <= 0:
+                continue
+            if pd.isna(row.price):
+                print(f"[warn] no price for {row.ticker}; selling all {row.shares:g} shares "
+                      f"at market", file=sys.stderr)
+            orders.append((row.ticker, row.name, "SELL", row.shares, row.price,
+                           row.current, row.current, 0.0))
+            continue
+
+        delta = row.dollars - row.current
+        if abs(delta) <= drift_band * row.dollars:
+            in_band += 1
+            continue
+        if pd.isna(row.price) or row.price <= 0:
+            if row.shares > 0:
+                print(f"[warn] no price for held {row.ticker}; leaving it as is",
+                      file=sys.stderr)
+                continue
+            # Not held and nothing to size whole shares with: a dollar order
+            if delta < min_order:
+                too_small += 1
+                continue
+            unpriced.append(row.ticker)
+            orders.append((row.ticker, row.name, "BUY", float("nan"), float("nan"),
+                           delta, row.current, row.dollars))
+            continue
+
+        lots = math.trunc(delta / (row.price * lot_size))
+        shares = abs(lots) * lot_size
+        if delta < 0:
+            shares = min(shares, row.shares)
+        value = shares * row.price
+        if shares == 0 or value < min_order:
+            too_small += 1
+            continue
+        orders.append((row.ticker, row.name, "BUY" if delta > 0 else "SELL", shares,
+                       row.price, value, row.current, row.dollars))
+
+    df = pd.DataFrame(
+        orders,
+        columns=["ticker", "name", "side", "shares", "price", "dollars",
+                 "current_dollars", "target_dollars"],
+    )
+    # Sells first: they fund the buys
+    df = df.sort_values(["side", "dollars"], ascending=[False, False]).reset_index(drop=True)
+    return TradeList(
+        orders=df,
+        held_value=float(held["current"].sum()),
+        cash_added=cash_added,
+        in_band=in_band,
+        too_small=too_small,
+        unpriced=unpriced,
+    )
+
+
+def print_trades(trades: TradeList) -> None:
+    buys, sells = trades.buys, trades.sells
+    bought = float(buys["dollars"].sum())
+    sold = float(sells["dollars"].sum())
+    print(
+        f"\nHeld value: ${trades.held_value:,.2f}  + new cash ${trades.cash_added:,.2f}"
+    )
+    print(
+        f"Orders: {len(buys)} buys (${bought:,.2f}), {len(sells)} sells (${sold:,.2f}); "
+        f"{trades.in_band} names within the drift band, "
+        f"{trades.too_small} trades under the minimum order"
+    )
+    print(f"Cash left after orders: ${trades.cash_added + sold - bought:,.2f}")
+    if trades.unpriced:
+        print(
+            f"No price (buy in dollars): {', '.join(trades.unpriced)}"
+        )
+    if trades.orders.empty:
+        print("\nNothing to trade.")
+        return
+    print()
+    with pd.option_context("display.max_rows", None, "display.width", 160):
+        print(
+            trades.orders.to_string(
+                index=False,
+                formatters={
+                    "shares": "{:,.0f}".format,
+                    "price": "${:,.2f}".format,
+                    "dollars": "${:,.2f}".format,
+                    "current_dollars": "${:,.2f}".format,
+                    "target_dollars": "${:,.2f}".format,
+                },
+            )
+        )
+
+
+def whole_share_orders(
+    plan: pd.DataFrame, prices: dict[str, float], amount: float, lot_size: int = 1
+) -> tuple[pd.DataFrame, float]:
+    """
+    Turn a plan's dollar targets into whole-share orders.
+
+    Each priced name first gets as many lots as fit inside its target. The
+    cash that floors leave behind then goes, one lot per name, to the names
+    with the largest unfilled fraction of a lot, as long as it is
+    affordable (largest remainder). Names without a price keep their dollar
+    amount. Returns the plan with ``price`` and ``shares`` columns, and
+    ``dollars`` set to what each order actually costs, plus the cash left
+    over.
+    """
+    df = plan.copy()
+    df["price"] = df["ticker"].map(prices).astype(float)
+    priced = df["price"].notna().to_numpy()
+    target = df["dollars"].to_numpy(dtype=float)
+    lot_cost = df["price"].to_numpy(dtype=float) * lot_size
+    lots = np.zeros(len(df))
+    lots[priced] = np.floor(target[priced] / lot_cost[priced])
+
+    cost = np.where(priced, lots * lot_cost, target)
+    cash = amount - float(cost.sum())
+    remainder = np.where(priced, target / np.where(priced, lot_cost, 1.0) - lots, -1.0)
+    for i in np.argsort(-remainder, kind="stable"):
+        if remainder[i] <= 0:
+            break
+        if lot_cost[i] <= cash:
+            lots[i] += 1
+            cash -= lot_cost[i]
+
+    df["shares"] = np.where(priced, lots * lot_size, np.nan)
+    df["dollars"] = np.where(priced, lots * lot_cost, target)
+    if not priced.all():
+        missing = df.loc[~priced, "ticker"]
+        print(f"[warn] no price for {len(missing)} ticker(s); ordering them in dollars: "
+              f"{', '.join(missing[:10])}{' ...' if len(missing) > 10 else ''}",
+              file=sys.stderr)
+    return df, cash
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sp500.optimize import build_risk_model, min_tracking_error
+
+SECTORS = ["Tech", "Health", "Energy", "Financials", "Utilities"]
+
+
+@pytest.fixture
+def universe():
+    rng = np.random.default_rng(7)
+    n = 60
+    df = pd.DataFrame({
+        "ticker": [f"T{i:02d}" for i in range(n)],
+        "region": ["US"] * 40 + ["INTL"] * 20,
+        "sector": [SECTORS[i % len(SECTORS)] for i in range(n)],
+    })
+    bench = rng.pareto(1.5, n) + 0.01
+    return df, bench / bench.sum()
+
+
+@pytest.mark.parametrize("max_names", [1, 5, 20, 55, 100])
+def test_weights_are_a_long_only_portfolio_of_at_most_n_names(universe, max_names):
+    df, bench = universe
+    allowed = np.ones(len(df), dtype=bool)
+    allowed[[0, 3, 41]] = False     # exclusions stay in the benchmark
+
+    weights = min_tracking_error(build_risk_model(df), bench, allowed, max_names)
+
+    assert weights.shape == bench.shape
+    assert weights.sum() == pytest.approx(1.0)
+    assert (weights >= 0).all()
+    assert np.count_nonzero(weights) <= min(max_names, allowed.sum())
+    assert (weights[~allowed] == 0).all()
+
+
+def test_more_names_track_no_worse(universe):
+    df, bench = universe
+    model = build_risk_model(df)
+    allowed = np.ones(len(df), dtype=bool)
+
+    errors = [model.tracking_error(min_tracking_error(model, bench, allowed, n), bench)
+              for n in (5, 20, 60)]
+
+    assert errors[0] >= errors[1] >= errors[2] - 1e-9
+    assert errors[2] == pytest.approx(0.0, abs=1e-4)
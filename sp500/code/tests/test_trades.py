@@ -0,0 +1,149 @@
+import math
+
+import pandas as pd
+import pytest
+
+from sp500.trades import trade_deltas, whole_share_orders
+
+
+def _target(rows):
+    return pd.DataFrame(rows, columns=["ticker", "name", "dollars"])
+
+
+def _positions(rows):
+    return pd.DataFrame(rows, columns=["ticker", "shares", "price"])
+
+
+def _order(trades, ticker):
+    rows = trades.orders[trades.orders["ticker"] == ticker]
+    assert len(rows) == 1, f"expected one order for {ticker}, got {len(rows)}"
+    return rows.iloc[0]
+
+
+# --- trade_deltas -----------------------------------------------------------
+
+def test_fractional_holdings_buy_and_sell_whole_shares():
+    target = _target([("AAA", "A Corp", 1000.0), ("BBB", "B Corp", 1000.0)])
+    positions = _positions([("AAA", 2.5, 100.0), ("BBB", 20.5, 100.0)])
+
+    trades = trade_deltas(target, positions, cash_added=0.0, min_order=0.0)
+
+    buy = _order(trades, "AAA")
+    assert buy["side"] == "BUY"
+    assert buy["shares"] == 7          # $750 short: round toward zero
+    assert buy["dollars"] == pytest.approx(700.0)
+    sell = _order(trades, "BBB")
+    assert sell["side"] == "SELL"
+    assert sell["shares"] == 10        # $1,050 over
+    assert trades.held_value == pytest.approx(2300.0)
+
+
+def test_exiting_fractional_holding_is_sold_in_full():
+    target = _target([("AAA", "A Corp", 1000.0)])
+    positions = _positions([("AAA", 10.0, 100.0), ("OLD", 3.75, 40.0)])
+
+    trades = trade_deltas(target, positions, cash_added=0.0)
+
+    sell = _order(trades, "OLD")
+    assert sell["side"] == "SELL"
+    assert sell["shares"] == 3.75
+    assert sell["dollars"] == pytest.approx(150.0)
+    assert trades.in_band == 1
+
+
+def test_sell_never_exceeds_shares_held():
+    target = _target([("AAA", "A Corp", 0.0)])
+    positions = _positions([("AAA", 2.5, 100.0)])
+
+    trades = trade_deltas(target, positions, cash_added=0.0, min_order=0.0)
+
+    assert _order(trades, "AAA")["shares"] == 2
+
+
+def test_unpriced_new_name_is_bought_in_dollars():
+    target = _target([("AAA", "A Corp", 1000.0), ("NEW", "New Corp", 500.0)])
+    positions = _positions([("AAA", 10.0, 100.0)])
+
+    trades = trade_deltas(target, positions, cash_added=500.0)
+
+    buy = _order(trades, "NEW")
+    assert buy["side"] == "BUY"
+    assert math.isnan(buy["shares"])
+    assert buy["dollars"] == pytest.approx(500.0)
+    assert trades.unpriced == ["NEW"]
+
+
+def test_unpriced_holding_is_left_alone(capsys):
+    target = _target([("AAA", "A Corp", 1000.0)])
+    positions = _positions([("AAA", 2.5, float("nan"))])
+
+    trades = trade_deltas(target, positions, cash_added=0.0)
+
+    assert trades.orders.empty
+    assert trades.unpriced == []
+    assert "no price for held AAA" in capsys.readouterr().err
+
+
+def test_unpriced_exiting_holding_is_sold_at_market(capsys):
+    target = _target([("AAA", "A Corp", 1000.0)])
+    positions = _positions([("AAA", 10.0, 100.0), ("OLD", 4.5, float("nan"))])
+
+    trades = trade_deltas(target, positions, cash_added=0.0)
+
+    sell = _order(trades, "OLD")
+    assert sell["side"] == "SELL"
+    assert sell["shares"] == 4.5
+    assert "selling all 4.5 shares" in capsys.readouterr().err
+
+
+def test_small_trades_and_lot_size():
+    target = _target([("AAA", "A Corp", 1000.0), ("BBB", "B Corp", 1000.0)])
+    positions = _positions([("AAA", 8.0, 100.0), ("BBB", 0.0, 10.0)])
+
+    trades = trade_deltas(target, positions, cash_added=1200.0, min_order=250.0, lot_size=25)
+
+    # AAA: $200 short, under the minimum; BBB: $1,000 buys 4 lots of 25
+    assert trades.too_small == 1
+    buy = _order(trades, "BBB")
+    assert buy["shares"] == 100
+    assert buy["dollars"] == pytest.approx(1000.0)
+
+
+# --- whole_share_orders -----------------------------------------------------
+
+def test_whole_share_orders_hand_leftover_to_largest_remainder():
+    plan = _target([("AAA", "A Corp", 150.0), ("BBB", "B Corp", 190.0)])
+
+    df, cash = whole_share_orders(plan, {"AAA": 100.0, "BBB": 100.0}, amount=340.0)
+
+    assert df.set_index("ticker")["shares"].to_dict() == {"AAA": 1, "BBB": 2}
+    assert cash == pytest.approx(40.0)
+    assert df["dollars"].sum() + cash == pytest.approx(340.0)
+
+
+def test_whole_share_orders_keep_unpriced_names_in_dollars(capsys):
+    plan = _target([("AAA", "A Corp", 333.33), ("NEW", "New Corp", 166.67)])
+
+    df, cash = whole_share_orders(plan, {"AAA": 40.0}, amount=500.0)
+
+    rows = df.set_index("ticker")
+    assert rows.loc["AAA", "shares"] == 8
+    assert math.isnan(rows.loc["NEW", "shares"])
+    assert rows.loc["NEW", "dollars"] == pytest.approx(166.67)
+    assert cash == pytest.approx(500.0 - 320.0 - 166.67)
+    assert cash >= 0
+    assert "NEW" in capsys.readouterr().err
+
+
+def test_whole_share_orders_never_overspend_with_lots():
+    plan = _target([(t, t, 1000.0 / 3) for t in ("AAA", "BBB", "CCC")])
+    prices = {"AAA": 7.3, "BBB": 11.9, "CCC": 3.1}
+
+    df, cash = whole_share_orders(plan, prices, amount=1000.0, lot_size=5)
+
+    assert (df["shares"] % 5 == 0).all()
+    assert df["dollars"].to_numpy() == pytest.approx((df["shares"] * df["price"]).to_numpy())
+    assert cash >= 0
+    assert df["dollars"].sum() + cash == pytest.approx(1000.0)
+    # Each name is within one lot of its target
+    assert ((df["dollars"] - 1000.0 / 3).abs() < df["price"] * 5).all()